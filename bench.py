@@ -0,0 +1,213 @@
+"""Benchmarks reproducibles de netpbm_cpp.
+
+    python -m bench --out resultados.json
+    python -m bench --quick --baseline base.json       # compara y marca regresiones
+    python -m bench --filter draw_circle --repeat 9
+
+Cada caso se repite `repeat` veces; en cada repeticion se ejecuta las veces necesarias
+para durar al menos --min-time segundos y se guarda el tiempo por llamada. El JSON
+guarda la mediana y el minimo de cada caso.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import netpbm_cpp as netpbm
+
+import scenes
+
+
+SIZES = {"300": (300, 300), "1080p": (1920, 1080), "4k": (3840, 2160), "8k": (7680, 4320)}
+QUICK_SIZES = ("300", "1080p")
+FORMATS = {"P1": ("pbm", False), "P2": ("pgm", False), "P3": ("ppm", False),
+           "P4": ("pbm", True), "P5": ("pgm", True), "P6": ("ppm", True)}
+
+
+def measure(fn, repeat, min_time):
+    """Segundos por llamada de fn en cada repeticion."""
+    fn()  # calentamiento
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - start) / loops)
+    return samples, loops
+
+
+def noise_image(width, height, mode, seed=0):
+    img = netpbm.Image(width, height, mode)
+    data = np.asarray(img)  # en pbm, filas empaquetadas: cada byte son 8 pixeles
+    rng = np.random.default_rng(seed)
+    data[...] = rng.integers(0, 256, data.shape, dtype=np.uint8)
+    return img
+
+
+def constructor_cases(sizes):
+    for size in sizes:
+        width, height = SIZES[size]
+        for mode in ("pbm", "pgm", "ppm"):
+            yield f"constructor/{mode}/{size}", lambda w=width, h=height, m=mode: netpbm.Image(w, h, m), width * height
+
+
+def draw_cases(sizes):
+    color = netpbm.Color(200, 100, 50)
+    for size in sizes:
+        width, height = SIZES[size]
+        img = netpbm.Image(width, height, "ppm")
+        r = min(width, height) // 3
+        cx, cy = width // 2, height // 2
+        yield f"draw_line/horizontal/{size}", lambda img=img, w=width, y=cy: img.draw_line(0, y, w - 1, y, color), width
+        yield f"draw_line/vertical/{size}", lambda img=img, h=height, x=cx: img.draw_line(x, 0, x, h - 1, color), height
+        yield (f"draw_line/diagonal/{size}",
+               lambda img=img, w=width, h=height: img.draw_line(0, 0, w - 1, h - 1, color), max(width, height))
+        for fill in (False, True):
+            kind = "fill" if fill else "outline"
+            yield (f"draw_rectangle/{kind}/{size}",
+                   lambda img=img, w=width, h=height, f=fill: img.draw_rectangle(w // 4, h // 4, 3 * w // 4, 3 * h // 4, color, fill=f),
+                   width * height // 4 if fill else width + height)
+            yield (f"draw_circle/{kind}/{size}",
+                   lambda img=img, x=cx, y=cy, r=r, f=fill: img.draw_circle(x, y, r, color, fill=f),
+                   int(3.1416 * r * r) if fill else int(2 * 3.1416 * r))
+        for mode in ("vertical", "horizontal", "radial"):
+            stops = [(0.0, netpbm.Color(0, 0, 0)), (0.5, netpbm.Color(255, 0, 0)), (1.0, netpbm.Color(255, 255, 255))]
+            yield (f"fill_gradient/{mode}/{size}",
+                   lambda img=img, m=mode: img.fill_gradient(stops, mode=m), width * height)
+
+        rng = np.random.default_rng(1)
+        n = 10000
+        points = np.stack([rng.integers(0, width, n), rng.integers(0, height, n)], axis=1).astype(np.int32)
+        segments = np.concatenate([points[:1000], points[1000:2000]], axis=1)
+        rects = np.concatenate([points[:1000], points[:1000] + rng.integers(1, 50, (1000, 2))], axis=1).astype(np.int32)
+        circles = np.concatenate([points[:1000], rng.integers(1, 30, (1000, 1))], axis=1).astype(np.int32)
+        colors = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+        yield f"draw_points/10000/{size}", lambda img=img, p=points: img.draw_points(p, colors), n
+        yield f"draw_lines/1000/{size}", lambda img=img, s=segments: img.draw_lines(s, colors[:1000]), 1000
+        yield (f"draw_rectangles/1000/fill/{size}",
+               lambda img=img, q=rects: img.draw_rectangles(q, colors[:1000], fill=True), 1000)
+        yield (f"draw_circles/1000/fill/{size}",
+               lambda img=img, c=circles: img.draw_circles(c, colors[:1000], fill=True), 1000)
+
+
+def io_cases(sizes, tmpdir):
+    for size in sizes:
+        width, height = SIZES[size]
+        for fmt, (mode, binary) in FORMATS.items():
+            img = noise_image(width, height, mode)
+            path = os.path.join(tmpdir, f"{fmt}_{size}.pnm")
+            img.save(path, binary=binary)
+            yield f"save/{fmt}/{size}", lambda img=img, p=path, b=binary: img.save(p, binary=b), width * height
+            yield f"load/{fmt}/{size}", lambda p=path: netpbm.Image(p), width * height
+
+
+def scene_cases(sizes):
+    # Las escenas graban una DisplayList: sin cache se mide el rasterizado real
+    netpbm.DisplayList.set_cache_size(0)
+    for name, (create, default_size) in scenes.SCENES.items():
+        for size, (width, height) in [("default", default_size)] + [(s, SIZES[s]) for s in sizes if s != "300"]:
+            def render(create=create, w=width, h=height):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    create(w, h)
+            yield f"scene/{name}/{size}", render, width * height
+    netpbm.DisplayList.set_cache_size(8)
+
+
+def run(args):
+    sizes = QUICK_SIZES if args.quick else tuple(SIZES)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        groups = [constructor_cases(sizes), draw_cases(sizes), io_cases(sizes, tmpdir), scene_cases(sizes)]
+        for group in groups:
+            for name, fn, units in group:
+                if args.filter and not any(f in name for f in args.filter):
+                    continue
+                samples, loops = measure(fn, args.repeat, args.min_time)
+                median = statistics.median(samples)
+                results[name] = {"median_s": median, "min_s": min(samples), "loops": loops,
+                                 "repeat": args.repeat, "units": units, "units_per_s": units / median}
+                print(f"{name:<42} {median * 1e3:10.3f} ms  (min {min(samples) * 1e3:.3f} ms, {loops} x {args.repeat})",
+                      flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Lista de (caso, ratio) con la mediana actual mas de `threshold` por encima de la base."""
+    regressions = []
+    print(f"\n{'caso':<42} {'base ms':>10} {'actual ms':>10} {'ratio':>7}")
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]["median_s"]
+        ratio = current["median_s"] / base if base > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+            flag = "  REGRESION"
+        elif ratio < 1 - threshold:
+            flag = "  mejora"
+        print(f"{name:<42} {base * 1e3:10.3f} {current['median_s'] * 1e3:10.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmarks de netpbm_cpp")
+    parser.add_argument("--out", default=None, help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--baseline", default=None, help="JSON de una ejecucion anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Fraccion de aumento de la mediana que cuenta como regresion (0.10 = 10%%)")
+    parser.add_argument("--quick", action="store_true", help="Solo tamaños pequeños (300x300 y 1080p)")
+    parser.add_argument("--filter", action="append", default=[], help="Solo casos cuyo nombre contenga el texto")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por caso")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Duracion minima de cada repeticion (s)")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nResultados guardados en '{args.out}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regresiones por encima del {args.threshold:.0%}:")
+            for name, ratio in regressions:
+                print(f"  {name}: x{ratio:.2f}")
+            return 1
+        print("\nSin regresiones")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
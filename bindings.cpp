@@ -3,60 +3,685 @@
 #include <pybind11/stl.h>
 #include <pybind11/numpy.h> 
 #include "netpbm.h"
+#include "strips.h"
+#include "stats.h"
+#include "displaylist.h"
+#include "frames.h"
+#include "catalog.h"
+#include "workers.h"
+#include <cmath>
+#include <filesystem>
+#include <optional>
+#include <tuple>
+#include <type_traits>
 
 namespace py = pybind11;
 
+using IntArray = py::array_t<int, py::array::c_style | py::array::forcecast>;
+using ByteArray = py::array_t<unsigned char, py::array::c_style | py::array::forcecast>;
+
+// Forma de un raster de `rows` filas: (rows, width) o (rows, width, 3)
+static std::vector<py::ssize_t> raster_shape(int rows, int width, int channels) {
+    if (channels == 1) return { rows, width };
+    return { rows, width, channels };
+}
+
+// Valida un lote de primitivas (N x k enteros) y sus colores: N x 3 (uno por
+// primitiva) o un solo color de 3 componentes que se aplica a todo el lote.
+static size_t check_batch(const IntArray& coords, const ByteArray& colors, py::ssize_t k, size_t& color_stride) {
+    if (coords.ndim() != 2 || coords.shape(1) != k)
+        throw std::runtime_error("Las coordenadas deben ser un arreglo de N x " + std::to_string(k));
+    size_t count = (size_t)coords.shape(0);
+
+    if (colors.ndim() == 1 && colors.shape(0) == 3) {
+        color_stride = 0;
+    } else if (colors.ndim() == 2 && colors.shape(1) == 3 && (size_t)colors.shape(0) == count) {
+        color_stride = 3;
+    } else {
+        throw std::runtime_error("Los colores deben ser un arreglo de N x 3 o un solo color de 3 valores");
+    }
+    return count;
+}
+
+// Vertices de un poligono o polilinea: N x 2 enteros
+static size_t check_points(const IntArray& points) {
+    if (points.ndim() != 2 || points.shape(1) != 2)
+        throw std::runtime_error("Los puntos deben ser un arreglo de N x 2");
+    return (size_t)points.shape(0);
+}
+
+static py::dict header_dict(const Header& header) {
+    py::dict result;
+    result["magic"] = header.magic;
+    result["width"] = header.width;
+    result["height"] = header.height;
+    result["max_val"] = header.max_val;
+    result["depth"] = header.depth;
+    result["data_offset"] = header.data_offset;
+    return result;
+}
+
+// Metodos de dibujo comunes a Image y DisplayList, con la misma firma en los dos
+template <typename Canvas>
+static void def_drawing(py::class_<Canvas>& cls) {
+    cls
+        .def("draw_line", &Canvas::draw_line, "Dibuja una línea (Bresenham)",
+             py::arg("x0"), py::arg("y0"), py::arg("x1"), py::arg("y1"), py::arg("color"), py::call_guard<py::gil_scoped_release>())
+
+        .def("draw_rectangle", &Canvas::draw_rectangle, "Dibuja un rectángulo",
+             py::arg("x0"), py::arg("y0"), py::arg("x1"), py::arg("y1"), py::arg("color"), py::arg("fill") = false,
+             py::call_guard<py::gil_scoped_release>())
+
+        .def("draw_circle", &Canvas::draw_circle, "Dibuja un círculo (Midpoint)",
+             py::arg("xc"), py::arg("yc"), py::arg("r"), py::arg("color"), py::arg("fill") = false,
+             py::call_guard<py::gil_scoped_release>())
+
+        .def("draw_points", [](Canvas& canvas, const IntArray& points, const ByteArray& colors) {
+            size_t stride;
+            size_t n = check_batch(points, colors, 2, stride);
+            py::gil_scoped_release release;
+            canvas.draw_points(points.data(), n, colors.data(), stride);
+        }, "Dibuja un lote de puntos (N x 2: x, y)", py::arg("points"), py::arg("colors"))
+
+        .def("draw_lines", [](Canvas& canvas, const IntArray& lines, const ByteArray& colors) {
+            size_t stride;
+            size_t n = check_batch(lines, colors, 4, stride);
+            py::gil_scoped_release release;
+            canvas.draw_lines(lines.data(), n, colors.data(), stride);
+        }, "Dibuja un lote de líneas (N x 4: x0, y0, x1, y1)", py::arg("lines"), py::arg("colors"))
+
+        .def("draw_rectangles", [](Canvas& canvas, const IntArray& rects, const ByteArray& colors, bool fill) {
+            size_t stride;
+            size_t n = check_batch(rects, colors, 4, stride);
+            py::gil_scoped_release release;
+            canvas.draw_rectangles(rects.data(), n, colors.data(), stride, fill);
+        }, "Dibuja un lote de rectángulos (N x 4: x0, y0, x1, y1)",
+             py::arg("rects"), py::arg("colors"), py::arg("fill") = false)
+
+        .def("draw_circles", [](Canvas& canvas, const IntArray& circles, const ByteArray& colors, bool fill) {
+            size_t stride;
+            size_t n = check_batch(circles, colors, 3, stride);
+            py::gil_scoped_release release;
+            canvas.draw_circles(circles.data(), n, colors.data(), stride, fill);
+        }, "Dibuja un lote de círculos (N x 3: xc, yc, r)",
+             py::arg("circles"), py::arg("colors"), py::arg("fill") = false)
+
+        .def("fill_gradient", [](Canvas& canvas, const std::vector<std::pair<double, Color>>& stops, const std::string& mode,
+                                 std::optional<std::tuple<int, int, int, int>> region,
+                                 std::optional<double> start, std::optional<double> end,
+                                 std::optional<std::pair<double, double>> center) {
+            std::vector<GradientStop> gradient_stops;
+            for (const auto& s : stops) gradient_stops.push_back({s.first, s.second});
+
+            int x0 = 0, y0 = 0, x1 = canvas.get_width() - 1, y1 = canvas.get_height() - 1;
+            if (region) std::tie(x0, y0, x1, y1) = *region;
+            if (x0 > x1) std::swap(x0, x1);
+            if (y0 > y1) std::swap(y0, y1);
+
+            // Por defecto el degradado recorre la region completa
+            double cx = (x0 + x1) / 2.0, cy = (y0 + y1) / 2.0;
+            if (center) std::tie(cx, cy) = *center;
+            double t0 = 0.0, t1;
+            if (mode == "vertical") {
+                t0 = y0; t1 = y1 + 1;
+            } else if (mode == "horizontal") {
+                t0 = x0; t1 = x1 + 1;
+            } else {
+                double dx = std::max(cx - x0, x1 - cx), dy = std::max(cy - y0, y1 - cy);
+                t1 = std::sqrt(dx * dx + dy * dy);
+            }
+            py::gil_scoped_release release;
+            canvas.fill_gradient(gradient_stops, mode, x0, y0, x1, y1, start.value_or(t0), end.value_or(t1), cx, cy);
+        }, "Rellena una región con un degradado vertical, horizontal o radial",
+             py::arg("stops"), py::arg("mode") = "vertical", py::arg("region") = py::none(),
+             py::arg("start") = py::none(), py::arg("end") = py::none(), py::arg("center") = py::none())
+
+        .def("fill_polygon", [](Canvas& canvas, const IntArray& points, const Color& color, const std::string& rule) {
+            size_t n = check_points(points);
+            if (rule != "evenodd" && rule != "nonzero")
+                throw std::runtime_error("Regla de relleno no soportada. Use 'evenodd' o 'nonzero'.");
+            py::gil_scoped_release release;
+            canvas.fill_polygon(points.data(), n, color, rule == "evenodd");
+        }, "Rellena un polígono (N x 2: x, y), cóncavo o que se corte a sí mismo",
+             py::arg("points"), py::arg("color"), py::arg("rule") = "evenodd")
+
+        .def("draw_polyline", [](Canvas& canvas, const IntArray& points, const Color& color, int thickness, bool closed) {
+            size_t n = check_points(points);
+            py::gil_scoped_release release;
+            canvas.draw_polyline(points.data(), n, color, thickness, closed);
+        }, "Une los puntos (N x 2: x, y) con segmentos del grosor dado",
+             py::arg("points"), py::arg("color"), py::arg("thickness") = 1, py::arg("closed") = false);
+}
+
+// Image sobre la memoria de un buffer uint8 C-contiguo, sin copiarla salvo en pbm
+static Image image_from_buffer(py::buffer buffer, std::optional<std::string> mode) {
+    // El Py_buffer se suelta (con el GIL) cuando la ultima imagen que lo usa muere
+    auto info = std::shared_ptr<py::buffer_info>(new py::buffer_info(buffer.request()),
+        [](py::buffer_info* p) {
+            py::gil_scoped_acquire gil;
+            delete p;
+        });
+    if (info->format != py::format_descriptor<unsigned char>::format())
+        throw std::runtime_error("El buffer debe ser de uint8");
+    int channels = info->ndim == 3 ? static_cast<int>(info->shape[2]) : 1;
+    if (info->ndim != 2 && !(info->ndim == 3 && (channels == 3 || channels == 4)))
+        throw std::runtime_error("El buffer debe tener forma (alto, ancho), (alto, ancho, 3) o (alto, ancho, 4)");
+    ssize_t expected = 1;
+    for (ssize_t k = info->ndim; k-- > 0;) {
+        if (info->strides[k] != expected)
+            throw std::runtime_error("El buffer debe ser C-contiguo");
+        expected *= info->shape[k];
+    }
+    std::string m = mode.value_or(channels == 4 ? "pam" : channels == 3 ? "ppm" : "pgm");
+    if ((m == "ppm") != (channels == 3) || (m == "pam") != (channels == 4))
+        throw std::runtime_error("El modo '" + m + "' no corresponde a la forma del buffer");
+    auto data = static_cast<unsigned char*>(info->ptr);
+    int height = static_cast<int>(info->shape[0]), width = static_cast<int>(info->shape[1]);
+    if (m == "pbm") {
+        // El raster pbm va empaquetado a 1 bit: aqui no se puede evitar la copia
+        py::gil_scoped_release release;
+        return Image::pack(data, width, height);
+    }
+    bool writable = !info->readonly;
+    return Image::from_memory(data, width, height, m, std::move(info), writable);
+}
+
+// Variantes asincronas: el trabajo va al pool nativo sin el GIL y el hilo que lo termina
+// resuelve un Future del bucle de asyncio que lo pidio con call_soon_threadsafe. El pool
+// se crea con el primer uso y nunca se destruye; atexit lo cierra con el interprete vivo.
+static WorkerPool& async_pool() {
+    static WorkerPool* pool = new WorkerPool();
+    return *pool;
+}
+
+// Pone el resultado salvo que el Future ya este resuelto (cancelado mientras corria)
+static void resolve_future(py::object future, py::object value, py::object error) {
+    if (future.attr("done")().cast<bool>()) return;
+    if (error.is_none()) future.attr("set_result")(value);
+    else future.attr("set_exception")(py::reinterpret_borrow<py::object>(PyExc_RuntimeError)(error));
+}
+
+// Encola fn (que corre sin el GIL) y devuelve el Future con su resultado. bytes es lo que
+// ocupara mientras corre; keep mantiene vivos los objetos que fn usa por referencia.
+template <typename Fn>
+static py::object submit_async(size_t bytes, py::object keep, Fn fn) {
+    using Result = decltype(fn());
+    py::object loop = py::module_::import("asyncio").attr("get_running_loop")();
+    py::object future = loop.attr("create_future")();
+    auto cancelled = std::make_shared<std::atomic<bool>>(false);
+    future.attr("add_done_callback")(py::cpp_function([cancelled](py::object f) {
+        if (f.attr("cancelled")().cast<bool>()) cancelled->store(true);
+    }));
+
+    // Lo que la tarea necesita de Python; solo se toca (y se destruye) con el GIL
+    struct AsyncCall {
+        py::object loop, future, keep;
+    };
+    auto call = new AsyncCall{loop, future, std::move(keep)};
+    // work lo rellena en el hilo del pool; finish lo entrega despues con el GIL
+    struct Outcome {
+        std::optional<std::conditional_t<std::is_void_v<Result>, bool, Result>> result;
+        std::string error;
+    };
+    auto outcome = std::make_shared<Outcome>();
+    async_pool().submit(bytes, [outcome, fn]() mutable {
+        try {
+            if constexpr (std::is_void_v<Result>) {
+                fn();
+                outcome->result.emplace(true);
+            } else {
+                outcome->result.emplace(fn());
+            }
+        } catch (const std::exception& e) {
+            outcome->error = e.what();
+        }
+    }, [call, outcome](bool skipped) {
+        py::gil_scoped_acquire gil;
+        std::unique_ptr<AsyncCall> owned(call);
+        try {
+            if (skipped) {
+                // Cancelada en la cola o pool cerrado: el Future no debe quedarse pendiente
+                owned->loop.attr("call_soon_threadsafe")(owned->future.attr("cancel"));
+            } else {
+                py::object value = py::none(), message = py::none();
+                if constexpr (!std::is_void_v<Result>) if (outcome->result) value = py::cast(std::move(*outcome->result));
+                if (!outcome->result) message = py::str(outcome->error);
+                owned->loop.attr("call_soon_threadsafe")(py::cpp_function(&resolve_future), owned->future, value, message);
+            }
+        } catch (py::error_already_set&) {
+            // El bucle ya se cerro: nadie espera el resultado
+        }
+    }, cancelled);
+    return future;
+}
+
 PYBIND11_MODULE(netpbm_cpp, m) {
     m.doc() = "Biblioteca para crear, convertir y manipular imagenes Netpbm";
 
     
     py::class_<Color>(m, "Color")
-        .def(py::init<unsigned char, unsigned char, unsigned char>(), py::arg("r"), py::arg("g"), py::arg("b"));
+        .def(py::init<unsigned char, unsigned char, unsigned char, unsigned char>(), py::arg("r"), py::arg("g"), py::arg("b"),
+             py::arg("a") = 255);
 
     
-    py::class_<Image>(m, "Image", py::buffer_protocol())
-        .def(py::init<int, int, const std::string&>(), py::arg("width"), py::arg("height"), py::arg("mode"))
-        .def(py::init<const std::string&>(), py::arg("filename"))
+    py::class_<Image> image(m, "Image", py::buffer_protocol());
+    def_drawing(image);
+    image
+        .def(py::init<int, int, const std::string&, int>(), py::arg("width"), py::arg("height"), py::arg("mode"),
+             py::arg("max_val") = 255)
+        .def(py::init<const std::string&>(), py::arg("filename"), py::call_guard<py::gil_scoped_release>())
 
-        .def("load", &Image::load, "Carga una imagen desde un archivo")
-        .def("save", &Image::save, "Guarda la imagen en un archivo", py::arg("filename"), py::arg("binary") = false)
+        // Carga, guardado y dibujo sueltan el GIL: varios hilos de Python pueden trabajar a la
+        // vez siempre que cada uno use su propia imagen
+        .def("load", py::overload_cast<const std::string&>(&Image::load), "Carga una imagen desde un archivo", py::call_guard<py::gil_scoped_release>())
+        .def("save", &Image::save, "Guarda la imagen en un archivo", py::arg("filename"), py::arg("binary") = false,
+             py::call_guard<py::gil_scoped_release>())
+        .def("asave", [](py::object self, const std::string& filename, bool binary) {
+                 Image& img = self.cast<Image&>();
+                 return submit_async(img.get_row_bytes() * img.get_height(), self,
+                                     [&img, filename, binary]() { img.save(filename, binary); });
+             },
+             "Como save, pero en el pool nativo: devuelve un Future de asyncio. La imagen no debe modificarse hasta que termine; "
+             "si se cancela cuando ya empezo, el archivo se escribe igualmente",
+             py::arg("filename"), py::arg("binary") = false)
+        .def("save_incremental", &Image::save_incremental,
+             "Reescribe en un P4/P5/P6 existente solo lo modificado desde el ultimo load/save; si el archivo no es compatible lo guarda entero. Devuelve los bytes escritos",
+             py::arg("filename"), py::call_guard<py::gil_scoped_release>())
+        .def("mark_dirty", [](Image& self, py::object region) {
+                 if (region.is_none()) {
+                     self.mark_dirty(0, 0, self.get_width() - 1, self.get_height() - 1);
+                 } else {
+                     auto r = region.cast<std::tuple<int, int, int, int>>();
+                     self.mark_dirty(std::get<0>(r), std::get<1>(r), std::get<2>(r), std::get<3>(r));
+                 }
+             },
+             "Marca como modificada la region (x0, y0, x1, y1), o toda la imagen; necesario tras escribir en el buffer",
+             py::arg("region") = py::none())
+        .def("dirty_region", [](const Image& self) -> py::object {
+                 int x0, y0, x1, y1;
+                 if (!self.dirty_bounds(x0, y0, x1, y1)) return py::none();
+                 return py::make_tuple(x0, y0, x1, y1);
+             },
+             "Caja (x0, y0, x1, y1) con todo lo modificado desde el ultimo load/save, o None")
+        .def_static("from_buffer", &image_from_buffer,
+             "Crea una imagen que usa la memoria del buffer sin copiarla (uint8 C-contiguo, (alto, ancho), (alto, ancho, 3) o (alto, ancho, 4) para pam). Los cambios se ven en ambos lados; si el buffer es de solo lectura la imagen tambien. Con mode='pbm' los pixeles (negro si < 128) se empaquetan en una copia",
+             py::arg("buffer"), py::arg("mode") = py::none())
+        .def("unpack", [](const Image& self) {
+                 if (!self.is_packed()) throw std::runtime_error("unpack solo se aplica a imagenes PBM");
+                 py::array_t<unsigned char> out({self.get_height(), self.get_width()});
+                 unsigned char* dst = out.mutable_data();
+                 {
+                     py::gil_scoped_release release;
+                     self.unpack(dst);
+                 }
+                 return out;
+             },
+             "Copia de una imagen PBM a un byte por pixel (0 negro, 255 blanco); el buffer de la imagen tiene las filas empaquetadas a 1 bit")
+        .def_static("open_mmap", &Image::open_mmap,
+                    "Abre un P4/P5/P6 proyectado en memoria, sin copiar el raster. Con writable=True lo que se dibuja se escribe en el archivo",
+                    py::arg("filename"), py::arg("writable") = false, py::call_guard<py::gil_scoped_release>())
 
-        .def("draw_line", &Image::draw_line, "Dibuja una línea (Bresenham)",
-             py::arg("x0"), py::arg("y0"), py::arg("x1"), py::arg("y1"), py::arg("color"))
+        .def("get_width", &Image::get_width, "Obtiene el ancho de la imagen")
+        .def("get_height", &Image::get_height, "Obtiene la altura de la imagen")
+        .def("get_max_val", &Image::get_max_val, "Obtiene el valor maximo de las muestras")
+        .def("get_mode", &Image::get_mode, "Obtiene el modo: 'pbm', 'pgm', 'ppm' o 'pam'")
+        .def("is_contiguous", &Image::is_contiguous, "False si es una vista con huecos entre filas")
 
-        .def("draw_rectangle", &Image::draw_rectangle, "Dibuja un rectángulo",
-             py::arg("x0"), py::arg("y0"), py::arg("x1"), py::arg("y1"), py::arg("color"), py::arg("fill") = false)
+        .def("view", &Image::view,
+             "Subimagen (x, y, w, h) que comparte la memoria de esta: dibujar, guardar o usar su buffer trabaja sobre la original. En pbm x debe ser multiplo de 8",
+             py::arg("x"), py::arg("y"), py::arg("w"), py::arg("h"))
+        .def("blit", &Image::blit,
+             "Copia src (mismo modo y maxval) con su esquina en (x, y), recortada contra la imagen",
+             py::arg("src"), py::arg("x"), py::arg("y"), py::call_guard<py::gil_scoped_release>())
+        .def("convert_depth", &Image::convert_depth,
+             "Devuelve una copia con las muestras reescaladas a max_val (16 bits si max_val > 255)",
+             py::arg("max_val"), py::call_guard<py::gil_scoped_release>())
+        .def("convert", [](const Image& self, const std::string& mode, std::optional<std::string> method) {
+                 py::gil_scoped_release release;
+                 return self.convert(mode, method.value_or(""));
+             },
+             "Devuelve una copia en otro modo. A 'pgm': method 'luma' (por defecto) o 'average'; a 'pbm': 'threshold' (por defecto), 'ordered' o 'floyd-steinberg'. 'pam' se compone sobre blanco al salir y entra opaco",
+             py::arg("mode"), py::arg("method") = py::none())
+        .def("resize", &Image::resize,
+             "Devuelve una copia de width x height con el filtro 'box', 'bilinear' o 'lanczos'",
+             py::arg("width"), py::arg("height"), py::arg("filter") = "box", py::call_guard<py::gil_scoped_release>())
+        .def("thumbnail", &Image::thumbnail,
+             "Copia reducida cuyo lado mayor mide como mucho max_side, con la misma proporcion",
+             py::arg("max_side"), py::call_guard<py::gil_scoped_release>())
 
-        .def("draw_circle", &Image::draw_circle, "Dibuja un círculo (Midpoint)",
-             py::arg("xc"), py::arg("yc"), py::arg("r"), py::arg("color"), py::arg("fill") = false)
+        .def("checksum", &Image::checksum,
+             "Hash de 64 bits (no criptografico) del raster, el tamaño, el modo y el maxval",
+             py::call_guard<py::gil_scoped_release>())
 
-        .def("get_width", &Image::get_width, "Obtiene el ancho de la imagen")
-        .def("get_height", &Image::get_height, "Obtiene la altura de la imagen")
+        .def("equals", &Image::equals, "True si tamaño, modo, maxval y pixeles coinciden",
+             py::arg("other"), py::call_guard<py::gil_scoped_release>())
+
+        .def("diff", [](const Image& self, const Image& other) {
+            Image::Difference d;
+            {
+                py::gil_scoped_release release;
+                d = self.diff(other);
+            }
+            py::object box = py::none();
+            if (d.count) box = py::make_tuple(d.x0, d.y0, d.x1, d.y1);
+            return py::make_tuple(d.count, box);
+        }, "Cuenta los pixeles distintos: (cantidad, (x0, y0, x1, y1) que los contiene o None)",
+             py::arg("other"))
+
+        .def("psnr", &Image::psnr, "PSNR en dB frente a otra imagen (inf si son iguales)",
+             py::arg("other"), py::call_guard<py::gil_scoped_release>())
 
         
+        // El buffer exportado es escribible salvo en imagenes de solo lectura: modificar
+        // np.asarray(img) en sitio es la forma prevista de aplicar filtros de NumPy
         .def_buffer([](Image &img) -> py::buffer_info {
-            size_t channels = img.get_data().size() / ((size_t)img.get_width() * img.get_height());
-            std::string format = py::format_descriptor<unsigned char>::format();
-            size_t itemsize = sizeof(unsigned char);
+            size_t channels = img.get_channels();
+            bool wide = img.get_sample_size() == 2;
+            std::string format = wide ? py::format_descriptor<uint16_t>::format()
+                                      : py::format_descriptor<unsigned char>::format();
+            size_t itemsize = img.get_sample_size();
 
-            if (channels == 3) { // PPM (3D: height, width, channels)
+            if (channels >= 3) { // PPM y PAM (3D: height, width, channels)
                 return py::buffer_info(
-                    (void*)img.get_data().data(), // Puntero a los datos
-                    itemsize,                    // (byte)
+                    (void*)img.get_pixels(), // Puntero a los datos
+                    itemsize,                    // (byte o uint16)
                     format,                     
                     3,                           
                     { (size_t)img.get_height(), (size_t)img.get_width(), channels }, 
-                    { itemsize * img.get_width() * channels, itemsize * channels, itemsize } 
+                    { img.get_stride(), itemsize * channels, itemsize },
+                    !img.is_writable()
                 );
-            } else { // PBM/PGM (2D: height, width)
+            } else { // PGM (2D: height, width); PBM (2D: height, bytes empaquetados por fila)
                  return py::buffer_info(
-                    (void*)img.get_data().data(), // Puntero a los datos
-                    itemsize,                    // (byte)
-                    format,                      // Formato (unsigned char)
+                    (void*)img.get_pixels(), // Puntero a los datos
+                    itemsize,                    // (byte o uint16)
+                    format,                      // Formato (unsigned char o uint16)
                     2,                          
-                    { (size_t)img.get_height(), (size_t)img.get_width() }, 
-                    { itemsize * img.get_width(), itemsize } 
+                    { (size_t)img.get_height(), img.get_row_bytes() / itemsize }, 
+                    { img.get_stride(), itemsize },
+                    !img.is_writable()
                 );
             }
         });
+
+    m.def("convert_many", &convert_many,
+          "Convierte una lista de pares (origen, destino) en paralelo con un pool de hilos nativos (threads=0: uno por nucleo)",
+          py::arg("pairs"), py::arg("binary") = true, py::arg("threads") = 0, py::call_guard<py::gil_scoped_release>());
+
+    m.def("flatten", [](const std::vector<py::object>& items, std::optional<std::pair<int, int>> size, const Color& background) {
+        std::vector<Layer> layers;
+        for (const py::object& item : items) {
+            if (py::isinstance<Image>(item)) {
+                layers.push_back({item.cast<const Image*>(), 0, 0});
+            } else {
+                auto layer = item.cast<std::tuple<const Image*, int, int>>();
+                layers.push_back({std::get<0>(layer), std::get<1>(layer), std::get<2>(layer)});
+            }
+        }
+        if (!size && layers.empty()) throw std::runtime_error("Sin capas hay que indicar size");
+        int width = size ? size->first : layers[0].image->get_width();
+        int height = size ? size->second : layers[0].image->get_height();
+        py::gil_scoped_release release;
+        return flatten(width, height, layers, background);
+    }, "Compone capas pam (RGBA) o ppm en orden, la primera al fondo, sobre un ppm relleno con background. "
+       "Cada capa es una imagen o (imagen, x, y); size=(ancho, alto) es por defecto el de la primera",
+          py::arg("layers"), py::arg("size") = py::none(), py::arg("background") = Color{255, 255, 255});
+
+    m.def("aload", [](const std::string& filename) {
+        // El tamaño del archivo acota lo que ocupara la imagen (en ASCII, de sobra)
+        std::error_code ec;
+        size_t bytes = static_cast<size_t>(std::filesystem::file_size(filename, ec));
+        return submit_async(ec ? 0 : bytes, py::none(), [filename]() { return Image(filename); });
+    }, "Como Image(filename), pero en el pool nativo: devuelve un Future de asyncio con la imagen", py::arg("filename"));
+
+    m.def("set_async_limits", [](unsigned threads, size_t max_bytes) {
+        async_pool().set_limits(threads, max_bytes);
+    }, "Hilos del pool de aload/asave/arender (0 = uno por nucleo) y bytes que pueden estar en curso a la vez; "
+       "las peticiones que no caben esperan en cola sin bloquear el bucle",
+          py::arg("threads") = 0, py::arg("max_bytes") = size_t(256) << 20);
+    m.def("async_info", []() {
+        WorkerPool::Info info = async_pool().info();
+        py::dict result;
+        result["threads"] = info.threads;
+        result["max_bytes"] = info.max_bytes;
+        result["bytes_in_flight"] = info.bytes_in_flight;
+        result["running"] = info.running;
+        result["queued"] = info.queued;
+        return result;
+    }, "Hilos, limite de bytes, bytes y tareas en curso y tareas en cola del pool asincrono");
+    py::module_::import("atexit").attr("register")(py::cpp_function([]() {
+        py::gil_scoped_release release;
+        async_pool().shutdown();
+    }));
+
+    m.def("probe", [](const std::string& path) {
+        Header header;
+        {
+            py::gil_scoped_release release;
+            header = probe(path);
+        }
+        return header_dict(header);
+    }, "Lee solo la cabecera: magic, width, height, max_val, depth (canales) y data_offset (inicio del raster)", py::arg("path"));
+
+    m.def("index_directory", [](const std::string& directory, std::optional<std::string> index_path, bool recursive,
+                                unsigned threads) {
+        std::vector<IndexEntry> entries;
+        {
+            py::gil_scoped_release release;
+            entries = index_directory(directory, index_path.value_or(""), recursive, threads);
+        }
+        py::dict result;
+        for (const IndexEntry& e : entries) {
+            py::dict entry = e.error.empty() ? header_dict(e.header) : py::dict();
+            if (!e.error.empty()) entry["error"] = e.error;
+            entry["size"] = e.size;
+            result[py::str(e.path)] = entry;
+        }
+        return result;
+    }, "Sondea en paralelo las cabeceras de los .pbm/.pgm/.ppm/.pnm/.pam de un directorio; con index_path "
+       "guarda un indice y en la siguiente pasada solo relee los archivos que cambiaron",
+          py::arg("directory"), py::arg("index_path") = py::none(), py::arg("recursive") = true, py::arg("threads") = 0);
+
+    m.def("enable_stats", &stats::enable, "Activa o desactiva las estadisticas por operacion", py::arg("enabled") = true);
+    m.def("reset_stats", &stats::reset, "Pone a cero las estadisticas");
+    m.def("stats", []() {
+        std::vector<stats::Totals> totals = stats::snapshot();
+        py::dict result;
+        for (size_t i = 0; i < totals.size(); ++i) {
+            const stats::Totals& t = totals[i];
+            if (t.calls == 0) continue;
+            py::dict entry;
+            entry["calls"] = t.calls;
+            entry["pixels"] = t.pixels;
+            entry["bytes_read"] = t.bytes_read;
+            entry["bytes_written"] = t.bytes_written;
+            entry["ns"] = t.nanoseconds;
+            result[stats::op_name(static_cast<stats::Op>(i))] = entry;
+        }
+        return result;
+    }, "Estadisticas acumuladas por operacion: llamadas, pixeles, bytes leidos y escritos y nanosegundos");
+    m.def("set_trace", [](py::object target) {
+        if (target.is_none()) {
+            stats::set_trace(nullptr);
+        } else if (py::isinstance<py::str>(target)) {
+            stats::set_trace_file(target.cast<std::string>());
+        } else {
+            // record() llama a una copia de la traza fuera de su mutex, asi que la ultima copia
+            // puede destruirse en un hilo nativo sin el GIL (si otro hilo la cambia mientras
+            // tanto): la referencia a la funcion se suelta siempre tomando el GIL
+            struct Callback {
+                py::function fn;
+                ~Callback() {
+                    py::gil_scoped_acquire gil;
+                    fn = py::function();
+                }
+            };
+            auto callback = std::make_shared<Callback>();
+            callback->fn = target.cast<py::function>();
+            // La funcion de Python se llama con el GIL tomado; sus excepciones no pueden
+            // interrumpir la operacion medida y se reportan como no capturables
+            stats::set_trace([callback](const stats::Event& e) {
+                py::gil_scoped_acquire gil;
+                try {
+                    py::dict event;
+                    event["op"] = stats::op_name(e.op);
+                    event["start_ns"] = e.start_ns;
+                    event["duration_ns"] = e.duration_ns;
+                    event["pixels"] = e.pixels;
+                    event["bytes_read"] = e.bytes_read;
+                    event["bytes_written"] = e.bytes_written;
+                    callback->fn(event);
+                } catch (py::error_already_set& err) {
+                    err.discard_as_unraisable("netpbm_cpp trace");
+                }
+            });
+        }
+    }, "Envia cada operacion a una funcion (recibe un dict) o a un archivo JSON Lines; None la desactiva",
+       py::arg("target"));
+    // La traza puede guardar una funcion de Python: se suelta antes de cerrar el interprete
+    py::module_::import("atexit").attr("register")(py::cpp_function([]() { stats::set_trace(nullptr); }));
+
+    py::class_<ImagePool>(m, "ImagePool")
+        .def(py::init<size_t>(), py::arg("capacity") = 16)
+        .def("acquire", &ImagePool::acquire,
+             "Imagen de width x height reutilizando un raster libre del pool si lo hay; vuelve al pool cuando la imagen desaparece. Con clear=False conserva el contenido anterior",
+             py::arg("width"), py::arg("height"), py::arg("mode"), py::arg("max_val") = 255, py::arg("clear") = true,
+             py::call_guard<py::gil_scoped_release>())
+        .def("info", [](const ImagePool& pool) {
+            ImagePool::Info info = pool.info();
+            py::dict result;
+            result["hits"] = info.hits;
+            result["misses"] = info.misses;
+            result["free"] = info.free;
+            result["capacity"] = info.capacity;
+            return result;
+        }, "Aciertos, fallos, rasters libres y capacidad del pool")
+        .def("set_capacity", &ImagePool::set_capacity, "Cambia cuantos rasters libres se guardan", py::arg("capacity"))
+        .def("clear", &ImagePool::clear, "Libera los rasters guardados y pone a cero los contadores");
+
+    py::class_<DisplayList> display_list(m, "DisplayList");
+    def_drawing(display_list);
+    display_list
+        .def(py::init<int, int, const std::string&>(), py::arg("width"), py::arg("height"), py::arg("mode"))
+        .def("render", &DisplayList::render,
+             "Rasteriza los comandos en una imagen nueva; con use_cache=True reutiliza renders identicos",
+             py::arg("use_cache") = true, py::call_guard<py::gil_scoped_release>())
+        .def("arender", [](py::object self, bool use_cache) {
+                 const DisplayList& list = self.cast<const DisplayList&>();
+                 // Cota superior del raster (pam, 4 bytes por pixel)
+                 size_t bytes = (size_t)list.get_width() * list.get_height() * 4;
+                 return submit_async(bytes, self, [&list, use_cache]() { return list.render(use_cache); });
+             },
+             "Como render, pero en el pool nativo: devuelve un Future de asyncio con la imagen. La lista no debe modificarse hasta que termine",
+             py::arg("use_cache") = true)
+        .def("digest", &DisplayList::digest, "Hash de 64 bits del tamaño, el modo y los comandos")
+        .def("hidden_count", &DisplayList::hidden_count, "Comandos que render() omite por quedar tapados")
+        .def("__len__", &DisplayList::size)
+        .def_property_readonly("width", &DisplayList::get_width)
+        .def_property_readonly("height", &DisplayList::get_height)
+        .def_static("set_cache_size", &DisplayList::set_cache_capacity,
+                    "Numero maximo de renders guardados en el cache (0 lo desactiva)", py::arg("size"))
+        .def_static("clear_cache", &DisplayList::clear_cache, "Vacia el cache y sus contadores")
+        .def_static("cache_info", []() {
+            DisplayList::CacheInfo info = DisplayList::cache_info();
+            py::dict result;
+            result["hits"] = info.hits;
+            result["misses"] = info.misses;
+            result["size"] = info.size;
+            result["capacity"] = info.capacity;
+            return result;
+        }, "Aciertos, fallos, entradas y capacidad del cache");
+
+    // Las bandas son vistas sobre el buffer del lector: la siguiente iteracion las sobrescribe
+    py::class_<StripReader>(m, "StripReader")
+        .def(py::init<const std::string&, int>(), py::arg("filename"), py::arg("rows") = 64)
+        .def("__iter__", [](py::object self) { return self; })
+        .def("__next__", [](py::object self) {
+            StripReader& reader = self.cast<StripReader&>();
+            int count;
+            {
+                py::gil_scoped_release release;
+                count = reader.next();
+            }
+            if (count == 0) throw py::stop_iteration();
+            return py::array_t<unsigned char>(raster_shape(count, reader.get_width(), reader.get_channels()),
+                                              reader.get_strip(), self);
+        }, "Lee la siguiente banda de filas")
+        .def("close", &StripReader::close, "Cierra el archivo")
+        .def("__enter__", [](py::object self) { return self; })
+        .def("__exit__", [](StripReader& reader, py::object, py::object, py::object) { reader.close(); })
+        .def_property_readonly("width", &StripReader::get_width)
+        .def_property_readonly("height", &StripReader::get_height)
+        .def_property_readonly("channels", &StripReader::get_channels)
+        .def_property_readonly("max_val", &StripReader::get_max_val)
+        .def_property_readonly("magic", &StripReader::get_magic)
+        .def_property_readonly("rows", &StripReader::get_rows)
+        .def_property_readonly("row", &StripReader::get_row, "Primera fila de la ultima banda leida");
+
+    py::class_<StripWriter>(m, "StripWriter")
+        .def(py::init<const std::string&, int, int, const std::string&, bool>(),
+             py::arg("filename"), py::arg("width"), py::arg("height"), py::arg("mode"), py::arg("binary") = false)
+        .def("write", [](StripWriter& writer, const ByteArray& strip) {
+            std::vector<py::ssize_t> shape(strip.shape(), strip.shape() + strip.ndim());
+            if (strip.ndim() < 1 || shape != raster_shape(shape[0], writer.get_width(), writer.get_channels()))
+                throw std::runtime_error(writer.get_channels() == 1
+                    ? "La banda debe ser un arreglo de N x " + std::to_string(writer.get_width())
+                    : "La banda debe ser un arreglo de N x " + std::to_string(writer.get_width()) + " x 3");
+            py::gil_scoped_release release;
+            writer.write(strip.data(), (int)shape[0]);
+        }, "Anade una banda de filas", py::arg("strip"))
+        .def("close", &StripWriter::close, "Vuelca y cierra el archivo; falla si faltan filas")
+        .def("__enter__", [](py::object self) { return self; })
+        .def("__exit__", [](StripWriter& writer, py::object exc_type, py::object, py::object) {
+            if (exc_type.is_none()) writer.close();
+        })
+        .def_property_readonly("width", &StripWriter::get_width)
+        .def_property_readonly("height", &StripWriter::get_height)
+        .def_property_readonly("channels", &StripWriter::get_channels)
+        .def_property_readonly("rows_written", &StripWriter::get_rows_written);
+
+    // Un int es un descriptor ya abierto (sys.stdout.fileno(), una pipe); si no, una ruta
+    py::class_<FrameWriter>(m, "FrameWriter")
+        .def(py::init([](py::object target) {
+                 if (py::isinstance<py::int_>(target)) return std::unique_ptr<FrameWriter>(new FrameWriter(target.cast<int>()));
+                 std::string path = py::str(py::module_::import("os").attr("fspath")(target));
+                 return std::unique_ptr<FrameWriter>(new FrameWriter(path));
+             }), py::arg("path_or_fd"))
+        .def("write", [](FrameWriter& writer, const Image& frame) {
+                 py::gil_scoped_release release;
+                 writer.write(frame);
+             }, "Anade la imagen al flujo en binario (P4/P5/P6)", py::arg("frame"))
+        .def("write", [](FrameWriter& writer, py::buffer frame, std::optional<std::string> mode) {
+                 Image img = image_from_buffer(frame, mode);
+                 py::gil_scoped_release release;
+                 writer.write(img);
+             }, "Anade un arreglo uint8 (alto, ancho) o (alto, ancho, 3) como frame, sin copiarlo",
+             py::arg("frame"), py::arg("mode") = py::none())
+        .def("close", &FrameWriter::close, "Cierra el flujo")
+        .def("__enter__", [](py::object self) { return self; })
+        .def("__exit__", [](FrameWriter& writer, py::object, py::object, py::object) { writer.close(); })
+        .def_property_readonly("frames", &FrameWriter::get_frames);
+
+    py::class_<FrameReader>(m, "FrameReader")
+        .def(py::init([](py::object source) {
+                 if (py::isinstance<py::int_>(source)) return std::unique_ptr<FrameReader>(new FrameReader(source.cast<int>()));
+                 std::string path = py::str(py::module_::import("os").attr("fspath")(source));
+                 return std::unique_ptr<FrameReader>(new FrameReader(path));
+             }), py::arg("path_or_fd"))
+        .def("__iter__", [](py::object self) { return self; })
+        // Siempre devuelve la misma Image, sobrescrita con cada frame: hay que copiar lo
+        // que se quiera conservar
+        .def("__next__", [](FrameReader& reader) -> Image& {
+                 bool more;
+                 {
+                     py::gil_scoped_release release;
+                     more = reader.next();
+                 }
+                 if (!more) throw py::stop_iteration();
+                 return reader.get_frame();
+             }, py::return_value_policy::reference_internal)
+        .def("close", &FrameReader::close, "Cierra el flujo")
+        .def("__enter__", [](py::object self) { return self; })
+        .def("__exit__", [](FrameReader& reader, py::object, py::object, py::object) { reader.close(); })
+        .def_property_readonly("frames", &FrameReader::get_frames, "Frames leidos hasta ahora");
 }
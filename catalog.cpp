@@ -0,0 +1,166 @@
+#include "catalog.h"
+#include "stats.h"
+#include <algorithm>
+#include <atomic>
+#include <cctype>
+#include <filesystem>
+#include <fstream>
+#include <sstream>
+#include <stdexcept>
+#include <thread>
+#include <unordered_map>
+
+namespace fs = std::filesystem;
+
+Header probe(const std::string& path) {
+    stats::Scope scope(stats::Op::Probe);
+    std::ifstream file(path, std::ios::in | std::ios::binary);
+    if (!file) throw std::runtime_error("No se pudo abrir el archivo: " + path);
+
+    // Un buffer pequeño: normalmente la cabecera entera cabe en la primera lectura
+    Scanner in([&file](char* dst, size_t n) {
+        file.read(dst, n);
+        stats::bytes_read += static_cast<uint64_t>(file.gcount());
+        return static_cast<size_t>(file.gcount());
+    }, 4096);
+    return in.read_header();
+}
+
+// Formato del indice: una linea de version y despues una linea por archivo con los
+// campos separados por tabuladores (ruta, mtime, tamaño, magic, ancho, alto, maxval,
+// canales, offset del raster, error)
+static const char* const index_version = "netpbm-index\t2";
+
+static bool is_netpbm_file(const fs::path& p) {
+    std::string ext = p.extension().string();
+    std::transform(ext.begin(), ext.end(), ext.begin(), [](unsigned char c) { return std::tolower(c); });
+    return ext == ".pbm" || ext == ".pgm" || ext == ".ppm" || ext == ".pnm" || ext == ".pam";
+}
+
+static std::unordered_map<std::string, IndexEntry> read_index(const std::string& index_path) {
+    std::unordered_map<std::string, IndexEntry> entries;
+    std::ifstream file(index_path);
+    std::string line;
+    // Un indice ausente, de otra version o ilegible solo obliga a sondear todo de nuevo
+    if (!file || !std::getline(file, line) || line != index_version) return entries;
+    while (std::getline(file, line)) {
+        if (line.empty()) continue;
+        std::vector<std::string> fields;
+        std::istringstream row(line);
+        for (std::string field; std::getline(row, field, '\t');) fields.push_back(field);
+        if (line.back() == '\t') fields.emplace_back();
+        if (fields.size() != 10) continue;
+        try {
+            IndexEntry e;
+            e.path = fields[0];
+            e.mtime = std::stoll(fields[1]);
+            e.size = std::stoull(fields[2]);
+            e.header.magic = fields[3];
+            e.header.width = std::stoi(fields[4]);
+            e.header.height = std::stoi(fields[5]);
+            e.header.max_val = std::stoi(fields[6]);
+            e.header.depth = std::stoi(fields[7]);
+            e.header.data_offset = std::stoull(fields[8]);
+            e.error = fields[9];
+            entries[e.path] = std::move(e);
+        } catch (const std::exception&) {
+            // linea corrupta: ese archivo se vuelve a sondear
+        }
+    }
+    return entries;
+}
+
+// Se escribe a un temporal y se renombra, para que una pasada interrumpida no deje un
+// indice a medias
+static void write_index(const std::string& index_path, const std::vector<IndexEntry>& entries) {
+    std::string tmp = index_path + ".tmp";
+    {
+        std::ofstream file(tmp, std::ios::out | std::ios::trunc);
+        if (!file) throw std::runtime_error("No se pudo escribir el indice: " + index_path);
+        file << index_version << '\n';
+        for (const IndexEntry& e : entries) {
+            // Una ruta con tabuladores o saltos de linea no se puede guardar en este formato
+            if (e.path.find_first_of("\t\r\n") != std::string::npos) continue;
+            const Header& h = e.header;
+            file << e.path << '\t' << e.mtime << '\t' << e.size << '\t' << h.magic << '\t' << h.width << '\t'
+                 << h.height << '\t' << h.max_val << '\t' << h.depth << '\t' << h.data_offset << '\t' << e.error << '\n';
+        }
+        if (!file) throw std::runtime_error("No se pudo escribir el indice: " + index_path);
+    }
+    std::error_code ec;
+    fs::rename(tmp, index_path, ec);
+    if (ec) throw std::runtime_error("No se pudo escribir el indice: " + index_path + " (" + ec.message() + ")");
+}
+
+std::vector<IndexEntry> index_directory(const std::string& directory, const std::string& index_path, bool recursive,
+                                        unsigned threads) {
+    stats::Scope scope(stats::Op::IndexDirectory);
+    if (!fs::is_directory(directory)) throw std::runtime_error("No es un directorio: " + directory);
+
+    std::vector<IndexEntry> entries;
+    auto add = [&](const fs::directory_entry& item) {
+        std::error_code ec;
+        if (!item.is_regular_file(ec) || !is_netpbm_file(item.path())) return;
+        IndexEntry e;
+        e.path = item.path().string();
+        e.size = item.file_size(ec);
+        e.mtime = static_cast<int64_t>(item.last_write_time(ec).time_since_epoch().count());
+        if (!ec) entries.push_back(std::move(e));
+    };
+    // Cada directorio se recorre por separado y con error_code: si uno desaparece o no se
+    // puede leer a mitad de la pasada se salta, igual que un archivo que falla al sondearlo
+    auto options = fs::directory_options::skip_permission_denied;
+    std::vector<fs::path> dirs{directory};
+    while (!dirs.empty()) {
+        fs::path dir = std::move(dirs.back());
+        dirs.pop_back();
+        std::error_code ec;
+        fs::directory_iterator it(dir, options, ec), end;
+        if (ec && dir == directory) throw std::runtime_error("No se pudo leer el directorio: " + directory + " (" + ec.message() + ")");
+        for (; !ec && it != end; it.increment(ec)) {
+            std::error_code type_ec;
+            // Como recursive_directory_iterator, sin seguir enlaces a directorios
+            if (recursive && it->is_directory(type_ec) && !it->is_symlink(type_ec)) dirs.push_back(it->path());
+            else add(*it);
+        }
+    }
+    std::sort(entries.begin(), entries.end(), [](const IndexEntry& a, const IndexEntry& b) { return a.path < b.path; });
+
+    // Lo que no cambio desde la ultima pasada se toma del indice
+    std::vector<size_t> pending;
+    if (!index_path.empty()) {
+        std::unordered_map<std::string, IndexEntry> previous = read_index(index_path);
+        for (size_t i = 0; i < entries.size(); ++i) {
+            auto it = previous.find(entries[i].path);
+            if (it != previous.end() && it->second.mtime == entries[i].mtime && it->second.size == entries[i].size)
+                entries[i] = std::move(it->second);
+            else
+                pending.push_back(i);
+        }
+    } else {
+        for (size_t i = 0; i < entries.size(); ++i) pending.push_back(i);
+    }
+
+    // Igual que convert_many: cada hilo toma el siguiente archivo libre
+    if (threads == 0) threads = std::max(1u, std::thread::hardware_concurrency());
+    threads = static_cast<unsigned>(std::min<size_t>(threads, pending.size()));
+    std::atomic<size_t> next(0);
+    auto worker = [&]() {
+        for (size_t k = next++; k < pending.size(); k = next++) {
+            IndexEntry& e = entries[pending[k]];
+            try {
+                e.header = probe(e.path);
+            } catch (const std::exception& ex) {
+                e.error = ex.what();
+                std::replace_if(e.error.begin(), e.error.end(), [](char c) { return c == '\t' || c == '\n' || c == '\r'; }, ' ');
+            }
+        }
+    };
+    std::vector<std::thread> pool;
+    for (unsigned t = 1; t < threads; ++t) pool.emplace_back(worker);
+    if (threads > 0) worker();
+    for (std::thread& t : pool) t.join();
+
+    if (!index_path.empty()) write_index(index_path, entries);
+    return entries;
+}
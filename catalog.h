@@ -0,0 +1,31 @@
+#ifndef CATALOG_H
+#define CATALOG_H
+
+#include "netpbm_io.h"
+#include <cstdint>
+#include <string>
+#include <vector>
+
+// Lee solo la cabecera de un archivo Netpbm, sin tocar el raster
+Header probe(const std::string& path);
+
+// Un archivo del indice: su cabecera, o el error que dio al sondearlo (error vacio si
+// se leyo bien). mtime (en las unidades del reloj de archivos de la plataforma) y size
+// identifican la version del archivo que se sondeo.
+struct IndexEntry {
+    std::string path;
+    int64_t mtime = 0;
+    uint64_t size = 0;
+    Header header;
+    std::string error;
+};
+
+// Sondea los .pbm/.pgm/.ppm/.pnm/.pam de directory (y sus subdirectorios si recursive) con
+// `threads` hilos nativos (0 = uno por nucleo). Con index_path el resultado se guarda en
+// ese archivo y la siguiente pasada solo vuelve a sondear los archivos nuevos o cuyo
+// tamaño o fecha de modificacion cambiaron; los borrados desaparecen del indice.
+// Devuelve las entradas ordenadas por ruta.
+std::vector<IndexEntry> index_directory(const std::string& directory, const std::string& index_path = "",
+                                        bool recursive = true, unsigned threads = 0);
+
+#endif // CATALOG_H
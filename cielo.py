@@ -1,9 +1,9 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import netpbm_cpp as netpbm
 import os
 import random
 import time
+from roundtrip import report_roundtrip
 
 class Colors:
     BLACK_SILHOUETTE = (10, 10, 20)
@@ -14,11 +14,13 @@ class Colors:
 
 
 def visualize_image(image_obj, title, ax=None):
+    import matplotlib.pyplot as plt
 
     show_plot = (ax is None)
     if show_plot:
         fig, ax = plt.subplots(figsize=(8, 8))
 
+    image_obj = image_obj.thumbnail(1024)
     img_data = np.array(image_obj, copy=False)
 
     if len(img_data.shape) == 1:
@@ -42,37 +44,39 @@ def visualize_image(image_obj, title, ax=None):
 def create_night_sky_scene(width, height):
     
     print("Creando una nueva escena de cielo nocturno...")
-    img = netpbm.Image(width, height, 'ppm')
+    scene = netpbm.DisplayList(width, height, 'ppm')
 
 
     background_color = netpbm.Color(*Colors.DEEP_SPACE_BLUE)
-    img.draw_rectangle(0, 0, width, height, background_color, fill=True)
+    scene.draw_rectangle(0, 0, width, height, background_color, fill=True)
 
   
-    star_colors = [netpbm.Color(*Colors.STAR_YELLOW), netpbm.Color(*Colors.STAR_BLUE)]
+    star_colors = [Colors.STAR_YELLOW, Colors.STAR_BLUE]
+    stars, colors = [], []
     for _ in range(200):
         x = random.randint(0, width - 1)
         y = random.randint(0, int(height * 0.8)) 
         
-        img.draw_line(x, y, x, y, random.choice(star_colors))
+        stars.append((x, y))
+        colors.append(random.choice(star_colors))
+    scene.draw_points(np.array(stars, dtype=np.int32), np.array(colors, dtype=np.uint8))
 
     moon_color = netpbm.Color(*Colors.MOON_GLOW)
     moon_x, moon_y, moon_r = int(width * 0.7), int(height * 0.3), int(width * 0.15)
-    img.draw_circle(moon_x, moon_y, moon_r, moon_color, fill=True)
+    scene.draw_circle(moon_x, moon_y, moon_r, moon_color, fill=True)
     
     
     shadow_offset = int(width * 0.03)
-    img.draw_circle(moon_x - shadow_offset, moon_y + shadow_offset, moon_r, background_color, fill=True)
+    scene.draw_circle(moon_x - shadow_offset, moon_y + shadow_offset, moon_r, background_color, fill=True)
     
 
     silhouette_color = netpbm.Color(*Colors.BLACK_SILHOUETTE)
-    img.draw_rectangle(0, int(height * 0.75), width, height, silhouette_color, fill=True)
+    scene.draw_rectangle(0, int(height * 0.75), width, height, silhouette_color, fill=True)
 
     print("Escena nocturna generada exitosamente.")
-    return img
+    return scene.render()
 
 def save_and_verify(image_obj, scene_name="escena2"):
-
     print(f"\nGuardando la '{scene_name}' en formatos P6 (binario) y P3 (ASCII)...")
     ruta_binaria = f'{scene_name}_binaria.ppm'
     ruta_ascii = f'{scene_name}_ascii.ppm'
@@ -92,7 +96,10 @@ def save_and_verify(image_obj, scene_name="escena2"):
         print(f"Error al cargar las imágenes: {e}")
         return 
 
-    print("\nMostrando ambas imágenes para comparación visual...")
+    if report_roundtrip(image_obj, ((ruta_binaria, img_bin), (ruta_ascii, img_ascii))):
+        return
+
+    import matplotlib.pyplot as plt
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
     fig.suptitle("Verificación de Guardado y Carga", fontsize=16)
 
@@ -0,0 +1,321 @@
+#include "displaylist.h"
+#include <algorithm>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <stdexcept>
+#include <unordered_map>
+
+DisplayList::DisplayList(int width, int height, const std::string& mode)
+    : width(width), height(height), mode(mode) {
+    if (mode != "pbm" && mode != "pgm" && mode != "ppm" && mode != "pam")
+        throw std::runtime_error("Modo no soportado. Use 'pbm', 'pgm', 'ppm' o 'pam'.");
+    if (width <= 0 || height <= 0) throw std::runtime_error("Dimensiones invalidas");
+    append(width);
+    append(height);
+    key += mode;
+}
+
+void DisplayList::record(Type type, int a, int b, int c, int d, const Color& color, bool fill) {
+    commands.push_back({type, {a, b, c, d}, color, fill, 0});
+    append(type);
+    append(commands.back().v);
+    append(color);
+    append(fill);
+}
+
+void DisplayList::draw_line(int x0, int y0, int x1, int y1, const Color& color) {
+    record(Type::Line, x0, y0, x1, y1, color, false);
+}
+
+void DisplayList::draw_rectangle(int x0, int y0, int x1, int y1, const Color& color, bool fill) {
+    record(Type::Rectangle, x0, y0, x1, y1, color, fill);
+}
+
+void DisplayList::draw_circle(int xc, int yc, int r, const Color& color, bool fill) {
+    record(Type::Circle, xc, yc, r, 0, color, fill);
+}
+
+void DisplayList::draw_point(int x, int y, const Color& color) {
+    record(Type::Point, x, y, 0, 0, color, false);
+}
+
+static inline Color batch_color(const unsigned char* colors, size_t color_stride, size_t i) {
+    const unsigned char* c = colors + i * color_stride;
+    return Color{c[0], c[1], c[2]};
+}
+
+void DisplayList::draw_points(const int* coords, size_t count, const unsigned char* colors, size_t color_stride) {
+    for (size_t i = 0; i < count; ++i)
+        draw_point(coords[2 * i], coords[2 * i + 1], batch_color(colors, color_stride, i));
+}
+
+void DisplayList::draw_lines(const int* coords, size_t count, const unsigned char* colors, size_t color_stride) {
+    for (size_t i = 0; i < count; ++i) {
+        const int* p = coords + i * 4;
+        draw_line(p[0], p[1], p[2], p[3], batch_color(colors, color_stride, i));
+    }
+}
+
+void DisplayList::draw_rectangles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill) {
+    for (size_t i = 0; i < count; ++i) {
+        const int* p = coords + i * 4;
+        draw_rectangle(p[0], p[1], p[2], p[3], batch_color(colors, color_stride, i), fill);
+    }
+}
+
+void DisplayList::draw_circles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill) {
+    for (size_t i = 0; i < count; ++i) {
+        const int* p = coords + i * 3;
+        draw_circle(p[0], p[1], p[2], batch_color(colors, color_stride, i), fill);
+    }
+}
+
+void DisplayList::fill_gradient(const std::vector<GradientStop>& stops, const std::string& mode,
+                                int x0, int y0, int x1, int y1, double start, double end,
+                                double cx, double cy) {
+    // Mismas comprobaciones que Image::fill_gradient, para fallar al grabar y no al renderizar
+    if (stops.empty()) throw std::runtime_error("El degradado necesita al menos un color");
+    for (size_t k = 1; k < stops.size(); ++k) {
+        if (stops[k].pos < stops[k - 1].pos)
+            throw std::runtime_error("Las paradas del degradado deben estar ordenadas por posicion");
+    }
+    if (mode != "vertical" && mode != "horizontal" && mode != "radial")
+        throw std::runtime_error("Modo de degradado no soportado. Use 'vertical', 'horizontal' o 'radial'.");
+
+    record(Type::Gradient, x0, y0, x1, y1, Color{0, 0, 0}, true);
+    commands.back().index = gradients.size();
+    gradients.push_back({stops, mode, start, end, cx, cy});
+    for (const GradientStop& s : stops) {
+        append(s.pos);
+        append(s.color);
+    }
+    key += mode;
+    append(start);
+    append(end);
+    append(cx);
+    append(cy);
+}
+
+void DisplayList::record_path(Type type, const int* points, size_t count, const Color& color, bool even_odd,
+                              int thickness, bool closed) {
+    if (count == 0) return;
+    // Caja de los puntos ampliada con el grosor del trazo (los poligonos llevan borde de 1)
+    int x0 = points[0], y0 = points[1], x1 = x0, y1 = y0;
+    for (size_t i = 1; i < count; ++i) {
+        x0 = std::min(x0, points[2 * i]);
+        x1 = std::max(x1, points[2 * i]);
+        y0 = std::min(y0, points[2 * i + 1]);
+        y1 = std::max(y1, points[2 * i + 1]);
+    }
+    int margin = thickness / 2 + 1;
+    record(type, x0 - margin, y0 - margin, x1 + margin, y1 + margin, color, type == Type::Polygon);
+    commands.back().index = paths.size();
+    paths.push_back({std::vector<int>(points, points + 2 * count), even_odd, closed, thickness});
+    append(count);
+    key.append(reinterpret_cast<const char*>(points), 2 * count * sizeof(int));
+    append(even_odd);
+    append(thickness);
+    append(closed);
+}
+
+void DisplayList::fill_polygon(const int* points, size_t count, const Color& color, bool even_odd) {
+    record_path(Type::Polygon, points, count, color, even_odd, 1, true);
+}
+
+void DisplayList::draw_polyline(const int* points, size_t count, const Color& color, int thickness, bool closed) {
+    if (thickness < 1) throw std::runtime_error("El grosor debe ser al menos 1");
+    record_path(Type::Polyline, points, count, color, true, thickness, closed);
+}
+
+// FNV-1a de 64 bits sobre la clave
+uint64_t DisplayList::digest() const {
+    uint64_t h = 14695981039346656037ull;
+    for (unsigned char c : key) {
+        h ^= c;
+        h *= 1099511628211ull;
+    }
+    return h;
+}
+
+// Rectangulo inclusivo; vacio si x0 > x1 o y0 > y1
+struct Box {
+    int x0, y0, x1, y1;
+    bool empty() const { return x0 > x1 || y0 > y1; }
+    long long area() const { return empty() ? 0 : (long long)(x1 - x0 + 1) * (y1 - y0 + 1); }
+};
+
+static Box clip(Box b, int width, int height) {
+    return {std::max(b.x0, 0), std::max(b.y0, 0), std::min(b.x1, width - 1), std::min(b.y1, height - 1)};
+}
+
+// Zona que tapa un relleno opaco: un rectangulo, o un circulo relleno (contiene una caja
+// si contiene sus cuatro esquinas, porque el circulo rasterizado es convexo)
+struct Cover {
+    Box box;
+    bool circle;
+    long long xc, yc, r_sq;
+
+    bool contains(const Box& b) const {
+        if (b.x0 < box.x0 || b.y0 < box.y0 || b.x1 > box.x1 || b.y1 > box.y1) return false;
+        if (!circle) return true;
+        for (long long x : {b.x0, b.x1})
+            for (long long y : {b.y0, b.y1})
+                if ((x - xc) * (x - xc) + (y - yc) * (y - yc) > r_sq) return false;
+        return true;
+    }
+};
+
+std::vector<bool> DisplayList::hidden() const {
+    // De atras hacia delante: un comando esta oculto si alguno de los rellenos que vienen
+    // despues contiene todos los pixeles que puede tocar. Se guardan como mucho
+    // max_covers rellenos, los de mayor area.
+    const size_t max_covers = 32;
+    std::vector<Cover> covers;
+    std::vector<bool> result(commands.size(), false);
+
+    for (size_t i = commands.size(); i-- > 0;) {
+        const Command& cmd = commands[i];
+        const int* v = cmd.v;
+        Box bounds;
+        switch (cmd.type) {
+        case Type::Point: bounds = {v[0], v[1], v[0], v[1]}; break;
+        case Type::Circle: bounds = {v[0] - v[2], v[1] - v[2], v[0] + v[2], v[1] + v[2]}; break;
+        case Type::Gradient: bounds = {v[0], v[1], v[2], v[3]}; break;
+        default:
+            bounds = {std::min(v[0], v[2]), std::min(v[1], v[3]), std::max(v[0], v[2]), std::max(v[1], v[3])};
+        }
+        bounds = clip(bounds, width, height);
+
+        bool is_hidden = bounds.empty();
+        for (size_t k = 0; k < covers.size() && !is_hidden; ++k) is_hidden = covers[k].contains(bounds);
+        result[i] = is_hidden;
+        // Solo tapan los rellenos cuya forma se conoce: rectangulos, circulos y degradados
+        if (is_hidden || !cmd.fill || cmd.type == Type::Point || cmd.type == Type::Line || cmd.type == Type::Polygon ||
+            cmd.type == Type::Polyline)
+            continue;
+
+        Cover cover{bounds, cmd.type == Type::Circle, v[0], v[1], (long long)v[2] * v[2]};
+        if (covers.size() < max_covers) {
+            covers.push_back(cover);
+        } else {
+            auto smallest = std::min_element(covers.begin(), covers.end(),
+                [](const Cover& a, const Cover& b) { return a.box.area() < b.box.area(); });
+            if (smallest->box.area() < bounds.area()) *smallest = cover;
+        }
+    }
+    return result;
+}
+
+size_t DisplayList::hidden_count() const {
+    std::vector<bool> h = hidden();
+    return std::count(h.begin(), h.end(), true);
+}
+
+Image DisplayList::rasterize() const {
+    Image img(width, height, mode);
+    std::vector<bool> skip = hidden();
+    for (size_t i = 0; i < commands.size(); ++i) {
+        if (skip[i]) continue;
+        const Command& cmd = commands[i];
+        const int* v = cmd.v;
+        switch (cmd.type) {
+        case Type::Point: {
+            unsigned char rgb[3] = {cmd.color.r, cmd.color.g, cmd.color.b};
+            img.draw_points(v, 1, rgb, 0);
+            break;
+        }
+        case Type::Line: img.draw_line(v[0], v[1], v[2], v[3], cmd.color); break;
+        case Type::Rectangle: img.draw_rectangle(v[0], v[1], v[2], v[3], cmd.color, cmd.fill); break;
+        case Type::Circle: img.draw_circle(v[0], v[1], v[2], cmd.color, cmd.fill); break;
+        case Type::Gradient: {
+            const Gradient& g = gradients[cmd.index];
+            img.fill_gradient(g.stops, g.mode, v[0], v[1], v[2], v[3], g.start, g.end, g.cx, g.cy);
+            break;
+        }
+        case Type::Polygon: {
+            const Path& p = paths[cmd.index];
+            img.fill_polygon(p.points.data(), p.points.size() / 2, cmd.color, p.even_odd);
+            break;
+        }
+        case Type::Polyline: {
+            const Path& p = paths[cmd.index];
+            img.draw_polyline(p.points.data(), p.points.size() / 2, cmd.color, p.thickness, p.closed);
+            break;
+        }
+        }
+    }
+    return img;
+}
+
+// Cache LRU global: la lista va del mas reciente al mas antiguo y el mapa indexa por la
+// clave completa, asi que dos listas distintas nunca comparten entrada
+struct RenderCache {
+    using Entry = std::pair<std::string, std::shared_ptr<const Image>>;
+    std::mutex mutex;
+    std::list<Entry> entries;
+    std::unordered_map<std::string, std::list<Entry>::iterator> index;
+    size_t capacity = 8;
+    size_t hits = 0, misses = 0;
+
+    void trim() {
+        while (entries.size() > capacity) {
+            index.erase(entries.back().first);
+            entries.pop_back();
+        }
+    }
+};
+
+static RenderCache& render_cache() {
+    static RenderCache cache;
+    return cache;
+}
+
+Image DisplayList::render(bool use_cache) const {
+    if (!use_cache) return rasterize();
+
+    RenderCache& cache = render_cache();
+    {
+        std::lock_guard<std::mutex> lock(cache.mutex);
+        if (cache.capacity == 0) return rasterize();
+        auto it = cache.index.find(key);
+        if (it != cache.index.end()) {
+            ++cache.hits;
+            cache.entries.splice(cache.entries.begin(), cache.entries, it->second);
+            return *it->second->second;
+        }
+        ++cache.misses;
+    }
+
+    // Se rasteriza sin el candado; si otro hilo guardo la misma lista mientras tanto se
+    // conserva la suya
+    auto img = std::make_shared<const Image>(rasterize());
+    std::lock_guard<std::mutex> lock(cache.mutex);
+    if (cache.capacity > 0 && cache.index.find(key) == cache.index.end()) {
+        cache.entries.emplace_front(key, img);
+        cache.index[key] = cache.entries.begin();
+        cache.trim();
+    }
+    return *img;
+}
+
+void DisplayList::set_cache_capacity(size_t capacity) {
+    RenderCache& cache = render_cache();
+    std::lock_guard<std::mutex> lock(cache.mutex);
+    cache.capacity = capacity;
+    cache.trim();
+}
+
+void DisplayList::clear_cache() {
+    RenderCache& cache = render_cache();
+    std::lock_guard<std::mutex> lock(cache.mutex);
+    cache.entries.clear();
+    cache.index.clear();
+    cache.hits = cache.misses = 0;
+}
+
+DisplayList::CacheInfo DisplayList::cache_info() {
+    RenderCache& cache = render_cache();
+    std::lock_guard<std::mutex> lock(cache.mutex);
+    return {cache.hits, cache.misses, cache.entries.size(), cache.capacity};
+}
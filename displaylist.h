@@ -0,0 +1,89 @@
+#ifndef DISPLAYLIST_H
+#define DISPLAYLIST_H
+
+#include "netpbm.h"
+#include <cstdint>
+#include <string>
+#include <vector>
+
+// Graba comandos de dibujo sin rasterizar. render() los aplica sobre una imagen nueva,
+// saltandose los que quedan totalmente tapados por un relleno opaco posterior, y guarda
+// el resultado en un cache LRU global: dos listas con el mismo tamaño, modo y comandos
+// devuelven el mismo render sin volver a dibujar.
+class DisplayList {
+public:
+    DisplayList(int width, int height, const std::string& mode);
+
+    void draw_line(int x0, int y0, int x1, int y1, const Color& color);
+    void draw_rectangle(int x0, int y0, int x1, int y1, const Color& color, bool fill = false);
+    void draw_circle(int xc, int yc, int r, const Color& color, bool fill = false);
+    void draw_point(int x, int y, const Color& color);
+
+    // Mismo formato de lotes que Image; cada primitiva se graba por separado
+    void draw_points(const int* coords, size_t count, const unsigned char* colors, size_t color_stride);
+    void draw_lines(const int* coords, size_t count, const unsigned char* colors, size_t color_stride);
+    void draw_rectangles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill = false);
+    void draw_circles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill = false);
+
+    void fill_gradient(const std::vector<GradientStop>& stops, const std::string& mode,
+                       int x0, int y0, int x1, int y1, double start, double end,
+                       double cx = 0.0, double cy = 0.0);
+
+    void fill_polygon(const int* points, size_t count, const Color& color, bool even_odd = true);
+    void draw_polyline(const int* points, size_t count, const Color& color, int thickness = 1, bool closed = false);
+
+    int get_width() const { return width; }
+    int get_height() const { return height; }
+    size_t size() const { return commands.size(); }
+    uint64_t digest() const;
+    // Comandos que render() no dibuja porque un relleno posterior los tapa por completo
+    size_t hidden_count() const;
+
+    Image render(bool use_cache = true) const;
+
+    struct CacheInfo {
+        size_t hits, misses, size, capacity;
+    };
+    static void set_cache_capacity(size_t capacity);
+    static void clear_cache();
+    static CacheInfo cache_info();
+
+private:
+    enum class Type : unsigned char { Point, Line, Rectangle, Circle, Gradient, Polygon, Polyline };
+
+    struct Command {
+        Type type;
+        int v[4];  // en Polygon y Polyline, la caja que pueden tocar
+        Color color;
+        bool fill;
+        size_t index;  // indice en gradients o en paths, segun el tipo
+    };
+
+    struct Gradient {
+        std::vector<GradientStop> stops;
+        std::string mode;
+        double start, end, cx, cy;
+    };
+
+    struct Path {
+        std::vector<int> points;
+        bool even_odd, closed;
+        int thickness;
+    };
+
+    int width, height;
+    std::string mode;
+    std::vector<Command> commands;
+    std::vector<Gradient> gradients;
+    std::vector<Path> paths;
+    std::string key;  // todo lo grabado serializado: identifica la lista en el cache
+
+    void record(Type type, int a, int b, int c, int d, const Color& color, bool fill);
+    void record_path(Type type, const int* points, size_t count, const Color& color, bool even_odd, int thickness,
+                     bool closed);
+    template <typename T> void append(const T& value) { key.append(reinterpret_cast<const char*>(&value), sizeof(T)); }
+    std::vector<bool> hidden() const;
+    Image rasterize() const;
+};
+
+#endif // DISPLAYLIST_H
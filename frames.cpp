@@ -0,0 +1,122 @@
+#include "frames.h"
+#include "stats.h"
+#include <algorithm>
+#include <cerrno>
+#include <stdexcept>
+
+#ifdef _WIN32
+#include <fcntl.h>
+#include <io.h>
+#include <sys/stat.h>
+#else
+#include <fcntl.h>
+#include <unistd.h>
+#endif
+
+// Descriptores en binario tanto en POSIX como en el CRT de Windows
+#ifdef _WIN32
+static int open_fd(const std::string& filename, bool write) {
+    return write ? _open(filename.c_str(), _O_WRONLY | _O_CREAT | _O_TRUNC | _O_BINARY, _S_IREAD | _S_IWRITE)
+                 : _open(filename.c_str(), _O_RDONLY | _O_BINARY);
+}
+static int dup_fd(int fd) {
+    int copy = _dup(fd);
+    if (copy >= 0) _setmode(copy, _O_BINARY);
+    return copy;
+}
+static long read_fd(int fd, char* dst, size_t n) {
+    return _read(fd, dst, static_cast<unsigned>(std::min<size_t>(n, 1u << 30)));
+}
+static long write_fd(int fd, const char* src, size_t n) {
+    return _write(fd, src, static_cast<unsigned>(std::min<size_t>(n, 1u << 30)));
+}
+static void close_fd(int fd) { _close(fd); }
+#else
+static int open_fd(const std::string& filename, bool write) {
+    return write ? ::open(filename.c_str(), O_WRONLY | O_CREAT | O_TRUNC, 0644) : ::open(filename.c_str(), O_RDONLY);
+}
+static int dup_fd(int fd) { return ::dup(fd); }
+static long read_fd(int fd, char* dst, size_t n) { return static_cast<long>(::read(fd, dst, n)); }
+static long write_fd(int fd, const char* src, size_t n) { return static_cast<long>(::write(fd, src, n)); }
+static void close_fd(int fd) { ::close(fd); }
+#endif
+
+FrameWriter::FrameWriter(const std::string& filename) : fd(open_fd(filename, true)) {
+    if (fd < 0) throw std::runtime_error("No se pudo crear el archivo: " + filename);
+}
+
+FrameWriter::FrameWriter(int source) : fd(dup_fd(source)) {
+    if (fd < 0) throw std::runtime_error("Descriptor invalido: " + std::to_string(source));
+}
+
+FrameWriter::~FrameWriter() {
+    if (fd >= 0) close_fd(fd);
+}
+
+void FrameWriter::write_all(const char* src, size_t n) {
+    while (n > 0) {
+        long done = write_fd(fd, src, n);
+        if (done < 0 && errno == EINTR) continue;
+        if (done <= 0) throw std::runtime_error("Error al escribir el frame " + std::to_string(frames));
+        src += done;
+        n -= static_cast<size_t>(done);
+        stats::bytes_written += static_cast<uint64_t>(done);
+    }
+}
+
+void FrameWriter::write(const Image& frame) {
+    stats::Scope scope(stats::Op::FrameWrite);
+    if (fd < 0) throw std::runtime_error("El escritor de frames esta cerrado");
+    frame.write_binary([this](const char* src, size_t n) { write_all(src, n); });
+    stats::pixels += (uint64_t)frame.get_width() * frame.get_height();
+    ++frames;
+}
+
+void FrameWriter::close() {
+    if (fd < 0) return;
+    close_fd(fd);
+    fd = -1;
+}
+
+FrameReader::FrameReader(const std::string& filename) : fd(open_fd(filename, false)) {
+    if (fd < 0) throw std::runtime_error("No se pudo abrir el archivo: " + filename);
+    start();
+}
+
+FrameReader::FrameReader(int source) : fd(dup_fd(source)) {
+    if (fd < 0) throw std::runtime_error("Descriptor invalido: " + std::to_string(source));
+    start();
+}
+
+// read devuelve lo que haya disponible: en una pipe no se espera a llenar el buffer
+void FrameReader::start() {
+    in.reset(new Scanner([this](char* dst, size_t n) -> size_t {
+        while (true) {
+            long got = read_fd(fd, dst, n);
+            if (got < 0 && errno == EINTR) continue;
+            if (got < 0) throw std::runtime_error("Error al leer el frame " + std::to_string(frames));
+            stats::bytes_read += static_cast<uint64_t>(got);
+            return static_cast<size_t>(got);
+        }
+    }));
+}
+
+FrameReader::~FrameReader() {
+    if (fd >= 0) close_fd(fd);
+}
+
+bool FrameReader::next() {
+    stats::Scope scope(stats::Op::FrameRead);
+    if (!in) throw std::runtime_error("El lector de frames esta cerrado");
+    if (!in->next_image()) return false;
+    frame.load(*in);
+    ++frames;
+    return true;
+}
+
+void FrameReader::close() {
+    in.reset();
+    if (fd < 0) return;
+    close_fd(fd);
+    fd = -1;
+}
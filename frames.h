@@ -0,0 +1,60 @@
+#ifndef FRAMES_H
+#define FRAMES_H
+
+#include "netpbm.h"
+#include "netpbm_io.h"
+#include <memory>
+#include <string>
+
+// Flujos de varias imagenes Netpbm seguidas, sin separadores, en un archivo o en un
+// descriptor ya abierto (una pipe, stdin, stdout). Es lo que producen y consumen las
+// herramientas netpbm y ffmpeg con -f image2pipe.
+class FrameWriter {
+public:
+    explicit FrameWriter(const std::string& filename);
+    // Escribe en una copia de fd: cerrar el escritor no cierra el descriptor original
+    explicit FrameWriter(int fd);
+    FrameWriter(const FrameWriter&) = delete;
+    FrameWriter& operator=(const FrameWriter&) = delete;
+    ~FrameWriter();
+
+    // Anade la imagen en binario (P4/P5/P6)
+    void write(const Image& frame);
+    void close();
+
+    size_t get_frames() const { return frames; }
+
+private:
+    int fd = -1;
+    size_t frames = 0;
+
+    void write_all(const char* src, size_t n);
+};
+
+// Lee las imagenes de un flujo una tras otra sobre la misma Image: mientras el tamaño
+// no cambie no se reserva memoria por frame.
+class FrameReader {
+public:
+    explicit FrameReader(const std::string& filename);
+    explicit FrameReader(int fd);
+    FrameReader(const FrameReader&) = delete;
+    FrameReader& operator=(const FrameReader&) = delete;
+    ~FrameReader();
+
+    // Lee el siguiente frame en get_frame(); false al terminar el flujo
+    bool next();
+    void close();
+
+    Image& get_frame() { return frame; }
+    size_t get_frames() const { return frames; }
+
+private:
+    int fd = -1;
+    std::unique_ptr<Scanner> in;
+    Image frame{1, 1, "pgm"};
+    size_t frames = 0;
+
+    void start();
+};
+
+#endif // FRAMES_H
@@ -1,9 +1,8 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import netpbm_cpp as netpbm
 import os
-import time
 import random
+from roundtrip import report_roundtrip
 
 class Colors:
     
@@ -15,11 +14,13 @@ class Colors:
     BLACK = (0, 0, 0)
 
 def visualize_image(image_obj, title, ax=None):
+    import matplotlib.pyplot as plt
     
     show_plot = (ax is None)
     if show_plot:
         fig, ax = plt.subplots(figsize=(8, 8))
 
+    image_obj = image_obj.thumbnail(1024)
     img_data = np.array(image_obj, copy=False)
 
     if len(img_data.shape) == 1:
@@ -41,16 +42,11 @@ def visualize_image(image_obj, title, ax=None):
 def create_underwater_scene(width, height):
  
     print("Creando una nueva escena submarina...")
-    img = netpbm.Image(width, height, 'ppm')
+    scene = netpbm.DisplayList(width, height, 'ppm')
 
  
-    for y in range(height):
-        ratio = y / height
-        r = int((1 - ratio) * Colors.LIGHT_BLUE[0] + ratio * Colors.DEEP_BLUE[0])
-        g = int((1 - ratio) * Colors.LIGHT_BLUE[1] + ratio * Colors.DEEP_BLUE[1])
-        b = int((1 - ratio) * Colors.LIGHT_BLUE[2] + ratio * Colors.DEEP_BLUE[2])
-        water_color = netpbm.Color(r, g, b)
-        img.draw_line(0, y, width - 1, y, water_color)
+    water_stops = [(0.0, netpbm.Color(*Colors.LIGHT_BLUE)), (1.0, netpbm.Color(*Colors.DEEP_BLUE))]
+    scene.fill_gradient(water_stops, mode='vertical')
 
     # Algas
     algas_color = netpbm.Color(*Colors.SEAWEED_GREEN)
@@ -60,26 +56,27 @@ def create_underwater_scene(width, height):
         end_y1 = int(height * 0.7)
         end_x2 = end_x1 + random.randint(-15, 15)
         end_y2 = int(height * 0.5)
-        img.draw_line(start_x, height - 1, end_x1, end_y1, algas_color)
-        img.draw_line(end_x1, end_y1, end_x2, end_y2, algas_color)
+        scene.draw_line(start_x, height - 1, end_x1, end_y1, algas_color)
+        scene.draw_line(end_x1, end_y1, end_x2, end_y2, algas_color)
 
     # Pez 
     fish_color = netpbm.Color(*Colors.FISH_YELLOW)
     eye_color = netpbm.Color(*Colors.BLACK)
     fish_x, fish_y, fish_r = int(width * 0.7), int(height * 0.4), int(width * 0.08)
-    img.draw_circle(fish_x, fish_y, fish_r, fish_color, fill=True)
-    img.draw_circle(fish_x + 10, fish_y - 5, 3, eye_color, fill=True) # Ojo
+    scene.draw_circle(fish_x, fish_y, fish_r, fish_color, fill=True)
+    scene.draw_circle(fish_x + 10, fish_y - 5, 3, eye_color, fill=True) # Ojo
 
     # Burbujas a
-    bubble_color = netpbm.Color(*Colors.BUBBLE_BLUE)
+    bubbles = []
     for _ in range(25):
         x = random.randint(0, width)
         y = random.randint(int(height * 0.2), height)
         radius = random.randint(1, 5)
-        img.draw_circle(x, y, radius, bubble_color, fill=True)
+        bubbles.append((x, y, radius))
+    scene.draw_circles(np.array(bubbles, dtype=np.int32), np.array(Colors.BUBBLE_BLUE, dtype=np.uint8), fill=True)
 
     print("Escena generada exitosamente.")
-    return img
+    return scene.render()
 
 def save_and_verify(image_obj):
     print("\nGuardando la imagen en formatos P6 (binario) y P3 (ASCII)...")
@@ -93,7 +90,6 @@ def save_and_verify(image_obj):
     print(f"   Guardado en '{ruta_ascii}'")
 
     print("\nCargando imágenes desde el disco para verificación...")
-    time.sleep(1)
 
     try:
         img_cargada_bin = netpbm.Image(ruta_binaria)
@@ -104,7 +100,10 @@ def save_and_verify(image_obj):
         print(f"Error al cargar las imágenes: {e}")
         return
 
-    print("\nMostrando ambas imagenes para comparacion visual...")
+    if report_roundtrip(image_obj, ((ruta_binaria, img_cargada_bin), (ruta_ascii, img_cargada_ascii)), sangria="   "):
+        return
+
+    import matplotlib.pyplot as plt
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
     fig.suptitle("Verificación de Guardado y Carga", fontsize=16)
 
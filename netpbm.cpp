@@ -1,27 +1,60 @@
 
 #include "netpbm.h"
+#include "netpbm_io.h"
+#include "stats.h"
 #include <fstream>
-#include <iostream>
 #include <sstream>
 #include <cmath>
 #include <algorithm>
 #include <vector> 
+#include <cstring>
+#include <atomic>
+#include <mutex>
+#include <thread>
+#include <limits>
+#include <unordered_map>
 
 
-Image::Image(int w, int h, const std::string& mode) : width(w), height(h), max_val(255) {
+Image::Image(int w, int h, const std::string& mode, int max_val) : width(w), height(h) {
+    set_mode(mode, max_val);
+    allocate(get_row_bytes() * height);
+    fill_initial();
+}
+
+void Image::set_mode(const std::string& mode, int max_val) {
+    this->max_val = 255;
+    sample_size = 1;
     if (mode == "pbm") {
         magic_number = "P1";
-        data.resize(width * height, 0); // PBM: 0=blanco
-    } else if (mode == "pgm") {
-        magic_number = "P2";
-        data.resize(width * height, 255); // PGM: 255=blanco
-    } else if (mode == "ppm") {
-        magic_number = "P3";
-        data.resize(width * height * 3, 255); // PPM: 255,255,255=blanco
+        set_kind(Kind::Pbm);
+    } else if (mode == "pgm" || mode == "ppm") {
+        if (max_val < 1 || max_val > 65535) throw std::runtime_error("maxval fuera de rango: " + std::to_string(max_val));
+        this->max_val = max_val;
+        sample_size = max_val > 255 ? 2 : 1;
+        magic_number = mode == "pgm" ? "P2" : "P3";
+        set_kind(mode == "pgm" ? Kind::Pgm : Kind::Ppm);
+    } else if (mode == "pam") {
+        if (max_val != 255) throw std::runtime_error("pam solo admite maxval 255");
+        magic_number = "P7";
+        set_kind(Kind::Pam);
+    } else {
+        throw std::runtime_error("Modo no soportado. Use 'pbm', 'pgm', 'ppm' o 'pam'.");
+    }
+}
+
+void Image::fill_initial() {
+    if (kind == Kind::Pbm) {
+        std::memset(pixels, 0xFF, pixels_size); // PBM: todos los bits a 1 (negro)
+        clear_padding();
+    } else if (kind == Kind::Pam) {
+        std::memset(pixels, 0, pixels_size); // PAM: alfa 0
+    } else if (sample_size == 1) {
+        // PGM: max_val=blanco; PPM: (max_val, max_val, max_val)=blanco
+        std::memset(pixels, max_val, pixels_size);
     } else {
-        throw std::runtime_error("Modo no soportado. Use 'pbm', 'pgm', o 'ppm'.");
+        uint16_t white = static_cast<uint16_t>(max_val);
+        std::fill_n(reinterpret_cast<uint16_t*>(pixels), sample_count(), white);
     }
-    std::cout << "DEBUG: Image created. Data size: " << data.size() << std::endl;
 }
 
 
@@ -29,206 +62,1319 @@ Image::Image(const std::string& filename) {
     load(filename);
 }
 
+// Las copias siempre tienen pixeles propios y contiguos, aunque el original este
+// proyectado o sea una vista
+Image::Image(const Image& other)
+    : width(other.width), height(other.height), max_val(other.max_val),
+      magic_number(other.magic_number), kind(other.kind), channels(other.channels),
+      sample_size(other.sample_size) {
+    size_t row_bytes = get_row_bytes();
+    allocate(row_bytes * height);
+    if (other.is_contiguous()) {
+        std::memcpy(pixels, other.pixels, pixels_size);
+    } else {
+        for (int y = 0; y < height; ++y) std::memcpy(row_ptr(y), other.row_ptr(y), row_bytes);
+        // En una vista pbm los bits tras el ultimo pixel son de la imagen original
+        clear_padding();
+    }
+    dirty = other.dirty;
+}
+
+Image& Image::operator=(const Image& other) {
+    if (this != &other) {
+        Image copy(other);
+        *this = std::move(copy);
+    }
+    return *this;
+}
+
+// Reserva un raster propio y contiguo de size bytes y suelta cualquier memoria externa.
+// El anterior se reutiliza si ninguna vista lo comparte.
+unsigned char* Image::allocate(size_t size) {
+    if (data && data.use_count() == 1) data->resize(size);
+    else data = std::make_shared<std::vector<unsigned char>>(size);
+    pixels = data->data();
+    pixels_size = size;
+    stride = get_row_bytes();
+    storage.reset();
+    read_only = false;
+    dirty.assign(height, Span{0, width - 1});  // contenido nuevo: todo por guardar
+    return pixels;
+}
+
+void Image::check_writable() const {
+    if (read_only) throw std::runtime_error("La imagen es de solo lectura (archivo proyectado o buffer ajeno)");
+}
+
+// Magic de la variante binaria equivalente a la cabecera: en P7 depende de DEPTH (gris,
+// RGB o RGBA de 8 bits); el resto se devuelve tal cual
+static std::string binary_magic(const Header& header) {
+    if (header.magic != "P7") return header.magic;
+    if (header.depth == 1) return "P5";
+    if (header.depth == 3) return "P6";
+    if (header.depth == 4 && header.max_val == 255) return "P7";
+    throw std::runtime_error("PAM no soportado: DEPTH " + std::to_string(header.depth) + ", MAXVAL " +
+                             std::to_string(header.max_val) + (header.tuple_type.empty() ? "" : ", " + header.tuple_type));
+}
+
+Image Image::open_mmap(const std::string& filename, bool writable) {
+    stats::Scope scope(stats::Op::OpenMmap);
+    auto mapping = std::make_shared<MappedFile>(filename, writable);
+
+    // La cabecera se analiza directamente sobre la memoria proyectada
+    size_t offset = 0;
+    Scanner in([&](char* dst, size_t n) {
+        n = std::min(n, mapping->size() - offset);
+        std::memcpy(dst, mapping->data() + offset, n);
+        offset += n;
+        return n;
+    }, 4096);
+    Header header = in.read_header();
+
+    if (header.magic != "P4" && header.magic != "P5" && header.magic != "P6" && header.magic != "P7")
+        throw std::runtime_error("Solo se pueden proyectar archivos P4/P5/P6/P7: " + filename);
+    if (header.max_val > 255)
+        throw std::runtime_error("maxval > 255 no soportado: " + std::to_string(header.max_val));
+
+    Image img;
+    img.magic_number = binary_magic(header);
+    img.width = header.width;
+    img.height = header.height;
+    img.max_val = header.magic == "P4" ? 255 : header.max_val;
+    img.set_kind(img.magic_number == "P4" ? Kind::Pbm : img.magic_number == "P5" ? Kind::Pgm
+                 : img.magic_number == "P6" ? Kind::Ppm : Kind::Pam);
+
+    size_t raster_size = img.get_row_bytes() * img.height;
+    if (mapping->size() - header.data_offset < raster_size)
+        throw std::runtime_error("Archivo truncado: faltan datos del raster");
+
+    img.pixels = mapping->data() + header.data_offset;
+    img.pixels_size = raster_size;
+    img.stride = img.get_row_bytes();
+    img.storage = mapping;
+    img.read_only = !writable;
+    img.dirty.assign(img.height, Span{img.width, -1});  // los cambios van directos al archivo
+    return img;
+}
+
+Image Image::from_memory(unsigned char* data, int width, int height, const std::string& mode,
+                         std::shared_ptr<void> owner, bool writable) {
+    if (width <= 0 || height <= 0) throw std::runtime_error("Dimensiones invalidas");
+    Image img;
+    img.width = width;
+    img.height = height;
+    img.set_mode(mode, 255);
+    img.pixels = data;
+    img.pixels_size = img.get_row_bytes() * height;
+    img.stride = img.get_row_bytes();
+    img.storage = std::move(owner);
+    img.read_only = !writable;
+    img.dirty.assign(height, Span{0, width - 1});
+    return img;
+}
+
+Image Image::view(int x, int y, int w, int h) {
+    if (w <= 0 || h <= 0 || x < 0 || y < 0 || x + w > width || y + h > height)
+        throw std::runtime_error("La vista se sale de la imagen");
+    if (kind == Kind::Pbm && x % 8 != 0)
+        throw std::runtime_error("En pbm la vista debe empezar en una columna multiplo de 8");
+
+    Image v;
+    v.width = w;
+    v.height = h;
+    v.max_val = max_val;
+    v.magic_number = magic_number;
+    v.set_kind(kind);
+    v.sample_size = sample_size;
+    v.data = data;
+    v.storage = storage;
+    v.read_only = read_only;
+    v.stride = stride;
+    v.pixels = kind == Kind::Pbm ? row_ptr(y) + x / 8 : pixel_ptr(x, y);
+    v.pixels_size = (size_t)(h - 1) * stride + v.get_row_bytes();
+    v.dirty.assign(h, Span{w, -1});
+    return v;
+}
+
+// Copia bits de un pbm a partir de columnas arbitrarias: pasa por una fila desempaquetada
+static void copy_bits(const unsigned char* src, int sx, unsigned char* dst, int dx, int n, std::vector<unsigned char>& tmp) {
+    tmp.resize(n);
+    for (int i = 0; i < n; ++i) tmp[i] = (src[(sx + i) >> 3] >> (7 - ((sx + i) & 7))) & 1;
+    for (int i = 0; i < n; ++i) {
+        unsigned char& byte = dst[(dx + i) >> 3];
+        unsigned char bit = static_cast<unsigned char>(0x80 >> ((dx + i) & 7));
+        byte = tmp[i] ? (byte | bit) : (byte & ~bit);
+    }
+}
+
+void Image::blit(const Image& src, int x, int y) {
+    stats::Scope scope(stats::Op::Blit);
+    check_writable();
+    if (src.kind != kind || (kind != Kind::Pbm && src.max_val != max_val))
+        throw std::runtime_error("blit requiere imagenes del mismo modo y maxval");
+
+    // Recorte: (sx, sy) es la esquina de src que cae en (x0, y0)
+    int x0 = std::max(x, 0), y0 = std::max(y, 0);
+    int x1 = std::min(x + src.width, width) - 1, y1 = std::min(y + src.height, height) - 1;
+    if (x0 > x1 || y0 > y1) return;
+    int sx = x0 - x, sy = y0 - y, w = x1 - x0 + 1;
+
+    // Si src comparte memoria con esta imagen y esta por encima del destino, las filas se
+    // copian de abajo arriba para no pisar las que faltan; memmove cubre el solape en la fila
+    bool backwards = std::less<const unsigned char*>()(src.row_ptr(sy), row_ptr(y0));
+    std::vector<unsigned char> tmp;
+    for (int k = 0; k <= y1 - y0; ++k) {
+        int r = backwards ? y1 - y0 - k : k;
+        const unsigned char* from = src.row_ptr(sy + r);
+        unsigned char* to = row_ptr(y0 + r);
+        if (kind != Kind::Pbm) {
+            std::memmove(to + (size_t)x0 * pixel_size(), from + (size_t)sx * pixel_size(), (size_t)w * pixel_size());
+        } else if (sx % 8 == 0 && x0 % 8 == 0 && (w % 8 == 0 || (x1 == width - 1 && is_contiguous()))) {
+            // Alineado: bytes enteros. Si el ultimo lleva relleno (propio, no de la imagen de
+            // la que esta es vista) se deja a 0
+            std::memmove(to + x0 / 8, from + sx / 8, (w + 7) / 8);
+            if (x1 == width - 1) to[get_row_bytes() - 1] &= padding_mask();
+        } else {
+            copy_bits(from, sx, to, x0, w, tmp);
+        }
+    }
+    touch(y0, y1, x0, x1);
+    stats::pixels += (uint64_t)w * (y1 - y0 + 1);
+}
+
 void Image::load(const std::string& filename) {
+    stats::Scope scope(stats::Op::Load);
     std::ifstream file(filename, std::ios::in | std::ios::binary);
     if (!file) throw std::runtime_error("No se pudo abrir el archivo: " + filename);
 
-    file >> magic_number;
+    // Se lee en bloques grandes; el tokenizado lo hace Scanner sin pasar por iostream
+    Scanner in([&file](char* dst, size_t n) {
+        file.read(dst, n);
+        stats::bytes_read += static_cast<uint64_t>(file.gcount());
+        return static_cast<size_t>(file.gcount());
+    });
+    load(in);
+}
+
+void Image::load(Scanner& in) {
+    Header header = in.read_header();
+
+    magic_number = binary_magic(header);
+    width = header.width;
+    height = header.height;
+    max_val = header.max_val;
+    sample_size = max_val > 255 ? 2 : 1;
+
+    if (magic_number == "P1" || magic_number == "P4") set_kind(Kind::Pbm);
+    else if (magic_number == "P2" || magic_number == "P5") set_kind(Kind::Pgm);
+    else if (magic_number == "P7") set_kind(Kind::Pam);
+    else set_kind(Kind::Ppm);
 
-   
-    while (file.peek() == '\n' || file.peek() == '\r' || file.peek() == ' ' || file.peek() == '\t') {
-        file.get();
+    if (magic_number == "P1") read_pbm_ascii(in);
+    else if (magic_number == "P2") read_pgm_ascii(in);
+    else if (magic_number == "P3") read_ppm_ascii(in);
+    else if (magic_number == "P4") read_pbm_binary(in);
+    else if (magic_number == "P5") read_pgm_binary(in);
+    else read_ppm_binary(in);  // P6 y P7: muestras entrelazadas, channels por pixel
+    stats::pixels += (uint64_t)width * height;
+    mark_clean();
+}
+
+void Image::read_pbm_ascii(Scanner& in) {
+    size_t row_bytes = get_row_bytes();
+    allocate(row_bytes * height);
+    std::vector<unsigned char> bits(width);
+    for (int r = 0; r < height; ++r) {
+        in.read_bits(bits.data(), width);
+        unsigned char* row = pixels + r * row_bytes;
+        std::memset(row, 0, row_bytes);
+        for (int c = 0; c < width; ++c)
+            if (bits[c]) row[c >> 3] |= static_cast<unsigned char>(0x80 >> (c & 7));
     }
-    
-    if (file.peek() == '#') {
-        std::string comment;
-        std::getline(file, comment);
+}
+
+// El raster en memoria tiene el mismo formato que en P4: se copia tal cual
+void Image::read_pbm_binary(Scanner& in) {
+    allocate(get_row_bytes() * height);
+    in.read_bytes(reinterpret_cast<char*>(pixels), pixels_size);
+    clear_padding();
+}
+
+// Los bits de relleno de cada fila quedan a 0 para que dos imagenes iguales tengan los
+// mismos bytes
+void Image::clear_padding() {
+    unsigned char mask = padding_mask();
+    if (mask == 0xFF) return;
+    size_t row_bytes = get_row_bytes();
+    for (int r = 0; r < height; ++r) row_ptr(r)[row_bytes - 1] &= mask;
+}
+
+void Image::unpack(unsigned char* dst) const {
+    for (int r = 0; r < height; ++r) unpack_pbm_row(row_ptr(r), dst + (size_t)r * width, width);
+}
+
+Image Image::pack(const unsigned char* src, int width, int height) {
+    Image img(width, height, "pbm");
+    size_t row_bytes = img.get_row_bytes();
+    for (int r = 0; r < height; ++r) pack_pbm_row(src + (size_t)r * width, img.pixels + r * row_bytes, width);
+    return img;
+}
+
+void Image::read_pgm_ascii(Scanner& in) {
+    allocate((size_t)width * height * sample_size);
+    read_samples_ascii(in);
+}
+
+void Image::read_pgm_binary(Scanner& in) {
+    allocate((size_t)width * height * sample_size);
+    read_samples_binary(in);
+}
+
+void Image::read_ppm_ascii(Scanner& in) {
+    allocate((size_t)width * height * 3 * sample_size);
+    read_samples_ascii(in);
+}
+
+void Image::read_ppm_binary(Scanner& in) {
+    allocate(sample_count() * sample_size);
+    read_samples_binary(in);
+}
+
+void Image::read_samples_ascii(Scanner& in) {
+    if (sample_size == 1) in.read_samples(pixels, pixels_size, max_val);
+    else in.read_samples(reinterpret_cast<uint16_t*>(pixels), sample_count(), max_val);
+}
+
+// En disco las muestras de 16 bits son big-endian; en memoria, del orden nativo
+void Image::read_samples_binary(Scanner& in) {
+    in.read_bytes(reinterpret_cast<char*>(pixels), pixels_size);
+    if (sample_size == 2) swap_be16(reinterpret_cast<uint16_t*>(pixels), sample_count());
+}
+
+
+
+void Image::save(const std::string& filename, bool binary) {
+    stats::Scope scope(stats::Op::Save);
+    std::string out_magic_number;
+    if (kind == Kind::Pbm) out_magic_number = binary ? "P4" : "P1";
+    if (kind == Kind::Pgm) out_magic_number = binary ? "P5" : "P2";
+    if (kind == Kind::Ppm) out_magic_number = binary ? "P6" : "P3";
+
+    std::ofstream file(filename, std::ios::out | std::ios::binary);
+    if (!file) throw std::runtime_error("No se pudo crear el archivo: " + filename);
+
+    if (binary || kind == Kind::Pam) {
+        write_binary([&file](const char* src, size_t n) { file.write(src, n); });
+    } else {
+        file << out_magic_number << "\n";
+        file << width << " " << height << "\n";
+        if (kind != Kind::Pbm) file << max_val << "\n";
+
+        AsciiWriter out([&file](const char* src, size_t n) { file.write(src, n); });
+        if (kind == Kind::Pbm) {
+            std::vector<unsigned char> row(width);
+            for (int r = 0; r < height; ++r) {
+                unpack_pbm_row(row_ptr(r), row.data(), width);
+                out.write_bits(row.data(), width, width);
+            }
+        } else {
+            // Una fila por llamada si hay huecos entre filas (vistas)
+            size_t per_row = (size_t)width * channels;
+            int rows = is_contiguous() ? height : 1;
+            for (int r = 0; r < height; r += rows) {
+                if (sample_size == 2)
+                    out.write_samples(reinterpret_cast<const uint16_t*>(row_ptr(r)), per_row * rows, per_row);
+                else
+                    out.write_samples(row_ptr(r), per_row * rows, per_row);
+            }
+        }
+        out.flush();
     }
-    
+    if (!file) throw std::runtime_error("Error al escribir el archivo: " + filename);
+    stats::pixels += (uint64_t)width * height;
+    stats::bytes_written += static_cast<uint64_t>(file.tellp());
+    mark_clean();
+}
 
-    file >> width >> height;
+void Image::write_binary(const std::function<void(const char*, size_t)>& out) const {
+    std::string header;
+    if (kind == Kind::Pam) {
+        header = "P7\nWIDTH " + std::to_string(width) + "\nHEIGHT " + std::to_string(height) +
+                 "\nDEPTH 4\nMAXVAL 255\nTUPLTYPE RGB_ALPHA\nENDHDR\n";
+    } else {
+        header = (kind == Kind::Pbm ? "P4\n" : kind == Kind::Pgm ? "P5\n" : "P6\n") +
+                 std::to_string(width) + " " + std::to_string(height) + "\n";
+        if (kind != Kind::Pbm) header += std::to_string(max_val) + "\n";
+    }
+    out(header.data(), header.size());
 
-    if (magic_number != "P1" && magic_number != "P4") {
-        file >> max_val;
+    if (sample_size == 2) {
+        // Se pasa a big-endian por bloques para no duplicar la imagen
+        std::vector<uint16_t> block(32 * 1024);
+        raster_chunks(block.size() * 2, [&](const unsigned char* src, size_t n) {
+            std::memcpy(block.data(), src, n);
+            swap_be16(block.data(), n / 2);
+            out(reinterpret_cast<const char*>(block.data()), n);
+        });
+    } else if (is_contiguous() && padding_mask() == 0xFF) {
+        out(reinterpret_cast<const char*>(pixels), pixels_size);
+    } else {
+        raster_chunks(64 * 1024, [&](const unsigned char* src, size_t n) { out(reinterpret_cast<const char*>(src), n); });
     }
+}
 
-    
-    file.get();
+void Image::raster_chunks(size_t chunk, const std::function<void(const unsigned char*, size_t)>& fn) const {
+    size_t row_bytes = get_row_bytes();
+    size_t total = row_bytes * height;
+    unsigned char mask = padding_mask();
+    if (is_contiguous() && mask == 0xFF) {
+        for (size_t i = 0; i < total; i += chunk) fn(pixels + i, std::min(chunk, total - i));
+        return;
+    }
 
-    if (magic_number == "P1") read_pbm_ascii(file);
-    else if (magic_number == "P2") read_pgm_ascii(file);
-    else if (magic_number == "P3") read_ppm_ascii(file);
-    else if (magic_number == "P4") read_pbm_binary(file);
-    else if (magic_number == "P5") read_pgm_binary(file);
-    else if (magic_number == "P6") read_ppm_binary(file);
-    else throw std::runtime_error("Formato Netpbm no soportado: " + magic_number);
-    
-    std::cout << "DEBUG: Image loaded. Data size: " << data.size() << std::endl;
+    // Las filas se juntan en un bloque; una fila puede quedar repartida entre dos
+    std::vector<unsigned char> block(std::min(chunk, total));
+    size_t used = 0;
+    for (int y = 0; y < height; ++y) {
+        const unsigned char* row = row_ptr(y);
+        for (size_t done = 0; done < row_bytes;) {
+            size_t n = std::min(row_bytes - done, block.size() - used);
+            std::memcpy(block.data() + used, row + done, n);
+            done += n;
+            used += n;
+            if (done == row_bytes && mask != 0xFF) block[used - 1] &= mask;
+            if (used == block.size()) {
+                fn(block.data(), used);
+                used = 0;
+            }
+        }
+    }
+    if (used) fn(block.data(), used);
+}
+
+void Image::mark_dirty(int x0, int y0, int x1, int y1) {
+    if (x0 > x1) std::swap(x0, x1);
+    if (y0 > y1) std::swap(y0, y1);
+    x0 = std::max(x0, 0); y0 = std::max(y0, 0);
+    x1 = std::min(x1, width - 1); y1 = std::min(y1, height - 1);
+    if (x0 <= x1 && y0 <= y1) touch(y0, y1, x0, x1);
+}
+
+void Image::mark_clean() {
+    dirty.assign(height, Span{width, -1});
 }
 
-void Image::read_pbm_ascii(std::ifstream& file) {
-    data.resize(width * height);
-    int pixel_val;
-    for (int i = 0; i < width * height; ++i) {
-        file >> pixel_val;
-        data[i] = (pixel_val == 1) ? 0 : 255; 
+bool Image::dirty_bounds(int& x0, int& y0, int& x1, int& y1) const {
+    x0 = width; y0 = height; x1 = -1; y1 = -1;
+    for (int y = 0; y < height; ++y) {
+        if (dirty[y].x0 > dirty[y].x1) continue;
+        x0 = std::min(x0, dirty[y].x0);
+        x1 = std::max(x1, dirty[y].x1);
+        y0 = std::min(y0, y);
+        y1 = y;
     }
+    return x1 >= 0;
 }
 
-void Image::read_pbm_binary(std::ifstream& file) {
-    data.resize(width * height);
-    int bytes_per_row = (width + 7) / 8;
-    std::vector<char> row_data(bytes_per_row);
-    for (int r = 0; r < height; ++r) {
-        file.read(row_data.data(), bytes_per_row);
-        for (int c = 0; c < width; ++c) {
-            int byte_idx = c / 8;
-            int bit_idx = c % 8;
-            data[r * width + c] = ((row_data[byte_idx] >> (7 - bit_idx)) & 1) ? 0 : 255;
+size_t Image::save_incremental(const std::string& filename) {
+    stats::Scope scope(stats::Op::SaveIncremental);
+    {
+        std::fstream file(filename, std::ios::in | std::ios::out | std::ios::binary);
+        if (file) {
+            Header header;
+            bool parsed = true;
+            Scanner in([&file](char* dst, size_t n) {
+                file.read(dst, n);
+                return static_cast<size_t>(file.gcount());
+            }, 4096);
+            try {
+                header = in.read_header();
+            } catch (const std::runtime_error&) {
+                parsed = false;
+            }
+            file.clear();
+            file.seekg(0, std::ios::end);
+            size_t file_size = static_cast<size_t>(file.tellg());
+
+            const char* magic = kind == Kind::Pbm ? "P4" : kind == Kind::Pgm ? "P5" : kind == Kind::Ppm ? "P6" : "P7";
+            if (parsed && header.magic == magic && header.width == width && header.height == height &&
+                header.depth == channels &&
+                (kind == Kind::Pbm || header.max_val == max_val) &&
+                file_size >= header.data_offset + get_row_bytes() * height) {
+                size_t written = write_dirty(file, header.data_offset);
+                if (!file) throw std::runtime_error("Error al escribir el archivo: " + filename);
+                stats::bytes_written += written;
+                mark_clean();
+                return written;
+            }
         }
     }
+
+    // No hay un archivo compatible: se escribe entero
+    save(filename, true);
+    std::ifstream saved(filename, std::ios::in | std::ios::binary | std::ios::ate);
+    return static_cast<size_t>(saved.tellg());
 }
 
-void Image::read_pgm_ascii(std::ifstream& file) {
-    data.resize(width * height);
-    int pixel_val;
-    for (int i = 0; i < width * height; ++i) {
-        file >> pixel_val;
-        data[i] = pixel_val;
+// Escribe los tramos modificados de cada fila en su posicion del raster; los tramos que
+// quedan contiguos en el archivo se juntan en una sola escritura
+size_t Image::write_dirty(std::fstream& file, size_t data_offset) {
+    size_t row_bytes = get_row_bytes();
+    size_t written = 0;
+    size_t run_begin = 0, run_end = 0;
+    const unsigned char* run_src = nullptr;
+    std::vector<uint16_t> swapped;
+
+    auto flush_run = [&]() {
+        if (run_end == run_begin) return;
+        size_t len = run_end - run_begin;
+        file.seekp(static_cast<std::streamoff>(data_offset + run_begin));
+        if (sample_size == 1) {
+            file.write(reinterpret_cast<const char*>(run_src), len);
+        } else {
+            const uint16_t* src = reinterpret_cast<const uint16_t*>(run_src);
+            swapped.assign(src, src + len / 2);
+            swap_be16(swapped.data(), swapped.size());
+            file.write(reinterpret_cast<const char*>(swapped.data()), len);
+        }
+        written += len;
+    };
+
+    for (int y = 0; y < height; ++y) {
+        const Span& s = dirty[y];
+        if (s.x0 > s.x1) continue;
+        size_t first = kind == Kind::Pbm ? s.x0 >> 3 : (size_t)s.x0 * pixel_size();
+        size_t last = kind == Kind::Pbm ? (s.x1 >> 3) + 1 : (size_t)(s.x1 + 1) * pixel_size();
+        size_t begin = y * row_bytes + first;
+        // En una vista las filas no siguen una a otra en memoria: no se juntan
+        if (!run_src || begin != run_end || !is_contiguous()) {
+            flush_run();
+            run_begin = begin;
+            run_src = row_ptr(y) + first;
+        }
+        run_end = y * row_bytes + last;
     }
+    flush_run();
+    return written;
 }
 
-void Image::read_pgm_binary(std::ifstream& file) {
-    data.resize(width * height);
-    file.read(reinterpret_cast<char*>(data.data()), data.size());
+void Image::set_kind(Kind k) {
+    kind = k;
+    channels = k == Kind::Ppm ? 3 : k == Kind::Pam ? 4 : 1;
 }
 
-void Image::read_ppm_ascii(std::ifstream& file) {
-    data.resize(width * height * 3); 
-    int pixel_val;
-    for (int i = 0; i < width * height * 3; ++i) {
-        file >> pixel_val;
-        data[i] = pixel_val;
+// Convierte un color RGB al valor que se guarda en el buffer segun el formato; solo pam
+// conserva el alfa
+void Image::encode(const Color& color, unsigned char* px) const {
+    unsigned char values[4];
+    if (kind == Kind::Ppm || kind == Kind::Pam) {
+        values[0] = color.r;
+        values[1] = color.g;
+        values[2] = color.b;
+        values[3] = color.a;
+    } else {
+        int gray = (color.r + color.g + color.b) / 3;
+        values[0] = (kind == Kind::Pbm) ? (gray < 128 ? 0 : 255) : static_cast<unsigned char>(gray);
+    }
+    if (sample_size == 1) {
+        std::memcpy(px, values, channels);
+        return;
+    }
+    for (int c = 0; c < channels; ++c) {
+        uint16_t sample = static_cast<uint16_t>((values[c] * max_val + 127) / 255);
+        std::memcpy(px + 2 * c, &sample, 2);
     }
 }
 
-void Image::read_ppm_binary(std::ifstream& file) {
-    data.resize(width * height * 3);
-    file.read(reinterpret_cast<char*>(data.data()), data.size());
+// Reescalado de muestras: v * scale redondeado, en coma flotante para que el compilador
+// vectorice el bucle
+template <typename S, typename D>
+static void rescale_samples(const S* src, D* dst, size_t n, float scale) {
+    for (size_t i = 0; i < n; ++i) dst[i] = static_cast<D>(static_cast<float>(src[i]) * scale + 0.5f);
 }
 
+Image Image::convert_depth(int new_max_val) const {
+    // Las conversiones recorren el raster como un bloque: una vista con huecos entre filas
+    // se compacta antes
+    if (!is_contiguous()) return Image(*this).convert_depth(new_max_val);
+    stats::Scope scope(stats::Op::ConvertDepth);
+    if (kind == Kind::Pbm || kind == Kind::Pam) throw std::runtime_error("convert_depth solo se aplica a imagenes PGM/PPM");
+    if (new_max_val < 1 || new_max_val > 65535)
+        throw std::runtime_error("maxval fuera de rango: " + std::to_string(new_max_val));
 
+    Image out;
+    out.width = width;
+    out.height = height;
+    out.magic_number = magic_number;
+    out.set_kind(kind);
+    out.max_val = new_max_val;
+    out.sample_size = new_max_val > 255 ? 2 : 1;
+    out.allocate(sample_count() * out.sample_size);
 
-void Image::save(const std::string& filename, bool binary) {
-    std::string current_type = (magic_number == "P1" || magic_number == "P4") ? "pbm" :
-                               (magic_number == "P2" || magic_number == "P5") ? "pgm" : "ppm";
+    size_t n = sample_count();
+    float scale = static_cast<float>(new_max_val) / static_cast<float>(max_val);
+    const uint16_t* src16 = reinterpret_cast<const uint16_t*>(pixels);
+    uint16_t* dst16 = reinterpret_cast<uint16_t*>(out.pixels);
+    if (sample_size == 1 && out.sample_size == 1) rescale_samples(pixels, out.pixels, n, scale);
+    else if (sample_size == 1) rescale_samples(pixels, dst16, n, scale);
+    else if (out.sample_size == 1) rescale_samples(src16, out.pixels, n, scale);
+    else rescale_samples(src16, dst16, n, scale);
+    stats::pixels += (uint64_t)width * height;
+    return out;
+}
 
-    std::string out_magic_number;
-    if (current_type == "pbm") out_magic_number = binary ? "P4" : "P1";
-    if (current_type == "pgm") out_magic_number = binary ? "P5" : "P2";
-    if (current_type == "ppm") out_magic_number = binary ? "P6" : "P3";
+// Reparte las filas [0, height) en bloques contiguos entre los nucleos; con pocas filas
+// o pocos pixeles se hace todo en el hilo actual
+template <typename Fn>
+static void parallel_rows(int height, size_t pixels_total, Fn fn) {
+    unsigned threads = std::max(1u, std::thread::hardware_concurrency());
+    if (pixels_total < (1u << 18)) threads = 1;
+    threads = std::min<unsigned>(threads, static_cast<unsigned>(height));
+    if (threads <= 1) {
+        fn(0, height);
+        return;
+    }
+    std::vector<std::thread> pool;
+    int rows = (height + threads - 1) / threads;
+    for (int y0 = rows; y0 < height; y0 += rows) pool.emplace_back(fn, y0, std::min(height, y0 + rows));
+    fn(0, std::min(height, rows));
+    for (std::thread& t : pool) t.join();
+}
 
-    std::ofstream file(filename, std::ios::out | std::ios::binary);
-    if (!file) throw std::runtime_error("No se pudo crear el archivo: " + filename);
+// Gris de una fila en la escala de la imagen de origen. Los pesos BT.601 en coma fija
+// suman 65536; con muestras de 16 bits el producto sigue cabiendo en 32 bits.
+template <typename S>
+static void gray_row(const S* src, uint32_t* dst, int width, int channels, bool average) {
+    if (channels == 1) {
+        for (int x = 0; x < width; ++x) dst[x] = src[x];
+    } else if (average) {
+        for (int x = 0; x < width; ++x) dst[x] = (uint32_t(src[3 * x]) + src[3 * x + 1] + src[3 * x + 2]) / 3;
+    } else {
+        for (int x = 0; x < width; ++x)
+            dst[x] = (uint32_t(src[3 * x]) * 19595u + uint32_t(src[3 * x + 1]) * 38470u +
+                      uint32_t(src[3 * x + 2]) * 7471u + 32768u) >> 16;
+    }
+}
+
+// Umbrales de Bayer 8x8 (0..63)
+static const unsigned char bayer8[8][8] = {
+    { 0, 32,  8, 40,  2, 34, 10, 42}, {48, 16, 56, 24, 50, 18, 58, 26},
+    {12, 44,  4, 36, 14, 46,  6, 38}, {60, 28, 52, 20, 62, 30, 54, 22},
+    { 3, 35, 11, 43,  1, 33,  9, 41}, {51, 19, 59, 27, 49, 17, 57, 25},
+    {15, 47,  7, 39, 13, 45,  5, 37}, {63, 31, 55, 23, 61, 29, 53, 21},
+};
+
+template <typename S>
+void Image::convert_rows(Image& out, const std::string& method) const {
+    const S* src = reinterpret_cast<const S*>(pixels);
+    size_t src_row = (size_t)width * channels;
+    bool average = method == "average", ordered = method == "ordered";
 
-    file << out_magic_number << "\n";
-    file << width << " " << height << "\n";
-    if (current_type != "pbm") file << max_val << "\n";
+    if (out.kind == Kind::Pbm && method == "floyd-steinberg") {
+        // La difusion del error depende de la fila anterior: se recorre en un solo hilo
+        int max = max_val, half = (max_val + 1) / 2;
+        std::vector<uint32_t> gray(width);
+        std::vector<unsigned char> level(width);
+        std::vector<int> err(width + 2, 0), next(width + 2, 0);
+        for (int y = 0; y < height; ++y) {
+            gray_row(src + y * src_row, gray.data(), width, channels, average);
+            for (int x = 0; x < width; ++x) {
+                int v = static_cast<int>(gray[x]) + err[x + 1] / 16;
+                bool black = v < half;
+                int e = v - (black ? 0 : max);
+                level[x] = black ? 0 : 255;
+                err[x + 2] += 7 * e;
+                next[x] += 3 * e;
+                next[x + 1] += 5 * e;
+                next[x + 2] += e;
+            }
+            pack_pbm_row(level.data(), out.pixels + y * out.get_row_bytes(), width);
+            err.swap(next);
+            std::fill(next.begin(), next.end(), 0);
+        }
+        return;
+    }
 
-    if (!binary) {
-        for (size_t i = 0; i < data.size(); ++i) {
-             if (current_type == "pbm") {
-                file << (data[i] < 128 ? 1 : 0) << ( (i + 1) % width == 0 ? "\n" : " ");
+    parallel_rows(height, (size_t)width * height, [&](int y0, int y1) {
+        std::vector<uint32_t> gray(width);
+        std::vector<unsigned char> level(width);
+        uint32_t levels = static_cast<uint32_t>(max_val) + 1;
+        for (int y = y0; y < y1; ++y) {
+            const S* in = src + y * src_row;
+            if (out.kind == Kind::Pbm) {
+                // threshold: negro si gray < levels / 2; ordered: umbral (2b + 1) / 128 de levels
+                gray_row(in, gray.data(), width, channels, average);
+                if (ordered) {
+                    uint32_t limit[8];
+                    for (int k = 0; k < 8; ++k) limit[k] = (2u * bayer8[y & 7][k] + 1) * levels;
+                    for (int x = 0; x < width; ++x) level[x] = gray[x] * 128 < limit[x & 7] ? 0 : 255;
+                } else {
+                    for (int x = 0; x < width; ++x) level[x] = gray[x] * 2 < levels ? 0 : 255;
+                }
+                pack_pbm_row(level.data(), out.pixels + y * out.get_row_bytes(), width);
+            } else if (out.kind == Kind::Pgm) {
+                gray_row(in, gray.data(), width, channels, average);
+                S* dst = reinterpret_cast<S*>(out.pixels) + (size_t)y * width;
+                for (int x = 0; x < width; ++x) dst[x] = static_cast<S>(gray[x]);
             } else {
-                file << static_cast<int>(data[i]) << ( (i + 1) % (current_type == "ppm" ? width*3 : width) == 0 ? "\n" : " ");
+                S* dst = reinterpret_cast<S*>(out.pixels) + (size_t)y * width * 3;
+                for (int x = 0; x < width; ++x) dst[3 * x] = dst[3 * x + 1] = dst[3 * x + 2] = in[x];
             }
         }
-    } else { 
-        if (current_type == "pbm") {
-            std::vector<unsigned char> binary_data((width + 7) / 8 * height, 0);
-            for(int i=0; i < width*height; ++i) {
-                if (data[i] < 128) { 
-                    int byte_idx = i / 8;
-                    int bit_idx = i % 8;
-                    binary_data[byte_idx] |= (1 << (7 - bit_idx));
+    });
+}
+
+Image Image::convert(const std::string& mode, const std::string& method) const {
+    if (!is_contiguous()) return Image(*this).convert(mode, method);
+    stats::Scope scope(stats::Op::Convert);
+    Kind target;
+    if (mode == "pbm") target = Kind::Pbm;
+    else if (mode == "pgm") target = Kind::Pgm;
+    else if (mode == "ppm") target = Kind::Ppm;
+    else if (mode == "pam") target = Kind::Pam;
+    else throw std::runtime_error("Modo no soportado. Use 'pbm', 'pgm', 'ppm' o 'pam'.");
+
+    // El alfa solo existe en pam: al salir se compone sobre blanco, al entrar es opaco
+    if (kind == Kind::Pam && target != Kind::Pam)
+        return flatten(width, height, {Layer{this, 0, 0}}).convert(mode, method);
+    if (target == Kind::Pam && kind != Kind::Pam) {
+        if (!method.empty())
+            throw std::runtime_error("Metodo de conversion no valido para " + mode + ": '" + method + "'");
+        if (kind != Kind::Ppm || sample_size != 1) {
+            Image rgb = kind == Kind::Ppm ? *this : convert("ppm");
+            return (rgb.sample_size == 1 ? rgb : rgb.convert_depth(255)).convert("pam");
+        }
+        Image out(width, height, "pam");
+        parallel_rows(height, (size_t)width * height, [&](int y0, int y1) {
+            for (int y = y0; y < y1; ++y) {
+                const unsigned char* src = pixels + (size_t)y * width * 3;
+                unsigned char* dst = out.pixels + (size_t)y * width * 4;
+                for (int x = 0; x < width; ++x) {
+                    dst[4 * x] = src[3 * x];
+                    dst[4 * x + 1] = src[3 * x + 1];
+                    dst[4 * x + 2] = src[3 * x + 2];
+                    dst[4 * x + 3] = 255;
                 }
             }
-            file.write(reinterpret_cast<char*>(binary_data.data()), binary_data.size());
-        } else {
-            file.write(reinterpret_cast<const char*>(data.data()), data.size());
+        });
+        stats::pixels += (uint64_t)width * height;
+        return out;
+    }
+
+    std::string m = method;
+    if (m.empty()) m = target == Kind::Pbm ? "threshold" : kind == Kind::Ppm && target == Kind::Pgm ? "luma" : "";
+    bool valid = target == Kind::Pbm ? (m == "threshold" || m == "ordered" || m == "floyd-steinberg")
+               : kind == Kind::Ppm && target == Kind::Pgm ? (m == "luma" || m == "average")
+               : m.empty();
+    if (!valid) throw std::runtime_error("Metodo de conversion no valido para " + mode + ": '" + method + "'");
+    if (target == kind) return *this;
+
+    Image out;
+    out.width = width;
+    out.height = height;
+    out.magic_number = target == Kind::Pbm ? "P1" : target == Kind::Pgm ? "P2" : "P3";
+    out.set_kind(target);
+    out.max_val = kind == Kind::Pbm ? 255 : max_val;
+    out.sample_size = target == Kind::Pbm ? 1 : out.max_val > 255 ? 2 : 1;
+    out.allocate(target == Kind::Pbm ? out.get_row_bytes() * height : out.sample_count() * out.sample_size);
+
+    if (kind == Kind::Pbm) {
+        // Se desempaqueta a 0/255 y, si hace falta, se replica en los tres canales
+        parallel_rows(height, (size_t)width * height, [&](int y0, int y1) {
+            std::vector<unsigned char> row(width);
+            for (int y = y0; y < y1; ++y) {
+                unsigned char* dst = out.pixels + (size_t)y * width * out.channels;
+                unpack_pbm_row(pixels + y * get_row_bytes(), out.channels == 1 ? dst : row.data(), width);
+                if (out.channels == 3)
+                    for (int x = 0; x < width; ++x) dst[3 * x] = dst[3 * x + 1] = dst[3 * x + 2] = row[x];
+            }
+        });
+    } else if (sample_size == 1) {
+        convert_rows<unsigned char>(out, m);
+    } else {
+        convert_rows<uint16_t>(out, m);
+    }
+    stats::pixels += (uint64_t)width * height;
+    return out;
+}
+
+// Nucleos de remuestreo, en unidades de pixel de salida
+static double box_kernel(double x) { return x >= -0.5 && x < 0.5 ? 1.0 : 0.0; }
+static double triangle_kernel(double x) { x = std::fabs(x); return x < 1.0 ? 1.0 - x : 0.0; }
+static double sinc(double x) {
+    if (x == 0.0) return 1.0;
+    x *= 3.14159265358979323846;
+    return std::sin(x) / x;
+}
+static double lanczos_kernel(double x) { return std::fabs(x) < 3.0 ? sinc(x) * sinc(x / 3.0) : 0.0; }
+
+// Pesos de una pasada: el pixel de salida i mezcla count[i] pixeles de origen desde
+// first[i], con los pesos weights[i * stride ...] normalizados a 1. Al reducir el nucleo
+// se ensancha en la misma proporcion, asi que cada salida promedia todo lo que cubre.
+struct ResampleWeights {
+    std::vector<int> first, count;
+    std::vector<float> weights;
+    int stride = 0;
+};
+
+static ResampleWeights resample_weights(int in, int out, double (*kernel)(double), double support) {
+    double scale = static_cast<double>(in) / out;
+    double filter_scale = std::max(scale, 1.0);
+    support *= filter_scale;
+
+    ResampleWeights w;
+    w.stride = static_cast<int>(std::ceil(support)) * 2 + 1;
+    w.first.resize(out);
+    w.count.resize(out);
+    w.weights.assign((size_t)out * w.stride, 0.0f);
+    std::vector<double> k(w.stride);
+    for (int i = 0; i < out; ++i) {
+        double center = (i + 0.5) * scale;
+        int lo = std::max(0, static_cast<int>(std::floor(center - support + 0.5)));
+        int hi = std::min(in, static_cast<int>(std::floor(center + support + 0.5)));
+        hi = std::min(hi, lo + w.stride);
+        double sum = 0.0;
+        for (int x = lo; x < hi; ++x) sum += k[x - lo] = kernel((x - center + 0.5) / filter_scale);
+        if (sum == 0.0) {
+            // Solo pasa con el nucleo caja cuando el centro cae justo en un borde
+            lo = std::min(static_cast<int>(center), in - 1);
+            hi = lo + 1;
+            k[0] = sum = 1.0;
         }
+        w.first[i] = lo;
+        w.count[i] = hi - lo;
+        for (int x = lo; x < hi; ++x) w.weights[(size_t)i * w.stride + (x - lo)] = static_cast<float>(k[x - lo] / sum);
     }
+    return w;
 }
 
-void Image::set_pixel(int x, int y, const Color& color) {
+template <typename S>
+static S clamp_sample(float v, float max) {
+    return static_cast<S>(std::min(std::max(v + 0.5f, 0.0f), max));
+}
+
+// Dos pasadas separables: horizontal sobre las filas de origen a un buffer intermedio en
+// float y vertical de ese buffer a la salida. Cada pasada reparte filas entre hilos.
+template <typename S>
+void Image::resample_rows(Image& out, double (*kernel)(double), double support) const {
+    int ch = channels;
+    ResampleWeights wx = resample_weights(width, out.width, kernel, support);
+    ResampleWeights wy = resample_weights(height, out.height, kernel, support);
+    size_t tmp_row = (size_t)out.width * ch;
+    std::vector<float> tmp(tmp_row * height);
+    const S* src = reinterpret_cast<const S*>(pixels);
+    S* dst = reinterpret_cast<S*>(out.pixels);
+    float max = static_cast<float>(max_val);
+
+    parallel_rows(height, (size_t)width * height, [&](int y0, int y1) {
+        std::vector<float> row((size_t)width * ch);
+        for (int y = y0; y < y1; ++y) {
+            const S* in = src + (size_t)y * width * ch;
+            for (size_t i = 0; i < row.size(); ++i) row[i] = in[i];
+            float* t = tmp.data() + y * tmp_row;
+            for (int x = 0; x < out.width; ++x) {
+                const float* w = wx.weights.data() + (size_t)x * wx.stride;
+                const float* p = row.data() + (size_t)wx.first[x] * ch;
+                int n = wx.count[x];
+                if (ch == 3) {
+                    float r = 0.0f, g = 0.0f, b = 0.0f;
+                    for (int k = 0; k < n; ++k) {
+                        r += w[k] * p[3 * k];
+                        g += w[k] * p[3 * k + 1];
+                        b += w[k] * p[3 * k + 2];
+                    }
+                    t[3 * x] = r;
+                    t[3 * x + 1] = g;
+                    t[3 * x + 2] = b;
+                } else {
+                    float acc = 0.0f;
+                    for (int k = 0; k < n; ++k) acc += w[k] * p[k];
+                    t[x] = acc;
+                }
+            }
+        }
+    });
+
+    parallel_rows(out.height, (size_t)out.width * out.height, [&](int y0, int y1) {
+        std::vector<float> acc(tmp_row);
+        for (int y = y0; y < y1; ++y) {
+            std::fill(acc.begin(), acc.end(), 0.0f);
+            const float* w = wy.weights.data() + (size_t)y * wy.stride;
+            for (int k = 0; k < wy.count[y]; ++k) {
+                const float* t = tmp.data() + (size_t)(wy.first[y] + k) * tmp_row;
+                for (size_t i = 0; i < tmp_row; ++i) acc[i] += w[k] * t[i];
+            }
+            S* d = dst + y * tmp_row;
+            for (size_t i = 0; i < tmp_row; ++i) d[i] = clamp_sample<S>(acc[i], max);
+        }
+    });
+}
+
+// Reduccion por un factor entero exacto con filtro caja: se suman fy filas en enteros y
+// despues grupos de fx pixeles, sin pesos ni buffer intermedio. A es el acumulador de
+// columnas: uint16 mientras fy filas de 8 bits quepan en el, para mover la mitad de memoria.
+template <typename S, typename A>
+static void box_reduce_rows(const S* src, S* dst, int width, int out_width, int out_height, int ch, int fx, int fy) {
+    size_t in_row = (size_t)width * ch, out_row = (size_t)out_width * ch;
+    float inv = 1.0f / (static_cast<float>(fx) * fy);
+
+    parallel_rows(out_height, in_row * out_height * fy, [&](int y0, int y1) {
+        std::vector<A> acc(in_row);
+        for (int y = y0; y < y1; ++y) {
+            std::fill(acc.begin(), acc.end(), A(0));
+            for (int k = 0; k < fy; ++k) {
+                const S* row = src + (size_t)(y * fy + k) * in_row;
+                for (size_t i = 0; i < in_row; ++i) acc[i] = static_cast<A>(acc[i] + row[i]);
+            }
+            S* d = dst + y * out_row;
+            for (int x = 0; x < out_width; ++x) {
+                const A* a = acc.data() + (size_t)x * fx * ch;
+                for (int c = 0; c < ch; ++c) {
+                    uint32_t sum = 0;
+                    for (int j = 0; j < fx; ++j) sum += a[j * ch + c];
+                    d[x * ch + c] = static_cast<S>(static_cast<float>(sum) * inv + 0.5f);
+                }
+            }
+        }
+    });
+}
+
+template <typename S>
+void Image::box_reduce(Image& out, int fx, int fy) const {
+    const S* src = reinterpret_cast<const S*>(pixels);
+    S* dst = reinterpret_cast<S*>(out.pixels);
+    if (sizeof(S) == 1 && fy <= 257)
+        box_reduce_rows<S, uint16_t>(src, dst, width, out.width, out.height, channels, fx, fy);
+    else
+        box_reduce_rows<S, uint32_t>(src, dst, width, out.width, out.height, channels, fx, fy);
+}
+
+Image Image::resize(int new_width, int new_height, const std::string& filter) const {
+    if (!is_contiguous()) return Image(*this).resize(new_width, new_height, filter);
+    stats::Scope scope(stats::Op::Resize);
+    if (new_width <= 0 || new_height <= 0) throw std::runtime_error("Dimensiones invalidas");
+    double (*kernel)(double);
+    double support;
+    if (filter == "box") { kernel = box_kernel; support = 0.5; }
+    else if (filter == "bilinear") { kernel = triangle_kernel; support = 1.0; }
+    else if (filter == "lanczos") { kernel = lanczos_kernel; support = 3.0; }
+    else throw std::runtime_error("Filtro no soportado. Use 'box', 'bilinear' o 'lanczos'.");
+
+    // pbm se remuestrea en gris y se vuelve a umbralizar
+    if (kind == Kind::Pbm) return convert("pgm").resize(new_width, new_height, filter).convert("pbm");
+
+    Image out;
+    out.width = new_width;
+    out.height = new_height;
+    out.magic_number = magic_number;
+    out.set_kind(kind);
+    out.max_val = max_val;
+    out.sample_size = sample_size;
+    out.allocate(out.sample_count() * sample_size);
+
+    bool exact = filter == "box" && width % new_width == 0 && height % new_height == 0;
+    if (exact && sample_size == 1) box_reduce<unsigned char>(out, width / new_width, height / new_height);
+    else if (exact) box_reduce<uint16_t>(out, width / new_width, height / new_height);
+    else if (sample_size == 1) resample_rows<unsigned char>(out, kernel, support);
+    else resample_rows<uint16_t>(out, kernel, support);
+    stats::pixels += (uint64_t)new_width * new_height;
+    return out;
+}
+
+Image Image::thumbnail(int max_side) const {
+    if (max_side <= 0) throw std::runtime_error("El lado maximo debe ser positivo");
+    int longest = std::max(width, height);
+    if (longest <= max_side) return *this;
+    double scale = static_cast<double>(max_side) / longest;
+    int w = std::max(1, static_cast<int>(std::lround(width * scale)));
+    int h = std::max(1, static_cast<int>(std::lround(height * scale)));
+    return resize(w, h, "box");
+}
+
+// Comparacion de rasters. En pbm los bits de relleno del ultimo byte de cada fila no
+// cuentan: una proyeccion de un P4 escrito por otro programa puede traerlos sucios.
+static const uint64_t hash_prime1 = 0x9E3779B185EBCA87ull, hash_prime2 = 0xC2B2AE3D27D4EB4Full;
+static inline uint64_t rotl64(uint64_t v, int r) { return (v << r) | (v >> (64 - r)); }
+static inline uint64_t hash_round(uint64_t acc, uint64_t word) { return rotl64(acc + word * hash_prime2, 31) * hash_prime1; }
+
+// Hash de n bytes encadenado a h, al estilo de xxHash64: cuatro acumuladores de 8 bytes
+// independientes para que cada multiplicacion no espere a la anterior
+static uint64_t hash_bytes(uint64_t h, const unsigned char* p, size_t n) {
+    uint64_t acc[4] = {h + hash_prime1 + hash_prime2, h + hash_prime2, h, h - hash_prime1};
+    size_t i = 0;
+    for (; i + 32 <= n; i += 32) {
+        for (int k = 0; k < 4; ++k) {
+            uint64_t word;
+            std::memcpy(&word, p + i + 8 * k, 8);
+            acc[k] = hash_round(acc[k], word);
+        }
+    }
+    h = rotl64(acc[0], 1) + rotl64(acc[1], 7) + rotl64(acc[2], 12) + rotl64(acc[3], 18) + n;
+    for (; i + 8 <= n; i += 8) {
+        uint64_t word;
+        std::memcpy(&word, p + i, 8);
+        h = rotl64(h ^ hash_round(0, word), 27) * hash_prime1 + hash_prime2;
+    }
+    for (; i < n; ++i) h = rotl64(h ^ (p[i] * hash_prime1), 11) * hash_prime2;
+    return h;
+}
+
+static int bit_count(unsigned v) {
+    int n = 0;
+    for (; v; v &= v - 1) ++n;
+    return n;
+}
+
+bool Image::same_shape(const Image& other) const {
+    // En pbm maxval no significa nada (vale 1 al cargar un archivo y 255 al crear la imagen)
+    return width == other.width && height == other.height && kind == other.kind &&
+           (kind == Kind::Pbm || max_val == other.max_val);
+}
+
+unsigned char Image::padding_mask() const {
+    return kind == Kind::Pbm && width % 8 ? static_cast<unsigned char>(0xFF << (8 - width % 8)) : 0xFF;
+}
+
+uint64_t Image::checksum() const {
+    stats::Scope scope(stats::Op::Checksum);
+    uint64_t level = kind == Kind::Pbm ? 1 : max_val;
+    uint64_t h = ((uint64_t)width << 32 | (uint32_t)height) ^ (level << 8 | (unsigned)kind) * hash_prime1;
+    // Por trozos fijos del raster tal como va al archivo, para que una vista y su copia
+    // compacta den el mismo valor
+    raster_chunks(64 * 1024, [&h](const unsigned char* chunk, size_t n) { h = hash_bytes(h, chunk, n); });
+    h ^= h >> 33;
+    h *= hash_prime2;
+    h ^= h >> 29;
+    h *= hash_prime1;
+    h ^= h >> 32;
+    stats::pixels += (uint64_t)width * height;
+    return h;
+}
+
+bool Image::equals(const Image& other) const {
+    stats::Scope scope(stats::Op::Compare);
+    if (!same_shape(other)) return false;
+    stats::pixels += (uint64_t)width * height;
+    if (pixels == other.pixels && stride == other.stride) return true;
+    unsigned char mask = padding_mask();
+    if (mask == 0xFF && is_contiguous() && other.is_contiguous())
+        return std::memcmp(pixels, other.pixels, pixels_size) == 0;
+
+    size_t row_bytes = get_row_bytes();
+    for (int y = 0; y < height; ++y) {
+        const unsigned char* a = row_ptr(y);
+        const unsigned char* b = other.row_ptr(y);
+        if (std::memcmp(a, b, row_bytes - 1) != 0 || ((a[row_bytes - 1] ^ b[row_bytes - 1]) & mask)) return false;
+    }
+    return true;
+}
+
+// Pixeles distintos de una fila: cuantos son y el tramo [x0, x1] entre el primero y el
+// ultimo (vacio si no hay ninguno)
+static uint64_t diff_row(const unsigned char* a, const unsigned char* b, int width, int px_size, int& x0, int& x1) {
+    auto differs = [&](int x) {
+        bool d = false;
+        for (int c = 0; c < px_size; ++c) d |= a[x * px_size + c] != b[x * px_size + c];
+        return d;
+    };
+    x0 = 0;
+    x1 = width - 1;
+    while (x0 < width && !differs(x0)) ++x0;
+    if (x0 == width) return 0;
+    while (!differs(x1)) --x1;
+    uint64_t count = 0;
+    for (int x = x0; x <= x1; ++x) count += differs(x);
+    return count;
+}
+
+static uint64_t diff_bits_row(const unsigned char* a, const unsigned char* b, size_t row_bytes, unsigned char mask,
+                              int& x0, int& x1) {
+    auto xor_at = [&](size_t i) {
+        unsigned v = a[i] ^ b[i];
+        return i + 1 == row_bytes ? v & mask : v;
+    };
+    size_t first = 0, last = row_bytes;
+    while (first < row_bytes && !xor_at(first)) ++first;
+    if (first == row_bytes) return 0;
+    while (!xor_at(last - 1)) --last;
+    uint64_t count = 0;
+    for (size_t i = first; i < last; ++i) count += bit_count(xor_at(i));
+
+    // El bit mas significativo es el pixel de mas a la izquierda
+    unsigned v = xor_at(first);
+    x0 = static_cast<int>(first * 8);
+    for (unsigned bit = 0x80; !(v & bit); bit >>= 1) ++x0;
+    v = xor_at(last - 1);
+    x1 = static_cast<int>(last * 8 - 1);
+    for (unsigned bit = 1; !(v & bit); bit <<= 1) --x1;
+    return count;
+}
+
+Image::Difference Image::diff(const Image& other) const {
+    stats::Scope scope(stats::Op::Compare);
+    if (!same_shape(other)) throw std::runtime_error("Las imagenes deben tener el mismo tamaño, modo y maxval");
+
+    // Cada fila se resume por separado y al final se juntan, para repartirlas entre hilos
+    std::vector<uint64_t> counts(height, 0);
+    std::vector<Span> spans(height, Span{width, -1});
+    size_t row_bytes = get_row_bytes();
+    unsigned char mask = padding_mask();
+    parallel_rows(height, (size_t)width * height, [&](int y0, int y1) {
+        for (int y = y0; y < y1; ++y) {
+            const unsigned char* a = row_ptr(y);
+            const unsigned char* b = other.row_ptr(y);
+            if (a == b || std::memcmp(a, b, row_bytes) == 0) continue;
+            if (kind == Kind::Pbm) counts[y] = diff_bits_row(a, b, row_bytes, mask, spans[y].x0, spans[y].x1);
+            else counts[y] = diff_row(a, b, width, pixel_size(), spans[y].x0, spans[y].x1);
+        }
+    });
+
+    Difference result{0, width, height, -1, -1};
+    for (int y = 0; y < height; ++y) {
+        if (!counts[y]) continue;
+        result.count += counts[y];
+        result.x0 = std::min(result.x0, spans[y].x0);
+        result.x1 = std::max(result.x1, spans[y].x1);
+        result.y0 = std::min(result.y0, y);
+        result.y1 = y;
+    }
+    stats::pixels += (uint64_t)width * height;
+    return result;
+}
+
+static uint64_t squared_error(const uint16_t* a, const uint16_t* b, size_t n) {
+    uint64_t sum = 0;
+    for (size_t i = 0; i < n; ++i) {
+        int64_t d = (int64_t)a[i] - (int64_t)b[i];
+        sum += (uint64_t)(d * d);
+    }
+    return sum;
+}
+
+// Con 8 bits cada cuadrado cabe en 16 bits: se suman en 32 bits por bloques de 2^16
+// muestras, un bucle que el compilador vectoriza
+static uint64_t squared_error(const unsigned char* a, const unsigned char* b, size_t n) {
+    uint64_t sum = 0;
+    for (size_t i0 = 0; i0 < n; i0 += 65536) {
+        size_t i1 = std::min(n, i0 + 65536);
+        uint32_t block = 0;
+        for (size_t i = i0; i < i1; ++i) {
+            int d = a[i] - b[i];
+            block += static_cast<uint32_t>(d * d);
+        }
+        sum += block;
+    }
+    return sum;
+}
+
+double Image::psnr(const Image& other) const {
+    stats::Scope scope(stats::Op::Compare);
+    if (!same_shape(other)) throw std::runtime_error("Las imagenes deben tener el mismo tamaño, modo y maxval");
+
+    // En pbm cada pixel es una muestra de 0 a 1 y el error es el numero de bits distintos
+    std::vector<uint64_t> rows(height, 0);
+    size_t row_bytes = get_row_bytes();
+    unsigned char mask = padding_mask();
+    parallel_rows(height, (size_t)width * height, [&](int y0, int y1) {
+        for (int y = y0; y < y1; ++y) {
+            const unsigned char* a = row_ptr(y);
+            const unsigned char* b = other.row_ptr(y);
+            if (kind == Kind::Pbm) {
+                for (size_t i = 0; i < row_bytes; ++i)
+                    rows[y] += bit_count((a[i] ^ b[i]) & (i + 1 == row_bytes ? mask : 0xFF));
+            } else if (sample_size == 1) {
+                rows[y] = squared_error(a, b, row_bytes);
+            } else {
+                rows[y] = squared_error(reinterpret_cast<const uint16_t*>(a), reinterpret_cast<const uint16_t*>(b),
+                                        row_bytes / 2);
+            }
+        }
+    });
+
+    double sum = 0.0;
+    for (uint64_t r : rows) sum += static_cast<double>(r);
+    stats::pixels += (uint64_t)width * height;
+    if (sum == 0.0) return std::numeric_limits<double>::infinity();
+    double peak = kind == Kind::Pbm ? 1.0 : max_val;
+    double samples = kind == Kind::Pbm ? (double)width * height : (double)sample_count();
+    return 10.0 * std::log10(peak * peak / (sum / samples));
+}
+
+// Rellena n pixeles consecutivos con el patron px de px_size bytes: memset si el
+// patron es de un solo valor; si no, copia duplicando el bloque ya escrito.
+static void fill_pattern(unsigned char* dst, size_t n, const unsigned char* px, size_t px_size) {
+    if (n == 0) return;
+    bool uniform = true;
+    for (size_t c = 1; c < px_size; ++c) uniform = uniform && px[c] == px[0];
+    if (uniform) {
+        std::memset(dst, px[0], n * px_size);
+        return;
+    }
+
+    const size_t max_block = 48 * 1024; // el bloque fuente se queda en cache
+    size_t total = n * px_size;
+    std::memcpy(dst, px, px_size);
+    size_t filled = px_size, block = px_size;
+    while (filled < total) {
+        size_t chunk = std::min(block, total - filled);
+        std::memcpy(dst + filled, dst, chunk);
+        filled += chunk;
+        if (block < max_block) block = filled;
+    }
+}
+
+void Image::plot(int x, int y, const unsigned char* px) {
     if (x < 0 || x >= width || y < 0 || y >= height) return;
+    if (kind == Kind::Pbm) {
+        unsigned char& byte = row_ptr(y)[x >> 3];
+        unsigned char bit = static_cast<unsigned char>(0x80 >> (x & 7));
+        byte = px[0] < 128 ? (byte | bit) : (byte & ~bit);
+    } else {
+        unsigned char* dst = pixel_ptr(x, y);
+        for (int c = 0; c < pixel_size(); ++c) dst[c] = px[c];
+    }
+    touch(y, y, x, x);
+    stats::pixels += 1;
+}
 
-    if (magic_number[1] == '1' || magic_number[1] == '4') { // PBM
-        data[y * width + x] = (color.r + color.g + color.b) / 3 < 128 ? 0 : 255;
-    } else if (magic_number[1] == '2' || magic_number[1] == '5') { // PGM
-        data[y * width + x] = (color.r + color.g + color.b) / 3;
-    } else { // PPM
-        size_t index = (y * width + x) * 3;
-        data[index] = color.r;
-        data[index + 1] = color.g;
-        data[index + 2] = color.b;
+void Image::fill_span(int y, int x0, int x1, const unsigned char* px) {
+    if (y < 0 || y >= height) return;
+    x0 = std::max(x0, 0);
+    x1 = std::min(x1, width - 1);
+    if (x0 > x1) return;
+    if (kind == Kind::Pbm) fill_bits(y, x0, x1, px[0] < 128);
+    else fill_pattern(pixel_ptr(x0, y), x1 - x0 + 1, px, pixel_size());
+    touch(y, y, x0, x1);
+    stats::pixels += x1 - x0 + 1;
+}
+
+// Rellena el rectangulo [x0, x1] x [y0, y1]; si abarca filas completas (y la imagen no
+// es una vista con huecos) las filas son contiguas en memoria y se rellenan de una vez.
+void Image::fill_rows(int y0, int y1, int x0, int x1, const unsigned char* px) {
+    x0 = std::max(x0, 0); y0 = std::max(y0, 0);
+    x1 = std::min(x1, width - 1); y1 = std::min(y1, height - 1);
+    if (x0 > x1 || y0 > y1) return;
+    stats::pixels += (uint64_t)(x1 - x0 + 1) * (y1 - y0 + 1);
+    touch(y0, y1, x0, x1);
+
+    if (kind == Kind::Pbm) {
+        for (int y = y0; y <= y1; ++y) fill_bits(y, x0, x1, px[0] < 128);
+        return;
+    }
+    if (x0 == 0 && x1 == width - 1 && is_contiguous()) {
+        fill_pattern(pixel_ptr(0, y0), (size_t)(y1 - y0 + 1) * width, px, pixel_size());
+        return;
     }
+    for (int y = y0; y <= y1; ++y) fill_pattern(pixel_ptr(x0, y), x1 - x0 + 1, px, pixel_size());
 }
 
-// Algoritmo de Bresenham para lineas
-void Image::draw_line(int x0, int y0, int x1, int y1, const Color& color) {
+// Bytes completos con memset y mascaras solo en los extremos del tramo
+void Image::fill_bits(int y, int x0, int x1, bool black) {
+    unsigned char* row = row_ptr(y);
+    int b0 = x0 >> 3, b1 = x1 >> 3;
+    unsigned char first = static_cast<unsigned char>(0xFF >> (x0 & 7));
+    unsigned char last = static_cast<unsigned char>(0xFF << (7 - (x1 & 7)));
+    auto apply = [black](unsigned char& byte, unsigned char mask) {
+        byte = black ? (byte | mask) : (byte & ~mask);
+    };
+    if (b0 == b1) {
+        apply(row[b0], first & last);
+        return;
+    }
+    apply(row[b0], first);
+    std::memset(row + b0 + 1, black ? 0xFF : 0x00, b1 - b0 - 1);
+    apply(row[b1], last);
+}
+
+void Image::set_pixel(int x, int y, const Color& color) {
+    unsigned char px[max_pixel_size];
+    encode(color, px);
+    plot(x, y, px);
+}
+
+// Algoritmo de Bresenham para lineas; los pixeles consecutivos de una misma
+// fila se agrupan en un span
+void Image::raster_line(int x0, int y0, int x1, int y1, const Color& color) {
+    unsigned char px[max_pixel_size];
+    encode(color, px);
+
     int dx = std::abs(x1 - x0), sx = x0 < x1 ? 1 : -1;
     int dy = -std::abs(y1 - y0), sy = y0 < y1 ? 1 : -1;
     int err = dx + dy, e2;
+    int run_start = x0;
 
-    while (true) {
-        set_pixel(x0, y0, color);
-        if (x0 == x1 && y0 == y1) break;
+    while (x0 != x1 || y0 != y1) {
+        int prev_x = x0, prev_y = y0;
         e2 = 2 * err;
         if (e2 >= dy) { err += dy; x0 += sx; }
         if (e2 <= dx) { err += dx; y0 += sy; }
+        if (y0 != prev_y) {
+            fill_span(prev_y, std::min(run_start, prev_x), std::max(run_start, prev_x), px);
+            run_start = x0;
+        }
     }
-    std::cout << "DEBUG: draw_line completed. Data size: " << data.size() << std::endl;
+    fill_span(y0, std::min(run_start, x0), std::max(run_start, x0), px);
+}
+
+void Image::draw_line(int x0, int y0, int x1, int y1, const Color& color) {
+    stats::Scope scope(stats::Op::DrawLine);
+    check_writable();
+    raster_line(x0, y0, x1, y1, color);
 }
 
 // Dibujo de rectangulos
-void Image::draw_rectangle(int x0, int y0, int x1, int y1, const Color& color, bool fill) {
+void Image::raster_rectangle(int x0, int y0, int x1, int y1, const Color& color, bool fill) {
+    unsigned char px[max_pixel_size];
+    encode(color, px);
+
+    int left = std::min(x0, x1), right = std::max(x0, x1);
+    int top = std::min(y0, y1), bottom = std::max(y0, y1);
     if (fill) {
-        for (int y = std::min(y0, y1); y <= std::max(y0, y1); ++y) {
-            for (int x = std::min(x0, x1); x <= std::max(x0, x1); ++x) {
-                set_pixel(x, y, color);
-            }
-        }
+        fill_rows(top, bottom, left, right, px);
     } else {
-        draw_line(x0, y0, x1, y0, color);
-        draw_line(x0, y1, x1, y1, color);
-        draw_line(x0, y0, x0, y1, color);
-        draw_line(x1, y0, x1, y1, color);
+        fill_span(top, left, right, px);
+        fill_span(bottom, left, right, px);
+        fill_rows(top, bottom, x0, x0, px);
+        fill_rows(top, bottom, x1, x1, px);
     }
-    std::cout << "DEBUG: draw_rectangle completed. Data size: " << data.size() << std::endl;
+}
+
+void Image::draw_rectangle(int x0, int y0, int x1, int y1, const Color& color, bool fill) {
+    stats::Scope scope(stats::Op::DrawRectangle);
+    check_writable();
+    raster_rectangle(x0, y0, x1, y1, color, fill);
+}
+
+// Mayor dx >= 0 tal que dx * dx <= rem
+static int isqrt(int rem) {
+    int dx = static_cast<int>(std::sqrt(static_cast<double>(rem)));
+    while (dx > 0 && dx * dx > rem) --dx;
+    while ((dx + 1) * (dx + 1) <= rem) ++dx;
+    return dx;
 }
 
 // Algoritmo de Midpoint/Bresenham para circulos
-void Image::draw_circle(int xc, int yc, int r, const Color& color, bool fill) {
+void Image::raster_circle(int xc, int yc, int r, const Color& color, bool fill) {
+    unsigned char px[max_pixel_size];
+    encode(color, px);
+
     if (fill) {
-        
+        // Un span por fila: los x con x*x + y*y <= r*r
         int r_sq = r * r;
-        for (int y = -r; y <= r; ++y) {
-            for (int x = -r; x <= r; ++x) {
-                if (x * x + y * y <= r_sq) {
-                    set_pixel(xc + x, yc + y, color);
-                }
-            }
+        int y_begin = std::max(-r, -yc), y_end = std::min(r, height - 1 - yc);
+        for (int y = y_begin; y <= y_end; ++y) {
+            int half = isqrt(r_sq - y * y);
+            fill_span(yc + y, xc - half, xc + half, px);
         }
     } else {
         
         int x = r, y = 0;
         int err = 0;
         while (x >= y) {
-            set_pixel(xc + x, yc + y, color); set_pixel(xc - x, yc + y, color);
-            set_pixel(xc + x, yc - y, color); set_pixel(xc - y, yc - y, color);
-            set_pixel(xc + y, yc + x, color); set_pixel(xc - y, yc + x, color);
-            set_pixel(xc + y, yc - x, color); set_pixel(xc - y, yc - x, color);
+            plot(xc + x, yc + y, px); plot(xc - x, yc + y, px);
+            plot(xc + x, yc - y, px); plot(xc - y, yc - y, px);
+            plot(xc + y, yc + x, px); plot(xc - y, yc + x, px);
+            plot(xc + y, yc - x, px); plot(xc - y, yc - x, px);
 
             y++;
             if (err <= 0) {
@@ -240,5 +1386,446 @@ void Image::draw_circle(int xc, int yc, int r, const Color& color, bool fill) {
             }
         }
     }
-    std::cout << "DEBUG: draw_circle completed. Data size: " << data.size() << std::endl;
+}
+
+void Image::draw_circle(int xc, int yc, int r, const Color& color, bool fill) {
+    stats::Scope scope(stats::Op::DrawCircle);
+    check_writable();
+    raster_circle(xc, yc, r, color, fill);
+}
+
+// Relleno de poligonos por scanlines con tabla de aristas. Cada fila y se muestrea en
+// los centros de pixel: las aristas cubren [ymin, ymax) para que un vertice compartido
+// no cuente dos veces, y cada tramo interior va de ceil(x izquierda) a floor(x derecha).
+void Image::raster_polygon(const double* points, size_t count, const unsigned char* px, bool even_odd) {
+    struct Edge {
+        double y0, y1, x0, dxdy;
+        int dir;  // +1 si baja, -1 si sube: el sentido cuenta para la regla de vueltas
+    };
+    std::vector<Edge> edges;
+    edges.reserve(count);
+    double ymin = height, ymax = -1;
+    for (size_t i = 0; i < count; ++i) {
+        double xa = points[2 * i], ya = points[2 * i + 1];
+        size_t j = (i + 1) % count;
+        double xb = points[2 * j], yb = points[2 * j + 1];
+        if (ya == yb) continue;  // las horizontales no cortan ninguna scanline
+        int dir = 1;
+        if (ya > yb) {
+            std::swap(xa, xb);
+            std::swap(ya, yb);
+            dir = -1;
+        }
+        edges.push_back({ya, yb, xa, (xb - xa) / (yb - ya), dir});
+        ymin = std::min(ymin, ya);
+        ymax = std::max(ymax, yb);
+    }
+    if (edges.empty()) return;
+    std::sort(edges.begin(), edges.end(), [](const Edge& a, const Edge& b) { return a.y0 < b.y0; });
+
+    int y_begin = std::max(0, static_cast<int>(std::ceil(ymin)));
+    int y_end = std::min(height - 1, static_cast<int>(std::ceil(ymax)) - 1);
+    std::vector<const Edge*> active;
+    std::vector<std::pair<double, int>> crossings;
+    size_t next = 0;
+    for (int y = y_begin; y <= y_end; ++y) {
+        // Entran las aristas que empiezan en esta fila y salen las que ya terminaron
+        while (next < edges.size() && edges[next].y0 <= y) active.push_back(&edges[next++]);
+        active.erase(std::remove_if(active.begin(), active.end(), [y](const Edge* e) { return e->y1 <= y; }),
+                     active.end());
+
+        crossings.clear();
+        for (const Edge* e : active) crossings.push_back({e->x0 + (y - e->y0) * e->dxdy, e->dir});
+        std::sort(crossings.begin(), crossings.end());
+
+        int winding = 0;
+        for (size_t k = 0; k + 1 < crossings.size(); ++k) {
+            winding += crossings[k].second;
+            bool inside = even_odd ? (k % 2 == 0) : winding != 0;
+            if (!inside) continue;
+            int x0 = static_cast<int>(std::ceil(crossings[k].first));
+            int x1 = static_cast<int>(std::floor(crossings[k + 1].first));
+            if (x0 <= x1) fill_span(y, x0, x1, px);
+        }
+    }
+}
+
+void Image::fill_polygon(const int* points, size_t count, const Color& color, bool even_odd) {
+    stats::Scope scope(stats::Op::FillPolygon);
+    check_writable();
+    if (count == 0) return;
+    unsigned char px[max_pixel_size];
+    encode(color, px);
+
+    std::vector<double> coords(points, points + 2 * count);
+    raster_polygon(coords.data(), count, px, even_odd);
+    for (size_t i = 0; i < count; ++i) {
+        size_t j = (i + 1) % count;
+        raster_line(points[2 * i], points[2 * i + 1], points[2 * j], points[2 * j + 1], color);
+    }
+}
+
+// Cada segmento grueso es un rectangulo girado de thickness de ancho; en los vertices
+// un circulo relleno tapa la union
+void Image::draw_polyline(const int* points, size_t count, const Color& color, int thickness, bool closed) {
+    stats::Scope scope(stats::Op::DrawPolyline);
+    check_writable();
+    if (thickness < 1) throw std::runtime_error("El grosor debe ser al menos 1");
+    if (count == 0) return;
+    size_t segments = closed && count > 2 ? count : count - 1;
+
+    if (thickness == 1) {
+        if (count == 1) raster_line(points[0], points[1], points[0], points[1], color);
+        for (size_t i = 0; i < segments; ++i) {
+            size_t j = (i + 1) % count;
+            raster_line(points[2 * i], points[2 * i + 1], points[2 * j], points[2 * j + 1], color);
+        }
+        return;
+    }
+
+    unsigned char px[max_pixel_size];
+    encode(color, px);
+    double half = thickness / 2.0;
+    for (size_t i = 0; i < segments; ++i) {
+        size_t j = (i + 1) % count;
+        double xa = points[2 * i], ya = points[2 * i + 1];
+        double xb = points[2 * j], yb = points[2 * j + 1];
+        double len = std::hypot(xb - xa, yb - ya);
+        if (len == 0) continue;
+        double nx = -(yb - ya) / len * half, ny = (xb - xa) / len * half;
+        double quad[8] = {xa + nx, ya + ny, xb + nx, yb + ny, xb - nx, yb - ny, xa - nx, ya - ny};
+        raster_polygon(quad, 4, px, false);
+    }
+    int r = (thickness - 1) / 2;
+    for (size_t i = 0; i < count; ++i) raster_circle(points[2 * i], points[2 * i + 1], r, color, true);
+}
+
+// Dibujo por lotes: una sola llamada rasteriza todas las primitivas
+static inline Color batch_color(const unsigned char* colors, size_t color_stride, size_t i) {
+    const unsigned char* c = colors + i * color_stride;
+    return Color{c[0], c[1], c[2]};
+}
+
+void Image::draw_points(const int* coords, size_t count, const unsigned char* colors, size_t color_stride) {
+    stats::Scope scope(stats::Op::DrawPoints);
+    check_writable();
+    for (size_t i = 0; i < count; ++i) {
+        const int* p = coords + i * 2;
+        unsigned char px[max_pixel_size];
+        encode(batch_color(colors, color_stride, i), px);
+        plot(p[0], p[1], px);
+    }
+}
+
+void Image::draw_lines(const int* coords, size_t count, const unsigned char* colors, size_t color_stride) {
+    stats::Scope scope(stats::Op::DrawLines);
+    check_writable();
+    for (size_t i = 0; i < count; ++i) {
+        const int* p = coords + i * 4;
+        raster_line(p[0], p[1], p[2], p[3], batch_color(colors, color_stride, i));
+    }
+}
+
+void Image::draw_rectangles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill) {
+    stats::Scope scope(stats::Op::DrawRectangles);
+    check_writable();
+    for (size_t i = 0; i < count; ++i) {
+        const int* p = coords + i * 4;
+        raster_rectangle(p[0], p[1], p[2], p[3], batch_color(colors, color_stride, i), fill);
+    }
+}
+
+void Image::draw_circles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill) {
+    stats::Scope scope(stats::Op::DrawCircles);
+    check_writable();
+    for (size_t i = 0; i < count; ++i) {
+        const int* p = coords + i * 3;
+        raster_circle(p[0], p[1], p[2], batch_color(colors, color_stride, i), fill);
+    }
+}
+
+// Degradados
+static Color gradient_color(const std::vector<GradientStop>& stops, double t) {
+    if (t <= stops.front().pos) return stops.front().color;
+    if (t >= stops.back().pos) return stops.back().color;
+
+    size_t k = 1;
+    while (stops[k].pos < t) ++k;
+    const GradientStop& a = stops[k - 1];
+    const GradientStop& b = stops[k];
+    if (b.pos <= a.pos) return b.color;
+
+    // Misma aritmetica que las escenas en Python: int((1 - ratio) * c0 + ratio * c1)
+    double ratio = (t - a.pos) / (b.pos - a.pos);
+    return Color{
+        static_cast<unsigned char>(static_cast<int>((1 - ratio) * a.color.r + ratio * b.color.r)),
+        static_cast<unsigned char>(static_cast<int>((1 - ratio) * a.color.g + ratio * b.color.g)),
+        static_cast<unsigned char>(static_cast<int>((1 - ratio) * a.color.b + ratio * b.color.b)),
+        static_cast<unsigned char>(static_cast<int>((1 - ratio) * a.color.a + ratio * b.color.a))
+    };
+}
+
+void Image::fill_gradient(const std::vector<GradientStop>& stops, const std::string& mode,
+                          int x0, int y0, int x1, int y1, double start, double end,
+                          double cx, double cy) {
+    stats::Scope scope(stats::Op::FillGradient);
+    check_writable();
+    if (stops.empty()) throw std::runtime_error("El degradado necesita al menos un color");
+    for (size_t k = 1; k < stops.size(); ++k) {
+        if (stops[k].pos < stops[k - 1].pos)
+            throw std::runtime_error("Las paradas del degradado deben estar ordenadas por posicion");
+    }
+    if (mode != "vertical" && mode != "horizontal" && mode != "radial")
+        throw std::runtime_error("Modo de degradado no soportado. Use 'vertical', 'horizontal' o 'radial'.");
+
+    x0 = std::max(x0, 0); y0 = std::max(y0, 0);
+    x1 = std::min(x1, width - 1); y1 = std::min(y1, height - 1);
+    if (x0 > x1 || y0 > y1) return;
+
+    double extent = end - start;
+    auto param = [&](double v) { return extent != 0 ? (v - start) / extent : 1.0; };
+
+    // La vertical pasa por fill_span, que ya cuenta sus pixeles
+    if (mode != "vertical") {
+        stats::pixels += (uint64_t)(x1 - x0 + 1) * (y1 - y0 + 1);
+        touch(y0, y1, x0, x1);
+    }
+
+    unsigned char px[max_pixel_size];
+    if (kind == Kind::Pbm && mode != "vertical") {
+        // Cada fila se agrupa en tramos del mismo valor
+        std::vector<unsigned char> row(x1 - x0 + 1);
+        for (int y = y0; y <= y1; ++y) {
+            if (mode == "radial" || y == y0) {
+                double dy = y - cy;
+                for (int x = x0; x <= x1; ++x) {
+                    double t = mode == "horizontal" ? param(x) : param(std::sqrt((x - cx) * (x - cx) + dy * dy));
+                    encode(gradient_color(stops, t), px);
+                    row[x - x0] = px[0] < 128;
+                }
+            }
+            for (int x = x0; x <= x1;) {
+                int run = x;
+                while (run < x1 && row[run + 1 - x0] == row[x - x0]) ++run;
+                fill_bits(y, x, run, row[x - x0] != 0);
+                x = run + 1;
+            }
+        }
+    } else if (mode == "vertical") {
+        for (int y = y0; y <= y1; ++y) {
+            encode(gradient_color(stops, param(y)), px);
+            fill_span(y, x0, x1, px);
+        }
+    } else if (mode == "horizontal") {
+        // Se calcula la primera fila y se copia al resto
+        for (int x = x0; x <= x1; ++x) {
+            encode(gradient_color(stops, param(x)), pixel_ptr(x, y0));
+        }
+        size_t row_bytes = (size_t)(x1 - x0 + 1) * pixel_size();
+        for (int y = y0 + 1; y <= y1; ++y) std::memcpy(pixel_ptr(x0, y), pixel_ptr(x0, y0), row_bytes);
+    } else {
+        for (int y = y0; y <= y1; ++y) {
+            double dy = y - cy;
+            for (int x = x0; x <= x1; ++x) {
+                double dx = x - cx;
+                encode(gradient_color(stops, param(std::sqrt(dx * dx + dy * dy))), pixel_ptr(x, y));
+            }
+        }
+    }
+}
+
+// Estado del pool, compartido con los rasters que ha entregado: al morir el ultimo
+// usuario de uno, su deleter lo devuelve aqui si el pool sigue vivo
+struct ImagePool::Shared {
+    std::mutex mutex;
+    std::unordered_multimap<size_t, std::vector<unsigned char>*> free;  // por tamaño en bytes
+    size_t capacity;
+    size_t hits = 0, misses = 0;
+
+    explicit Shared(size_t capacity) : capacity(capacity) {}
+    ~Shared() {
+        for (auto& entry : free) delete entry.second;
+    }
+
+    void trim() {
+        while (free.size() > capacity) {
+            delete free.begin()->second;
+            free.erase(free.begin());
+        }
+    }
+};
+
+ImagePool::ImagePool(size_t capacity) : shared(std::make_shared<Shared>(capacity)) {}
+
+Image ImagePool::acquire(int width, int height, const std::string& mode, int max_val, bool clear) {
+    if (width <= 0 || height <= 0) throw std::runtime_error("Dimensiones invalidas");
+    Image img;
+    img.width = width;
+    img.height = height;
+    img.set_mode(mode, max_val);
+    size_t size = img.get_row_bytes() * height;
+
+    std::vector<unsigned char>* buffer = nullptr;
+    {
+        std::lock_guard<std::mutex> lock(shared->mutex);
+        auto it = shared->free.find(size);
+        if (it != shared->free.end()) {
+            buffer = it->second;
+            shared->free.erase(it);
+            ++shared->hits;
+        } else {
+            ++shared->misses;
+        }
+    }
+    bool recycled = buffer != nullptr;
+    if (!recycled) buffer = new std::vector<unsigned char>(size);
+
+    std::weak_ptr<Shared> pool = shared;
+    img.data = std::shared_ptr<std::vector<unsigned char>>(buffer, [pool](std::vector<unsigned char>* b) {
+        if (auto owner = pool.lock()) {
+            std::lock_guard<std::mutex> lock(owner->mutex);
+            if (owner->capacity > 0) {
+                owner->free.emplace(b->size(), b);
+                owner->trim();
+                return;
+            }
+        }
+        delete b;
+    });
+    img.pixels = buffer->data();
+    img.pixels_size = size;
+    img.stride = img.get_row_bytes();
+    img.dirty.assign(height, Image::Span{0, width - 1});
+    // Sin clear el raster conserva lo que tuviera (ceros si es nuevo), salvo el relleno
+    // de pbm, que siempre queda limpio
+    if (clear) img.fill_initial();
+    else if (recycled) img.clear_padding();
+    return img;
+}
+
+ImagePool::Info ImagePool::info() const {
+    std::lock_guard<std::mutex> lock(shared->mutex);
+    return {shared->hits, shared->misses, shared->free.size(), shared->capacity};
+}
+
+void ImagePool::set_capacity(size_t capacity) {
+    std::lock_guard<std::mutex> lock(shared->mutex);
+    shared->capacity = capacity;
+    shared->trim();
+}
+
+void ImagePool::clear() {
+    std::lock_guard<std::mutex> lock(shared->mutex);
+    for (auto& entry : shared->free) delete entry.second;
+    shared->free.clear();
+    shared->hits = shared->misses = 0;
+}
+
+// Mezcla n pixeles RGBA sin premultiplicar sobre una fila RGB: d = (s * a + d * (255 - a)) / 255
+// redondeado. t cabe en 16 bits y (t + (t >> 8)) >> 8 divide por 255 de forma exacta, asi
+// que el bucle interior se vectoriza sin divisiones. Se avanza por bloques: uno
+// transparente no toca la fila y uno opaco se copia sin mezclar.
+static void blend_span(unsigned char* dst, const unsigned char* src, int n) {
+    const int block = 16;
+    for (int x0 = 0; x0 < n; x0 += block) {
+        int m = std::min(block, n - x0);
+        const unsigned char* s = src + 4 * x0;
+        unsigned char* d = dst + 3 * x0;
+        unsigned any = 0, all = 255;
+        for (int k = 0; k < m; ++k) {
+            any |= s[4 * k + 3];
+            all &= s[4 * k + 3];
+        }
+        if (any == 0) continue;
+        if (all == 255) {
+            for (int k = 0; k < m; ++k) {
+                d[3 * k] = s[4 * k];
+                d[3 * k + 1] = s[4 * k + 1];
+                d[3 * k + 2] = s[4 * k + 2];
+            }
+            continue;
+        }
+        for (int k = 0; k < m; ++k) {
+            unsigned a = s[4 * k + 3], ia = 255 - a;
+            for (int c = 0; c < 3; ++c) {
+                unsigned t = s[4 * k + c] * a + d[3 * k + c] * ia + 128;
+                d[3 * k + c] = static_cast<unsigned char>((t + (t >> 8)) >> 8);
+            }
+        }
+    }
+}
+
+Image flatten(int width, int height, const std::vector<Layer>& layers, const Color& background) {
+    stats::Scope scope(stats::Op::Flatten);
+    if (width <= 0 || height <= 0) throw std::runtime_error("Dimensiones invalidas");
+    for (const Layer& layer : layers) {
+        std::string mode = layer.image->get_mode();
+        if ((mode != "pam" && mode != "ppm") || layer.image->get_sample_size() != 1)
+            throw std::runtime_error("Las capas deben ser imagenes pam o ppm de 8 bits");
+    }
+
+    Image out(width, height, "ppm");
+    unsigned char* base = out.get_pixels();
+    size_t out_row = (size_t)width * 3;
+    std::vector<unsigned char> fill(out_row);
+    for (int x = 0; x < width; ++x) {
+        fill[3 * x] = background.r;
+        fill[3 * x + 1] = background.g;
+        fill[3 * x + 2] = background.b;
+    }
+    parallel_rows(height, (size_t)width * height * std::max<size_t>(1, layers.size()), [&](int y0, int y1) {
+        for (int y = y0; y < y1; ++y) {
+            unsigned char* row = base + y * out_row;
+            std::memcpy(row, fill.data(), out_row);
+            for (const Layer& layer : layers) {
+                const Image& img = *layer.image;
+                int sy = y - layer.y;
+                if (sy < 0 || sy >= img.get_height()) continue;
+                int x0 = std::max(0, layer.x), x1 = std::min(width, layer.x + img.get_width());
+                if (x0 >= x1) continue;
+                int channels = img.get_channels();
+                const unsigned char* src = img.get_pixels() + (size_t)sy * img.get_stride() + (size_t)(x0 - layer.x) * channels;
+                if (channels == 4) blend_span(row + 3 * x0, src, x1 - x0);
+                else std::memcpy(row + 3 * x0, src, (size_t)(x1 - x0) * 3);
+            }
+        }
+    });
+    stats::pixels += (uint64_t)width * height;
+    return out;
+}
+
+void convert_many(const std::vector<std::pair<std::string, std::string>>& pairs, bool binary, unsigned threads) {
+    stats::Scope scope(stats::Op::ConvertMany);
+    if (threads == 0) threads = std::max(1u, std::thread::hardware_concurrency());
+    threads = static_cast<unsigned>(std::min<size_t>(threads, pairs.size()));
+
+    // Cada hilo toma el siguiente par libre; las imagenes no se comparten entre hilos
+    std::atomic<size_t> next(0);
+    std::mutex error_mutex;
+    size_t failures = 0, first_failure = pairs.size();
+    std::string first_error;
+    auto worker = [&]() {
+        for (size_t i = next++; i < pairs.size(); i = next++) {
+            try {
+                Image img(pairs[i].first);
+                img.save(pairs[i].second, binary);
+            } catch (const std::exception& e) {
+                std::lock_guard<std::mutex> lock(error_mutex);
+                ++failures;
+                if (i < first_failure) {
+                    first_failure = i;
+                    first_error = pairs[i].first + ": " + e.what();
+                }
+            }
+        }
+    };
+
+    std::vector<std::thread> pool;
+    for (unsigned t = 1; t < threads; ++t) pool.emplace_back(worker);
+    worker();
+    for (std::thread& t : pool) t.join();
+
+    if (failures > 0)
+        throw std::runtime_error(std::to_string(failures) + " de " + std::to_string(pairs.size()) +
+                                 " conversiones fallaron. Primera: " + first_error);
 }
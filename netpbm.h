@@ -2,46 +2,293 @@
 #ifndef NETPBM_H
 #define NETPBM_H
 
+#include <algorithm>
+#include <cstdint>
+#include <fstream>
+#include <functional>
+#include <memory>
+#include <utility>
 #include <string>
 #include <vector>
 #include <stdexcept>
 
+class Scanner;
 
+
+// a es la opacidad (255 opaco, 0 transparente); solo la guardan las imagenes pam
 struct Color {
     unsigned char r, g, b;
+    unsigned char a = 255;
+};
+
+// Parada de un degradado: posicion en [0, 1] y su color
+struct GradientStop {
+    double pos;
+    Color color;
 };
 
 class Image {
 public:
 
-    Image(int width, int height, const std::string& mode);
+    // Con max_val > 255 (PGM/PPM) las muestras se guardan como uint16 nativos. "pam" es
+    // RGBA de 8 bits sin premultiplicar (P7 con TUPLTYPE RGB_ALPHA) y empieza transparente.
+    Image(int width, int height, const std::string& mode, int max_val = 255);
     Image(const std::string& filename);
+    Image(const Image& other);
+    Image& operator=(const Image& other);
+    Image(Image&&) = default;
+    Image& operator=(Image&&) = default;
+
+    // Abre un P4/P5/P6 proyectando el archivo en memoria: el raster no se copia y se lee
+    // bajo demanda. Con writable=true lo que se dibuja se escribe en el propio archivo.
+    static Image open_mmap(const std::string& filename, bool writable = false);
+    // Usa como raster height filas de get_row_bytes() bytes de memoria ajena, sin copiarlas
+    // (en pbm, filas empaquetadas como en P4); owner mantiene viva esa memoria mientras la
+    // imagen (o algo que la comparta) exista.
+    static Image from_memory(unsigned char* data, int width, int height, const std::string& mode,
+                             std::shared_ptr<void> owner, bool writable = true);
+
+    // Subimagen [x, x + w) x [y, y + h) que comparte la memoria de esta: lo que se dibuja en
+    // una se ve en la otra y la vista mantiene viva esa memoria. Sus filas no son contiguas
+    // (get_stride() > get_row_bytes()) salvo que ocupe el ancho completo; en pbm x debe ser
+    // multiplo de 8. Los cambios hechos a traves de la vista no se anotan como pendientes
+    // en esta imagen (ver mark_dirty).
+    Image view(int x, int y, int w, int h);
+    // Copia src con su esquina en (x, y), recortada contra esta imagen, fila a fila. Exige el
+    // mismo modo y maxval; src puede ser una vista que se solape con esta.
+    void blit(const Image& src, int x, int y);
 
     
     void load(const std::string& filename);
+    // Lee la siguiente imagen de un flujo ya abierto; si el tamaño no cambia reutiliza
+    // el raster propio sin volver a reservar memoria
+    void load(Scanner& in);
+    // pam siempre se guarda como P7, que no tiene variante ASCII
     void save(const std::string& filename, bool binary = false);
+    // Cabecera y raster en binario (P4/P5/P6/P7), lo mismo que save(..., true) escribe
+    void write_binary(const std::function<void(const char*, size_t)>& out) const;
+
+    // Las imagenes pbm guardan 1 bit por pixel, con las filas empaquetadas igual que en P4
+    // (bit mas significativo primero, 1 = negro, relleno a 0 hasta el byte). unpack las
+    // escribe en dst a un byte por pixel (0 negro, 255 blanco) y pack hace lo contrario
+    // (negro si el valor es < 128).
+    void unpack(unsigned char* dst) const;
+    static Image pack(const unsigned char* src, int width, int height);
+
+    // Cambios desde el ultimo load/save: por cada fila, el tramo [x0, x1] modificado.
+    // save_incremental reescribe en un P4/P5/P6 existente solo esos tramos si la cabecera
+    // del archivo coincide con la imagen; si no, guarda el archivo completo en binario.
+    // Devuelve los bytes escritos.
+    size_t save_incremental(const std::string& filename);
+    // Marca una region como modificada (para cambios hechos a traves del buffer)
+    void mark_dirty(int x0, int y0, int x1, int y1);
+    void mark_clean();
+    // Caja que engloba todo lo modificado; false si no hay cambios
+    bool dirty_bounds(int& x0, int& y0, int& x1, int& y1) const;
+
+    // Copia con las muestras reescaladas a new_max_val (8 o 16 bits segun el valor)
+    Image convert_depth(int new_max_val) const;
+    // Copia en otro modo. A pgm: method "luma" (BT.601, por defecto) o "average". A pbm:
+    // "threshold" (por defecto), "ordered" (Bayer 8x8) o "floyd-steinberg". pgm a ppm
+    // replica el gris; desde pbm el negro es 0 y el blanco 255. pam se compone sobre blanco
+    // antes de pasar a otro modo, y a pam se llega con alfa 255. "" elige el metodo por
+    // defecto; convertir al mismo modo devuelve una copia.
+    Image convert(const std::string& mode, const std::string& method = "") const;
 
+    // Copia reescalada con un filtro separable "box", "bilinear" o "lanczos". Las
+    // reducciones por un factor entero exacto con "box" van por un camino entero.
+    Image resize(int width, int height, const std::string& filter = "box") const;
+    // Reduccion con "box" a un lado mayor de max_side, conservando la proporcion; si ya
+    // cabe devuelve una copia
+    Image thumbnail(int max_side) const;
+
+    // Comparaciones sobre el raster en memoria, sin copiarlo (las muestras de 16 bits van
+    // en el orden nativo). checksum es un hash de 64 bits no criptografico que incluye
+    // tamaño, modo y maxval; equals exige que coincidan y que el raster sea identico.
+    // diff y psnr requieren el mismo tamaño, modo y maxval: diff cuenta los pixeles
+    // distintos y la caja [x0, x1] x [y0, y1] que los contiene (vacia si count es 0), psnr
+    // devuelve dB frente a maxval (infinito si son iguales; en pbm el pico es 1).
+    struct Difference {
+        uint64_t count;
+        int x0, y0, x1, y1;
+    };
+    uint64_t checksum() const;
+    bool equals(const Image& other) const;
+    Difference diff(const Image& other) const;
+    double psnr(const Image& other) const;
+
+    // En imagenes de 16 bits los componentes 0-255 del color se escalan a 0-max_val
     void draw_line(int x0, int y0, int x1, int y1, const Color& color);
     void draw_rectangle(int x0, int y0, int x1, int y1, const Color& color, bool fill = false);
     void draw_circle(int xc, int yc, int r, const Color& color, bool fill = false);
 
+    // points tiene count pares (x, y). fill_polygon rellena el interior por scanlines
+    // (regla par-impar con even_odd, si no numero de vueltas distinto de cero) y pinta
+    // tambien el borde, asi que sirve para poligonos concavos o que se cortan.
+    // draw_polyline une los puntos con segmentos de thickness pixeles de grueso y
+    // uniones redondeadas; closed une ademas el ultimo con el primero.
+    void fill_polygon(const int* points, size_t count, const Color& color, bool even_odd = true);
+    void draw_polyline(const int* points, size_t count, const Color& color, int thickness = 1, bool closed = false);
+
+    // Dibujo por lotes: coords tiene count filas de k enteros (k=2 puntos, 4 lineas y
+    // rectangulos, 3 circulos). colors tiene una fila RGB por primitiva (color_stride=3)
+    // o un unico color para todas (color_stride=0).
+    void draw_points(const int* coords, size_t count, const unsigned char* colors, size_t color_stride);
+    void draw_lines(const int* coords, size_t count, const unsigned char* colors, size_t color_stride);
+    void draw_rectangles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill = false);
+    void draw_circles(const int* coords, size_t count, const unsigned char* colors, size_t color_stride, bool fill = false);
+
+    // Degradado sobre la region [x0, x1] x [y0, y1] (inclusiva). El parametro t va de 0
+    // en start a 1 en end, medido sobre y ("vertical"), x ("horizontal") o la distancia
+    // al centro (cx, cy) ("radial"); fuera de ese rango se usa el color del extremo.
+    void fill_gradient(const std::vector<GradientStop>& stops, const std::string& mode,
+                       int x0, int y0, int x1, int y1, double start, double end,
+                       double cx = 0.0, double cy = 0.0);
+
 
     int get_width() const { return width; }
     int get_height() const { return height; }
-    const std::vector<unsigned char>& get_data() const { return data; }
+    int get_channels() const { return channels; }
+    std::string get_mode() const {
+        return kind == Kind::Pbm ? "pbm" : kind == Kind::Pgm ? "pgm" : kind == Kind::Ppm ? "ppm" : "pam";
+    }
+    int get_max_val() const { return max_val; }
+    int get_sample_size() const { return sample_size; }
+    unsigned char* get_pixels() { return pixels; }
+    const unsigned char* get_pixels() const { return pixels; }
+    size_t get_size() const { return pixels_size; }
+    size_t get_row_bytes() const { return kind == Kind::Pbm ? (size_t)(width + 7) / 8 : (size_t)width * pixel_size(); }
+    size_t get_stride() const { return stride; }
+    bool is_contiguous() const { return stride == get_row_bytes(); }
+    bool is_packed() const { return kind == Kind::Pbm; }
+    bool is_writable() const { return !read_only; }
 
 private:
-    int width, height, max_val;
+    enum class Kind { Pbm, Pgm, Ppm, Pam };
+
+    int width = 0, height = 0, max_val = 255;
     std::string magic_number;
-    std::vector<unsigned char> data;
+    Kind kind = Kind::Ppm;
+    int channels = 3;
+    int sample_size = 1;  // bytes por muestra: 1, o 2 si max_val > 255
+    static const int max_pixel_size = 6;
+
+    // El raster activo es pixels: apunta a data o a memoria externa (un archivo
+    // proyectado) que storage mantiene viva. data se comparte con las vistas, asi que solo
+    // se reutiliza si nadie mas lo usa. La fila y empieza en pixels + y * stride y
+    // pixels_size cubre desde la primera fila hasta el final de la ultima.
+    std::shared_ptr<std::vector<unsigned char>> data;
+    unsigned char* pixels = nullptr;
+    size_t pixels_size = 0;
+    size_t stride = 0;
+    std::shared_ptr<void> storage;
+    bool read_only = false;
+
+    struct Span {
+        int x0, x1;  // vacio si x0 > x1
+    };
+    std::vector<Span> dirty;  // una entrada por fila
+
+    Image() = default;
+    friend class ImagePool;
+
+    unsigned char* allocate(size_t size);
+    // Contenido de una imagen recien creada: pgm/ppm en blanco (max_val), pbm con todos los
+    // bits a 1 y pam transparente
+    void fill_initial();
+    // Anota como modificado [x0, x1] x [y0, y1], ya recortado a la imagen
+    void touch(int y0, int y1, int x0, int x1) {
+        for (int y = y0; y <= y1; ++y) {
+            Span& s = dirty[y];
+            s.x0 = std::min(s.x0, x0);
+            s.x1 = std::max(s.x1, x1);
+        }
+    }
+    void check_writable() const;
+    void set_kind(Kind k);
+    // Tipo, maxval y tamaño de muestra de una imagen nueva del modo dado
+    void set_mode(const std::string& mode, int max_val);
+    void encode(const Color& color, unsigned char* px) const;
+    int pixel_size() const { return channels * sample_size; }
+    size_t sample_count() const { return (size_t)width * height * channels; }
+    unsigned char* row_ptr(int y) { return pixels + (size_t)y * stride; }
+    const unsigned char* row_ptr(int y) const { return pixels + (size_t)y * stride; }
+    unsigned char* pixel_ptr(int x, int y) { return row_ptr(y) + (size_t)x * pixel_size(); }
+    // Recorre el raster tal como va en P4/P5/P6 (sin huecos entre filas ni bits ajenos en
+    // el relleno de pbm; las muestras de 16 bits en orden nativo) en trozos de chunk bytes,
+    // los mismos sea cual sea la disposicion en memoria
+    void raster_chunks(size_t chunk, const std::function<void(const unsigned char*, size_t)>& fn) const;
+
+    // Nucleo de rasterizacion: todas las primitivas terminan en plot o fill_span,
+    // que recortan contra la imagen y escriben el color ya codificado con encode.
+    void plot(int x, int y, const unsigned char* px);
+    void fill_span(int y, int x0, int x1, const unsigned char* px);
+    void fill_rows(int y0, int y1, int x0, int x1, const unsigned char* px);
+    // Version empaquetada de fill_span para pbm; el tramo ya viene recortado
+    void fill_bits(int y, int x0, int x1, bool black);
+    void clear_padding();
+    // Mascara de los bits validos del ultimo byte de cada fila (0xFF si no hay relleno)
+    unsigned char padding_mask() const;
+    bool same_shape(const Image& other) const;
 
     void set_pixel(int x, int y, const Color& color);
-    void read_pbm_ascii(std::ifstream& file);
-    void read_pbm_binary(std::ifstream& file);
-    void read_pgm_ascii(std::ifstream& file);
-    void read_pgm_binary(std::ifstream& file);
-    void read_ppm_ascii(std::ifstream& file);
-    void read_ppm_binary(std::ifstream& file);
+    void raster_line(int x0, int y0, int x1, int y1, const Color& color);
+    void raster_rectangle(int x0, int y0, int x1, int y1, const Color& color, bool fill);
+    void raster_circle(int xc, int yc, int r, const Color& color, bool fill);
+    void raster_polygon(const double* points, size_t count, const unsigned char* px, bool even_odd);
+    void read_pbm_ascii(Scanner& in);
+    void read_pbm_binary(Scanner& in);
+    void read_pgm_ascii(Scanner& in);
+    void read_pgm_binary(Scanner& in);
+    void read_ppm_ascii(Scanner& in);
+    void read_ppm_binary(Scanner& in);
+    void read_samples_ascii(Scanner& in);
+    void read_samples_binary(Scanner& in);
+    size_t write_dirty(std::fstream& file, size_t data_offset);
+    template <typename S> void convert_rows(Image& out, const std::string& method) const;
+    template <typename S> void resample_rows(Image& out, double (*kernel)(double), double support) const;
+    template <typename S> void box_reduce(Image& out, int fx, int fy) const;
 };
 
+// Entrega imagenes del tamaño y modo pedidos reutilizando rasters ya reservados: cuando
+// desaparece la ultima imagen (o vista) que usa uno, vuelve al pool en vez de liberarse.
+// Se guardan como mucho capacity rasters libres; se puede usar desde varios hilos y las
+// imagenes pueden sobrevivir al pool.
+class ImagePool {
+public:
+    explicit ImagePool(size_t capacity = 16);
+
+    // Con clear=true la imagen sale en blanco como una nueva; si no, con lo que tuviera
+    // el raster reciclado (para quien va a sobrescribirla entera)
+    Image acquire(int width, int height, const std::string& mode, int max_val = 255, bool clear = true);
+
+    struct Info {
+        size_t hits, misses, free, capacity;
+    };
+    Info info() const;
+    void set_capacity(size_t capacity);
+    void clear();
+
+private:
+    struct Shared;
+    std::shared_ptr<Shared> shared;
+};
+
+// Capa para flatten: una imagen pam o ppm de 8 bits (opaca) con su esquina en (x, y)
+struct Layer {
+    const Image* image;
+    int x, y;
+};
+
+// Compone las capas en orden, la primera al fondo, sobre un ppm de width x height relleno
+// con background (su alfa se ignora). Cada fila se recorre una vez aplicando todas las
+// capas que la cruzan; los tramos totalmente transparentes se saltan.
+Image flatten(int width, int height, const std::vector<Layer>& layers, const Color& background = Color{255, 255, 255});
+
+// Convierte cada par (origen, destino) cargandolo y guardandolo con save(destino, binary),
+// repartidos entre `threads` hilos nativos (0 = uno por nucleo). Todas las conversiones se
+// intentan; si alguna falla se lanza un error al final con la primera de ellas.
+void convert_many(const std::vector<std::pair<std::string, std::string>>& pairs, bool binary = true,
+                  unsigned threads = 0);
+
 #endif // NETPBM_H
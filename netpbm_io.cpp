@@ -0,0 +1,626 @@
+#include "netpbm_io.h"
+#include <algorithm>
+#include <cstdint>
+#include <cstring>
+#include <stdexcept>
+
+#ifdef _WIN32
+#define WIN32_LEAN_AND_MEAN
+#define NOMINMAX
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+#if defined(__SSE2__) || defined(_M_X64)
+#define NETPBM_SSE2 1
+#include <emmintrin.h>
+#ifdef _MSC_VER
+#include <intrin.h>
+#endif
+#endif
+
+// Espacio en blanco segun Netpbm: ' ', '\t', '\n', '\v', '\f' y '\r'
+static inline bool is_space(char c) {
+    return c == ' ' || (c >= '\t' && c <= '\r');
+}
+
+static inline unsigned is_digit(char c) {
+    return static_cast<unsigned char>(c - '0') < 10;
+}
+
+// Relleno de espacios antes de los datos (para mirar hacia atras desde el final de un
+// numero) y despues del centinela (para mirar hacia delante sin comprobar el final)
+static const size_t front_pad = 4;
+static const size_t back_pad = 4;
+
+Scanner::Scanner(ReadFn fn, size_t buffer_size)
+    : read_fn(std::move(fn)), buffer(front_pad + buffer_size + back_pad, ' ') {
+    base = buffer.data() + front_pad;
+    pos = end = base;
+    base[0] = '\0';
+}
+
+bool Scanner::refill() {
+    consumed_before += pos - base;
+    size_t n = read_fn(base, buffer.size() - front_pad - back_pad);
+    pos = base;
+    end = pos + n;
+    base[n] = '\0';
+    return n > 0;
+}
+
+bool Scanner::at_end() {
+    return pos == end && !refill();
+}
+
+bool Scanner::next_image() {
+    while (true) {
+        if (pos == end && !refill()) return false;
+        if (!is_space(*pos)) return true;
+        ++pos;
+    }
+}
+
+// Salta espacios y comentarios ('#' hasta el fin de linea) de la cabecera
+void Scanner::skip_header_space() {
+    while (true) {
+        if (pos == end && !refill()) return;
+        char c = *pos;
+        if (is_space(c)) {
+            ++pos;
+        } else if (c == '#') {
+            while (true) {
+                if (pos == end && !refill()) return;
+                c = *pos++;
+                if (c == '\n' || c == '\r') break;
+            }
+        } else {
+            return;
+        }
+    }
+}
+
+unsigned Scanner::read_header_uint() {
+    skip_header_space();
+    if (pos == end || !is_digit(*pos)) throw std::runtime_error("Cabecera Netpbm invalida");
+
+    unsigned long long value = 0;
+    while (true) {
+        if (pos == end && !refill()) break;
+        char c = *pos;
+        if (!is_digit(c)) break;
+        value = value * 10 + (c - '0');
+        if (value > 0x7fffffff) throw std::runtime_error("Cabecera Netpbm invalida: valor demasiado grande");
+        ++pos;
+    }
+    return static_cast<unsigned>(value);
+}
+
+// Resto de la linea actual sin el salto ni los espacios de los extremos
+std::string Scanner::read_header_line() {
+    std::string line;
+    while (true) {
+        if (pos == end && !refill()) break;
+        char c = *pos++;
+        if (c == '\n') break;
+        line += c;
+    }
+    size_t first = 0, last = line.size();
+    while (first < last && is_space(line[first])) ++first;
+    while (last > first && is_space(line[last - 1])) --last;
+    return line.substr(first, last - first);
+}
+
+// Cabecera PAM: un campo por linea en cualquier orden, terminada por ENDHDR y su salto
+// de linea, tras el que empieza el raster
+void Scanner::read_pam_header(Header& header) {
+    header.width = header.height = header.depth = header.max_val = 0;
+    while (true) {
+        skip_header_space();
+        std::string key;
+        while (true) {
+            if (pos == end && !refill()) throw std::runtime_error("Cabecera PAM incompleta: falta ENDHDR");
+            if (is_space(*pos)) break;
+            key += *pos++;
+        }
+        if (key == "ENDHDR") {
+            read_header_line();
+            break;
+        }
+        if (key == "WIDTH") header.width = static_cast<int>(read_header_uint());
+        else if (key == "HEIGHT") header.height = static_cast<int>(read_header_uint());
+        else if (key == "DEPTH") header.depth = static_cast<int>(read_header_uint());
+        else if (key == "MAXVAL") header.max_val = static_cast<int>(read_header_uint());
+        else if (key == "TUPLTYPE") header.tuple_type += (header.tuple_type.empty() ? "" : " ") + read_header_line();
+        else throw std::runtime_error("Campo de cabecera PAM desconocido: " + key);
+    }
+    if (header.width <= 0 || header.height <= 0 || header.depth <= 0)
+        throw std::runtime_error("Dimensiones invalidas en la cabecera");
+    if (header.max_val < 1 || header.max_val > 65535)
+        throw std::runtime_error("maxval fuera de rango: " + std::to_string(header.max_val));
+    header.data_offset = consumed();
+}
+
+Header Scanner::read_header() {
+    Header header;
+    char magic[2];
+    for (char& c : magic) {
+        if (pos == end && !refill()) throw std::runtime_error("Archivo vacio o cabecera incompleta");
+        c = *pos++;
+    }
+    header.magic.assign(magic, 2);
+    if (magic[0] != 'P' || magic[1] < '1' || magic[1] > '7')
+        throw std::runtime_error("Formato Netpbm no soportado: " + header.magic);
+    if (magic[1] == '7') {
+        read_pam_header(header);
+        return header;
+    }
+    header.depth = magic[1] == '3' || magic[1] == '6' ? 3 : 1;
+
+    header.width = static_cast<int>(read_header_uint());
+    header.height = static_cast<int>(read_header_uint());
+    if (magic[1] != '1' && magic[1] != '4') {
+        header.max_val = static_cast<int>(read_header_uint());
+        if (header.max_val < 1 || header.max_val > 65535)
+            throw std::runtime_error("maxval fuera de rango: " + std::to_string(header.max_val));
+    }
+    if (header.width <= 0 || header.height <= 0)
+        throw std::runtime_error("Dimensiones invalidas en la cabecera");
+
+    // Un unico caracter de espacio separa la cabecera del raster; si antes hay un
+    // comentario, el salto de linea que lo termina hace de separador
+    if (pos == end && !refill()) throw std::runtime_error("Archivo truncado: falta el raster");
+    if (*pos == '#') {
+        while (true) {
+            if (pos == end && !refill()) throw std::runtime_error("Archivo truncado: falta el raster");
+            char c = *pos++;
+            if (c == '\n' || c == '\r') break;
+        }
+    } else if (is_space(*pos)) {
+        ++pos;
+    } else {
+        throw std::runtime_error("Cabecera Netpbm invalida");
+    }
+
+    header.data_offset = consumed();
+    return header;
+}
+
+// Los errores se construyen fuera de los bucles de lectura para no estorbar al optimizador
+[[noreturn]] static void invalid_char(char c) {
+    throw std::runtime_error(std::string("Caracter invalido en el raster: '") + c + "'");
+}
+
+[[noreturn]] static void out_of_range(unsigned max_val) {
+    throw std::runtime_error("Muestra fuera de rango (maxval " + std::to_string(max_val) + ")");
+}
+
+// Valor del numero que termina en q (q apunta a su ultimo digito), recorriendolo
+// desde su inicio
+static unsigned value_ending_at(const char* q, unsigned max_val) {
+    const char* s = q;
+    while (is_digit(s[-1])) --s;
+    unsigned value = 0;
+    for (; s <= q; ++s) {
+        value = value * 10 + (*s - '0');
+        if (value > 65535) out_of_range(max_val);
+    }
+    return value;
+}
+
+#ifdef NETPBM_SSE2
+static inline int lowest_bit(uint64_t m) {
+#ifdef _MSC_VER
+    unsigned long i;
+    _BitScanForward64(&i, m);
+    return static_cast<int>(i);
+#else
+    return __builtin_ctzll(m);
+#endif
+}
+
+static inline __m128i digit_lanes(__m128i v) {
+    const __m128i bias = _mm_set1_epi8(static_cast<char>('0' + 128));
+    const __m128i ten = _mm_set1_epi8(static_cast<char>(-128 + 10));
+    return _mm_cmplt_epi8(_mm_sub_epi8(v, bias), ten);
+}
+
+// Mascaras de digitos y de espacios de 64 bytes (bit i = byte i)
+static inline void classify64(const char* p, uint64_t& digits, uint64_t& spaces) {
+    const __m128i five = _mm_set1_epi8(static_cast<char>(-128 + 5));
+    const __m128i tab = _mm_set1_epi8(static_cast<char>('\t' + 128));
+    const __m128i blank = _mm_set1_epi8(' ');
+    digits = spaces = 0;
+    for (int k = 0; k < 4; ++k) {
+        __m128i v = _mm_loadu_si128(reinterpret_cast<const __m128i*>(p + 16 * k));
+        __m128i s = _mm_or_si128(_mm_cmplt_epi8(_mm_sub_epi8(v, tab), five), _mm_cmpeq_epi8(v, blank));
+        digits |= static_cast<uint64_t>(static_cast<uint16_t>(_mm_movemask_epi8(digit_lanes(v)))) << (16 * k);
+        spaces |= static_cast<uint64_t>(static_cast<uint16_t>(_mm_movemask_epi8(s))) << (16 * k);
+    }
+}
+
+// Para cada posicion i del bloque, el valor del numero de hasta 3 digitos que
+// terminaria en i: c[i] + 10 * c[i-1] + 100 * c[i-2], anulando los que no son digitos
+static inline void short_values64(const char* q, uint16_t* out) {
+    const __m128i zero = _mm_setzero_si128();
+    const __m128i ascii_zero = _mm_set1_epi8('0');
+    const __m128i ten = _mm_set1_epi16(10);
+    const __m128i hundred = _mm_set1_epi16(100);
+    for (int k = 0; k < 4; ++k) {
+        const char* r = q + 16 * k;
+        __m128i a0 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(r));
+        __m128i a1 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(r - 1));
+        __m128i a2 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(r - 2));
+        __m128i d1 = digit_lanes(a1);
+        __m128i d2 = _mm_and_si128(d1, digit_lanes(a2));
+        __m128i c0 = _mm_sub_epi8(a0, ascii_zero);
+        __m128i c1 = _mm_and_si128(_mm_sub_epi8(a1, ascii_zero), d1);
+        __m128i c2 = _mm_and_si128(_mm_sub_epi8(a2, ascii_zero), d2);
+        __m128i lo = _mm_add_epi16(_mm_unpacklo_epi8(c0, zero),
+                     _mm_add_epi16(_mm_mullo_epi16(_mm_unpacklo_epi8(c1, zero), ten),
+                                   _mm_mullo_epi16(_mm_unpacklo_epi8(c2, zero), hundred)));
+        __m128i hi = _mm_add_epi16(_mm_unpackhi_epi8(c0, zero),
+                     _mm_add_epi16(_mm_mullo_epi16(_mm_unpackhi_epi8(c1, zero), ten),
+                                   _mm_mullo_epi16(_mm_unpackhi_epi8(c2, zero), hundred)));
+        _mm_storeu_si128(reinterpret_cast<__m128i*>(out + 16 * k), lo);
+        _mm_storeu_si128(reinterpret_cast<__m128i*>(out + 16 * k + 8), hi);
+    }
+}
+#endif
+
+// Camino rapido: clasifica bloques de 64 bytes con SSE2, calcula en paralelo el valor de
+// los numeros cortos y recorre sus finales con la mascara de bits, sin que cada lectura
+// dependa de la anterior. Solo avanza por bloques limpios (digitos y espacios) que esten
+// enteros en el buffer; devuelve cuantas muestras escribio y deja p al inicio del primer
+// numero que no proceso.
+template <typename T>
+size_t Scanner::read_samples_fast(const char*& p, T* dst, size_t count, unsigned max_val) {
+    size_t done = 0;
+#ifdef NETPBM_SSE2
+    // Se entra siempre sobre un espacio: ningun numero empieza antes de p
+    if (!is_space(*p)) return 0;
+    const char* q = p;
+    uint64_t digits, spaces, next_digits, next_spaces, prev_digits = 0;
+    uint16_t values[64];
+    classify64(q, digits, spaces);
+    while (end - q >= 128 && count - done >= 32) {
+        if (~(digits | spaces)) break;
+        classify64(q + 64, next_digits, next_spaces);
+        uint64_t ends = digits & ~((digits >> 1) | (next_digits << 63));
+
+        // Posiciones que son el 4o digito (o mas) de un numero, contando el bloque anterior
+        uint64_t long_runs = digits & ((digits << 1) | (prev_digits >> 63))
+                                    & ((digits << 2) | (prev_digits >> 62))
+                                    & ((digits << 3) | (prev_digits >> 61));
+        unsigned max_seen = 0;
+        if (long_runs == 0) {
+            short_values64(q, values);
+            while (ends) {
+                unsigned value = values[lowest_bit(ends)];
+                max_seen = std::max(max_seen, value);
+                dst[done++] = static_cast<T>(value);
+                ends &= ends - 1;
+            }
+        } else {
+            while (ends) {
+                unsigned value = value_ending_at(q + lowest_bit(ends), max_val);
+                max_seen = std::max(max_seen, value);
+                dst[done++] = static_cast<T>(value);
+                ends &= ends - 1;
+            }
+        }
+        if (max_seen > max_val) out_of_range(max_val);
+
+        q += 64;
+        prev_digits = digits;
+        digits = next_digits;
+        spaces = next_spaces;
+    }
+    // Si un numero cruza el ultimo limite de bloque se retrocede a su inicio
+    while (is_digit(*q) && q > p && is_digit(q[-1])) --q;
+    p = q;
+#endif
+    return done;
+}
+
+void Scanner::read_samples(unsigned char* dst, size_t count, unsigned max_val) {
+    read_samples_impl(dst, count, max_val);
+}
+
+void Scanner::read_samples(uint16_t* dst, size_t count, unsigned max_val) {
+    read_samples_impl(dst, count, max_val);
+}
+
+template <typename T>
+void Scanner::read_samples_impl(T* dst, size_t count, unsigned max_val) {
+    const char* p = pos;
+    const char* stop = end;
+    size_t i = 0;
+    while (i < count) {
+        if (stop - p >= 128) {
+            i += read_samples_fast(p, dst + i, count - i, max_val);
+            if (i == count) break;
+        }
+
+        // Camino escalar: un numero cada vez, recargando el buffer cuando hace falta
+        while (true) {
+            while (is_space(*p)) ++p;
+            if (p != stop) break;
+            pos = p;
+            if (!refill()) throw std::runtime_error("Archivo truncado: faltan muestras");
+            p = pos;
+            stop = end;
+        }
+        if (!is_digit(*p)) invalid_char(*p);
+
+        // Los 3 primeros digitos se leen sin saltos: el centinela corta la cadena de
+        // digitos, asi que mirar mas alla de el nunca cambia el resultado
+        unsigned d1 = is_digit(p[1]);
+        unsigned d2 = d1 & is_digit(p[2]);
+        unsigned v1 = p[0] - '0';
+        unsigned v2 = v1 * 10 + (p[1] - '0');
+        unsigned v3 = v2 * 10 + (p[2] - '0');
+        unsigned m1 = 0u - d1, m2 = 0u - d2;
+        unsigned value = (v1 & ~m1) | (v2 & m1);
+        value = (value & ~m2) | (v3 & m2);
+        p += 1 + d1 + d2;
+        while (true) {
+            while (is_digit(*p)) {
+                value = value * 10 + (*p++ - '0');
+                if (value > 65535) out_of_range(max_val);
+            }
+            // El numero puede continuar en el siguiente bloque
+            if (p != stop) break;
+            pos = p;
+            bool more = refill();
+            p = pos;
+            stop = end;
+            if (!more) break;
+        }
+        if (value > max_val) out_of_range(max_val);
+        dst[i++] = static_cast<T>(value);
+    }
+    pos = p;
+}
+
+void Scanner::read_bits(unsigned char* dst, size_t count) {
+    const char* p = pos;
+    const char* stop = end;
+    for (size_t i = 0; i < count; ++i) {
+        while (true) {
+            while (is_space(*p)) ++p;
+            if (p != stop) break;
+            pos = p;
+            if (!refill()) throw std::runtime_error("Archivo truncado: faltan pixeles");
+            p = pos;
+            stop = end;
+        }
+        char c = *p++;
+        if (c != '0' && c != '1') throw std::runtime_error(std::string("Pixel PBM invalido: '") + c + "'");
+        dst[i] = static_cast<unsigned char>(c - '0');
+    }
+    pos = p;
+}
+
+void Scanner::read_bytes(char* dst, size_t n) {
+    size_t buffered = std::min(n, static_cast<size_t>(end - pos));
+    std::memcpy(dst, pos, buffered);
+    pos += buffered;
+    dst += buffered;
+    n -= buffered;
+
+    // El resto se lee directamente al destino, sin pasar por el buffer
+    while (n > 0) {
+        size_t got = read_fn(dst, n);
+        if (got == 0) throw std::runtime_error("Archivo truncado: faltan datos del raster");
+        consumed_before += got;
+        dst += got;
+        n -= got;
+    }
+}
+
+// Tabla de las cadenas decimales de 0..255: 3 caracteres y la longitud en el cuarto byte
+struct DecimalTable {
+    char entries[256][4];
+    DecimalTable() {
+        for (int v = 0; v < 256; ++v) {
+            std::string text = std::to_string(v);
+            std::memset(entries[v], ' ', 3);
+            std::memcpy(entries[v], text.data(), text.size());
+            entries[v][3] = static_cast<char>(text.size());
+        }
+    }
+};
+
+static const DecimalTable decimal_table;
+
+AsciiWriter::AsciiWriter(WriteFn fn, size_t buffer_size)
+    : write_fn(std::move(fn)), buffer(std::max(buffer_size, 2 * max_line)) {}
+
+void AsciiWriter::flush() {
+    if (used > 0) write_fn(buffer.data(), used);
+    used = 0;
+}
+
+// Longitud decimal de una muestra y su escritura: las de 8 bits salen de la tabla (se
+// copian los 4 bytes de la entrada), las de 16 bits se escriben digito a digito
+static inline size_t sample_length(unsigned char v) {
+    return static_cast<unsigned char>(decimal_table.entries[v][3]);
+}
+
+static inline void write_sample(unsigned char v, char* out, size_t) {
+    std::memcpy(out, decimal_table.entries[v], 4);
+}
+
+static inline size_t sample_length(uint16_t v) {
+    return v < 10 ? 1 : v < 100 ? 2 : v < 1000 ? 3 : v < 10000 ? 4 : 5;
+}
+
+static inline void write_sample(uint16_t v, char* out, size_t len) {
+    unsigned rest = v;
+    for (size_t k = len; k-- > 0; rest /= 10) out[k] = static_cast<char>('0' + rest % 10);
+}
+
+void AsciiWriter::write_samples(const unsigned char* src, size_t count, size_t per_row) {
+    write_samples_impl(src, count, per_row);
+}
+
+void AsciiWriter::write_samples(const uint16_t* src, size_t count, size_t per_row) {
+    write_samples_impl(src, count, per_row);
+}
+
+template <typename T>
+void AsciiWriter::write_samples_impl(const T* src, size_t count, size_t per_row) {
+    // Cada muestra ocupa como mucho 4 bytes (3 digitos y un separador), 6 si es de 16
+    // bits; se vacia el buffer antes de cada fila o tramo que pudiera no caber
+    const size_t max_len = sizeof(T) == 1 ? 4 : 6;
+    const size_t chunk = (buffer.size() - 8) / max_len;
+    char* out = buffer.data() + used;
+    size_t line = 0;
+    for (size_t i = 0; i < count; i += per_row) {
+        size_t row_end = std::min(count, i + per_row);
+        size_t j = i;
+        while (j < row_end) {
+            size_t stop = std::min(row_end, j + chunk);
+            if (static_cast<size_t>(buffer.data() + buffer.size() - out) < max_len * (stop - j) + 8) {
+                used = out - buffer.data();
+                flush();
+                out = buffer.data();
+            }
+            for (; j < stop; ++j) {
+                size_t len = sample_length(src[j]);
+                if (line > 0) {
+                    // Separador: espacio, o salto de linea si el numero no cabe en esta
+                    bool wrap = line + 1 + len > max_line;
+                    *out++ = wrap ? '\n' : ' ';
+                    line = wrap ? 0 : line + 1;
+                }
+                write_sample(src[j], out, len);
+                out += len;
+                line += len;
+            }
+        }
+        *out++ = '\n';
+        line = 0;
+    }
+    used = out - buffer.data();
+}
+
+void AsciiWriter::write_bits(const unsigned char* src, size_t count, size_t per_row) {
+    // "0 1 0 ...": 35 pixeles por linea de 69 caracteres
+    const size_t per_line = (max_line + 1) / 2;
+    char* out = buffer.data() + used;
+    for (size_t i = 0; i < count; i += per_row) {
+        size_t row_end = std::min(count, i + per_row);
+        for (size_t j = i; j < row_end; j += per_line) {
+            size_t stop = std::min(row_end, j + per_line);
+            if (static_cast<size_t>(buffer.data() + buffer.size() - out) < 2 * per_line + 1) {
+                used = out - buffer.data();
+                flush();
+                out = buffer.data();
+            }
+            for (size_t k = j; k < stop; ++k) {
+                out[0] = src[k] < 128 ? '1' : '0';
+                out[1] = ' ';
+                out += 2;
+            }
+            out[-1] = '\n';
+        }
+    }
+    used = out - buffer.data();
+}
+
+void swap_be16(uint16_t* samples, size_t n) {
+    const uint16_t probe = 1;
+    unsigned char first;
+    std::memcpy(&first, &probe, 1);
+    if (first == 0) return;  // host big-endian
+    for (size_t i = 0; i < n; ++i) samples[i] = static_cast<uint16_t>((samples[i] >> 8) | (samples[i] << 8));
+}
+
+void unpack_pbm_row(const unsigned char* src, unsigned char* dst, int width) {
+    for (int c = 0; c < width; ++c)
+        dst[c] = ((src[c / 8] >> (7 - c % 8)) & 1) ? 0 : 255;
+}
+
+// Ocho pixeles por byte de salida, sin ramas
+void pack_pbm_row(const unsigned char* src, unsigned char* dst, int width) {
+    int full = width / 8, rest = width % 8;
+    for (int b = 0; b < full; ++b) {
+        const unsigned char* s = src + 8 * b;
+        unsigned v = 0;
+        for (int k = 0; k < 8; ++k) v = (v << 1) | (s[k] < 128);
+        dst[b] = static_cast<unsigned char>(v);
+    }
+    if (rest) {
+        unsigned v = 0;
+        for (int k = 0; k < rest; ++k) v = (v << 1) | (src[8 * full + k] < 128);
+        dst[full] = static_cast<unsigned char>(v << (8 - rest));
+    }
+}
+
+#ifdef _WIN32
+
+MappedFile::MappedFile(const std::string& path, bool writable) {
+    HANDLE file = CreateFileA(path.c_str(), writable ? (GENERIC_READ | GENERIC_WRITE) : GENERIC_READ,
+                              FILE_SHARE_READ | (writable ? 0 : FILE_SHARE_WRITE), nullptr,
+                              OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, nullptr);
+    if (file == INVALID_HANDLE_VALUE) throw std::runtime_error("No se pudo abrir el archivo: " + path);
+
+    LARGE_INTEGER file_size;
+    if (!GetFileSizeEx(file, &file_size) || file_size.QuadPart == 0) {
+        CloseHandle(file);
+        throw std::runtime_error("No se pudo proyectar el archivo (vacio o ilegible): " + path);
+    }
+
+    HANDLE mapping = CreateFileMappingA(file, nullptr, writable ? PAGE_READWRITE : PAGE_READONLY, 0, 0, nullptr);
+    void* view = mapping ? MapViewOfFile(mapping, writable ? FILE_MAP_WRITE : FILE_MAP_READ, 0, 0, 0) : nullptr;
+    if (!view) {
+        if (mapping) CloseHandle(mapping);
+        CloseHandle(file);
+        throw std::runtime_error("No se pudo proyectar el archivo: " + path);
+    }
+
+    file_handle = file;
+    mapping_handle = mapping;
+    bytes = static_cast<unsigned char*>(view);
+    length = static_cast<size_t>(file_size.QuadPart);
+}
+
+MappedFile::~MappedFile() {
+    UnmapViewOfFile(bytes);
+    CloseHandle(mapping_handle);
+    CloseHandle(file_handle);
+}
+
+#else
+
+MappedFile::MappedFile(const std::string& path, bool writable) {
+    int fd = ::open(path.c_str(), writable ? O_RDWR : O_RDONLY);
+    if (fd < 0) throw std::runtime_error("No se pudo abrir el archivo: " + path);
+
+    struct stat info;
+    if (fstat(fd, &info) != 0 || info.st_size == 0) {
+        ::close(fd);
+        throw std::runtime_error("No se pudo proyectar el archivo (vacio o ilegible): " + path);
+    }
+
+    void* view = mmap(nullptr, static_cast<size_t>(info.st_size),
+                      writable ? (PROT_READ | PROT_WRITE) : PROT_READ, MAP_SHARED, fd, 0);
+    // La proyeccion sigue siendo valida despues de cerrar el descriptor
+    ::close(fd);
+    if (view == MAP_FAILED) throw std::runtime_error("No se pudo proyectar el archivo: " + path);
+
+    bytes = static_cast<unsigned char*>(view);
+    length = static_cast<size_t>(info.st_size);
+}
+
+MappedFile::~MappedFile() {
+    munmap(bytes, length);
+}
+
+#endif
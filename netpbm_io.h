@@ -0,0 +1,122 @@
+#ifndef NETPBM_IO_H
+#define NETPBM_IO_H
+
+#include <cstddef>
+#include <cstdint>
+#include <functional>
+#include <string>
+#include <vector>
+
+// Cabecera de un archivo Netpbm. data_offset es la posicion del primer byte del raster.
+// depth es el numero de canales (1 o 3 en P1-P6); tuple_type solo lo trae P7 (PAM).
+struct Header {
+    std::string magic;
+    int width = 0, height = 0, max_val = 1, depth = 1;
+    std::string tuple_type;
+    size_t data_offset = 0;
+};
+
+// Lector con buffer propio para cabeceras y rasters Netpbm. Lee bloques grandes a traves
+// de read_fn (archivo, pipe, memoria...) y tokeniza los enteros ASCII a mano, sin
+// iostreams ni locale.
+class Scanner {
+public:
+    // read_fn(dst, n) copia hasta n bytes en dst y devuelve cuantos copio (0 = fin)
+    using ReadFn = std::function<size_t(char*, size_t)>;
+
+    explicit Scanner(ReadFn read_fn, size_t buffer_size = 1 << 20);
+
+    // Lee magic, ancho, alto y maxval, con comentarios '#' en cualquier punto de la
+    // cabecera, y consume el espacio en blanco que la separa del raster. En P7 lee los
+    // campos WIDTH, HEIGHT, DEPTH, MAXVAL y TUPLTYPE hasta ENDHDR.
+    Header read_header();
+
+    // count muestras ASCII (P2/P3) en dst; falla si alguna supera max_val
+    void read_samples(unsigned char* dst, size_t count, unsigned max_val);
+    void read_samples(uint16_t* dst, size_t count, unsigned max_val);
+    // count pixeles de un P1 (0 o 1) en dst: un caracter por pixel, con o sin separadores
+    void read_bits(unsigned char* dst, size_t count);
+    // Copia n bytes del raster binario; falla si el archivo termina antes
+    void read_bytes(char* dst, size_t n);
+    // Devuelve true si no queda nada por leer
+    bool at_end();
+    // Salta el espacio en blanco que puede separar dos imagenes de un mismo flujo;
+    // devuelve false si despues no hay otra
+    bool next_image();
+
+    // Bytes consumidos desde el inicio del flujo
+    size_t consumed() const { return consumed_before + (pos - base); }
+
+private:
+    ReadFn read_fn;
+    std::vector<char> buffer;
+    char* base;  // inicio de los datos dentro de buffer, tras el relleno inicial
+    const char* pos;
+    const char* end;
+    size_t consumed_before = 0;
+
+    bool refill();
+    template <typename T> void read_samples_impl(T* dst, size_t count, unsigned max_val);
+    template <typename T> size_t read_samples_fast(const char*& p, T* dst, size_t count, unsigned max_val);
+    void skip_header_space();
+    unsigned read_header_uint();
+    std::string read_header_line();
+    void read_pam_header(Header& header);
+};
+
+// Escritor de rasters ASCII (P1/P2/P3). Formatea en un buffer grande con una tabla de
+// las 256 cadenas decimales y lo vuelca por bloques con write_fn. Cada fila del raster
+// empieza en una linea nueva y ninguna linea pasa de 70 caracteres.
+class AsciiWriter {
+public:
+    using WriteFn = std::function<void(const char*, size_t)>;
+
+    explicit AsciiWriter(WriteFn write_fn, size_t buffer_size = 1 << 20);
+
+    // count muestras de 8 o 16 bits, per_row por fila del raster
+    void write_samples(const unsigned char* src, size_t count, size_t per_row);
+    void write_samples(const uint16_t* src, size_t count, size_t per_row);
+    // count pixeles PBM en escala 0..255: '1' (negro) si el valor es < 128, si no '0'
+    void write_bits(const unsigned char* src, size_t count, size_t per_row);
+    // Vuelca lo que quede en el buffer
+    void flush();
+
+    static const size_t max_line = 70;
+
+private:
+    WriteFn write_fn;
+    std::vector<char> buffer;
+    size_t used = 0;
+
+    template <typename T> void write_samples_impl(const T* src, size_t count, size_t per_row);
+};
+
+// Convierte n muestras de 16 bits entre big-endian (el orden de P5/P6) y el orden
+// nativo, en el sitio; la conversion es la misma en los dos sentidos
+void swap_be16(uint16_t* samples, size_t n);
+
+// Fila de un P4 (bits MSB primero, 1=negro, relleno hasta el byte) <-> pixeles 0/255
+void unpack_pbm_row(const unsigned char* src, unsigned char* dst, int width);
+void pack_pbm_row(const unsigned char* src, unsigned char* dst, int width);
+
+// Archivo proyectado en memoria completo (mmap en POSIX, MapViewOfFile en Windows)
+class MappedFile {
+public:
+    MappedFile(const std::string& path, bool writable);
+    ~MappedFile();
+    MappedFile(const MappedFile&) = delete;
+    MappedFile& operator=(const MappedFile&) = delete;
+
+    unsigned char* data() const { return bytes; }
+    size_t size() const { return length; }
+
+private:
+    unsigned char* bytes = nullptr;
+    size_t length = 0;
+#ifdef _WIN32
+    void* file_handle = nullptr;
+    void* mapping_handle = nullptr;
+#endif
+};
+
+#endif // NETPBM_IO_H
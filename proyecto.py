@@ -1,17 +1,18 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import netpbm_cpp as netpbm
 import os
-import time
+from roundtrip import report_roundtrip
 
 
 def visualize_image(image_obj, title, ax=None):
+    import matplotlib.pyplot as plt
 
     show_plot = (ax is None)
     if show_plot:
         fig, ax = plt.subplots(figsize=(6, 6))
 
  
+    image_obj = image_obj.thumbnail(1024)
     img_data = np.array(image_obj, copy=False)
 
 
@@ -36,7 +37,7 @@ def visualize_image(image_obj, title, ax=None):
 def create_test_shapes(width, height):
  
     print("1. Generando una imagen de 300x300 con formas...")
-    img = netpbm.Image(width, height, 'ppm')
+    scene = netpbm.DisplayList(width, height, 'ppm')
 
     # Definir colores
     rojo = netpbm.Color(255, 0, 0)
@@ -46,18 +47,17 @@ def create_test_shapes(width, height):
     magenta = netpbm.Color(255, 0, 255)
 
     # Dibujar formas
-    img.draw_line(10, 10, 290, 10, rojo)
-    img.draw_rectangle(20, 30, 120, 100, azul, fill=False)
-    img.draw_rectangle(150, 120, 280, 280, verde, fill=True)
-    img.draw_circle(150, 150, 80, amarillo, fill=False)
-    img.draw_circle(70, 220, 40, magenta, fill=True)
+    scene.draw_line(10, 10, 290, 10, rojo)
+    scene.draw_rectangle(20, 30, 120, 100, azul, fill=False)
+    scene.draw_rectangle(150, 120, 280, 280, verde, fill=True)
+    scene.draw_circle(150, 150, 80, amarillo, fill=False)
+    scene.draw_circle(70, 220, 40, magenta, fill=True)
 
     print("Imagen con formas generada exitosamente.")
-    return img
+    return scene.render()
 
 
 def save_and_verify(image_obj):
-  
     print("\n2. Guardando la imagen en formatos P6 (binario) y P3 (ASCII)...")
     ruta_binaria = 'generada_binaria.ppm'
     ruta_ascii = 'generada_ascii.ppm'
@@ -69,7 +69,6 @@ def save_and_verify(image_obj):
     print(f"   Guardado en '{ruta_ascii}'")
 
     print("\n3. Cargando imágenes desde el disco para verificación...")
-    time.sleep(1)
 
     try:
         img_cargada_bin = netpbm.Image(ruta_binaria)
@@ -80,7 +79,10 @@ def save_and_verify(image_obj):
         print(f"Error fatal al cargar las imágenes: {e}")
         return
 
-   
+    if report_roundtrip(image_obj, ((ruta_binaria, img_cargada_bin), (ruta_ascii, img_cargada_ascii)), sangria="   "):
+        return
+
+    import matplotlib.pyplot as plt
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
     fig.suptitle("Verificación de Guardado y Carga", fontsize=16)
 
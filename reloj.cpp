@@ -1,56 +1,64 @@
-#include <opencv2/opencv.hpp>
+// Temporizador de 30 s a 30 fps. Los frames salen como un flujo de P6 por la salida
+// estandar, o al archivo que se pase como argumento, listo para un codificador:
+//
+//   g++ -O2 -std=c++17 reloj.cpp frames.cpp netpbm.cpp netpbm_io.cpp stats.cpp -o reloj -pthread
+//   ./reloj | ffmpeg -f image2pipe -c:v ppm -framerate 30 -i - reloj_timer.mp4
+#include "frames.h"
 #include <iostream>
-#include <iomanip>
-#include <sstream>
+#include <memory>
 
-int main() {
-    const std::string filename = "reloj_timer.avi";
-    const int fps = 30;                    
-    const int duration_seconds = 30;        
-    const int total_frames = fps * duration_seconds; 
-    const cv::Size frame_size(640, 480);
-    const bool isColor = true;
+// Segmentos encendidos de cada digito, bits a-g
+static const unsigned char segments[10] = {0x3F, 0x06, 0x5B, 0x4F, 0x66, 0x6D, 0x7D, 0x07, 0x7F, 0x6F};
 
-    int fourcc = cv::VideoWriter::fourcc('X', 'V', 'I', 'D');
-    cv::VideoWriter writer(filename, fourcc, fps, frame_size, isColor);
-
-    if (!writer.isOpened()) {
-        std::cerr << "no se pudo abrir el archivo";
-        return -1;
-    }
-
-    int font = cv::FONT_HERSHEY_SIMPLEX;
-    const std::string windowName = "temporizador";
-    cv::namedWindow(windowName, cv::WINDOW_AUTOSIZE);
-
-    for (int frame_idx = 0; frame_idx < total_frames; ++frame_idx) {
-        
-        int seconds = frame_idx / fps;
-        int milliseconds = ((frame_idx % fps) * 30) / fps;  
-        cv::Mat frame(frame_size, CV_8UC3, cv::Scalar(0, 0, 0));
-
-        std::ostringstream text;
-        text << seconds << " s " 
-             << std::setw(2) << std::setfill('0') << milliseconds;
+static void draw_digit(Image& frame, int digit, int x, int y, int w, int h, int t, const Color& color) {
+    unsigned char s = segments[digit];
+    int mid = y + h / 2;
+    if (s & 0x01) frame.draw_rectangle(x, y, x + w, y + t, color, true);                  // a
+    if (s & 0x02) frame.draw_rectangle(x + w - t, y, x + w, mid, color, true);            // b
+    if (s & 0x04) frame.draw_rectangle(x + w - t, mid, x + w, y + h, color, true);        // c
+    if (s & 0x08) frame.draw_rectangle(x, y + h - t, x + w, y + h, color, true);          // d
+    if (s & 0x10) frame.draw_rectangle(x, mid, x + t, y + h, color, true);                // e
+    if (s & 0x20) frame.draw_rectangle(x, y, x + t, mid, color, true);                    // f
+    if (s & 0x40) frame.draw_rectangle(x, mid - t / 2, x + w, mid + t / 2, color, true);  // g
+}
 
-        int baseline = 0;
-        cv::Size text_size = cv::getTextSize(text.str(), font, 2.5, 3, &baseline);
-        cv::Point text_org((frame.cols - text_size.width) / 2, (frame.rows + text_size.height) / 2);
+int main(int argc, char** argv) {
+    const int fps = 30;
+    const int duration_seconds = 30;
+    const int total_frames = fps * duration_seconds;
+    const int width = 640, height = 480;
 
-        cv::putText(frame, text.str(), text_org, font, 2.5, cv::Scalar(255, 255, 255), 5);
+    try {
+        std::unique_ptr<FrameWriter> writer(argc > 1 ? new FrameWriter(argv[1]) : new FrameWriter(1));
+        Image frame(width, height, "ppm");
+        const Color black{0, 0, 0}, white{255, 255, 255};
 
-        cv::imshow(windowName, frame);
+        // Cuatro digitos "SS.CC" centrados
+        const int digit_w = 80, digit_h = 160, stroke = 16, gap = 30, dot = 20;
+        const int total_w = 4 * digit_w + 3 * gap + dot + gap;
+        const int x0 = (width - total_w) / 2, y0 = (height - digit_h) / 2;
 
-        writer.write(frame);
+        for (int frame_idx = 0; frame_idx < total_frames; ++frame_idx) {
+            int seconds = frame_idx / fps;
+            int milliseconds = ((frame_idx % fps) * 30) / fps;
+            int digits[4] = {seconds / 10 % 10, seconds % 10, milliseconds / 10 % 10, milliseconds % 10};
 
-        int key = cv::waitKey(1000 / fps);
-        if (key == 27) {  
-            break;
+            frame.draw_rectangle(0, 0, width - 1, height - 1, black, true);
+            int x = x0;
+            for (int k = 0; k < 4; ++k) {
+                draw_digit(frame, digits[k], x, y0, digit_w, digit_h, stroke, white);
+                x += digit_w + gap;
+                if (k == 1) {
+                    frame.draw_rectangle(x, y0 + digit_h - dot, x + dot, y0 + digit_h, white, true);
+                    x += dot + gap;
+                }
+            }
+            writer->write(frame);
         }
+        writer->close();
+    } catch (const std::exception& e) {
+        std::cerr << e.what() << "\n";
+        return 1;
     }
-
-    writer.release();
-    cv::destroyAllWindows();
-
     return 0;
 }
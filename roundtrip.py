@@ -0,0 +1,22 @@
+"""Comprobacion del ida y vuelta a disco comun a las escenas."""
+
+
+def report_roundtrip(original, cargadas, sangria=""):
+    """Compara cada (ruta, imagen cargada) con la original y devuelve True si todas son identicas.
+
+    El ida y vuelta se comprueba en nativo contra la imagen original (equals y checksum);
+    solo si algun archivo no coincide se calculan diff y PSNR, y quien llama decide si
+    muestra la figura.
+    """
+    identicas = True
+    for ruta, cargada in cargadas:
+        if cargada.equals(original):
+            print(f"{sangria}'{ruta}' idéntica a la original (checksum {cargada.checksum():016x})")
+            continue
+        identicas = False
+        try:
+            distintos, caja = original.diff(cargada)
+            print(f"{sangria}'{ruta}' difiere en {distintos} píxeles dentro de {caja}, PSNR {original.psnr(cargada):.2f} dB")
+        except RuntimeError as e:
+            print(f"{sangria}'{ruta}' no es comparable con la original: {e}")
+    return identicas
@@ -0,0 +1,130 @@
+"""Render por lotes de las escenas, sin ventanas, pausas ni verificacion.
+
+    python -m scenes render sunset cielo --size 3840x2160 --format p6 --out dir/ --jobs 8
+    python -m scenes render all --seeds 0-99 --jobs 8
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cielo
+import marine
+import proyecto
+import sunset
+
+
+# nombre -> (funcion que crea la escena, tamaño por defecto)
+SCENES = {
+    "proyecto": (proyecto.create_test_shapes, (300, 300)),
+    "sunset": (sunset.create_artistic_scene, (400, 300)),
+    "cielo": (cielo.create_night_sky_scene, (500, 350)),
+    "marine": (marine.create_underwater_scene, (400, 300)),
+}
+
+
+def parse_size(text):
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Tamaño inválido '{text}', use ANCHOxALTO")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"Tamaño inválido '{text}'")
+    return width, height
+
+
+def parse_seeds(text):
+    """'5', '0-7' o '1,4,9-12' -> lista de semillas."""
+    seeds = []
+    try:
+        for part in text.split(","):
+            if "-" in part:
+                first, last = (int(v) for v in part.split("-"))
+                seeds.extend(range(first, last + 1))
+            else:
+                seeds.append(int(part))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Semillas inválidas '{text}'")
+    return seeds
+
+
+def render_job(job):
+    """Genera y guarda una escena; se ejecuta en un proceso del pool."""
+    name, seed, size, binary, path = job
+    create, default_size = SCENES[name]
+    width, height = size or default_size
+    if seed is not None:
+        random.seed(seed)
+
+    # Los mensajes de las escenas son para el menu interactivo
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        img = create(width, height)
+        rendered = time.perf_counter()
+        img.save(path, binary=binary)
+        saved = time.perf_counter()
+    return {"scene": name, "seed": seed, "path": path,
+            "render_s": rendered - start, "save_s": saved - rendered}
+
+
+def render(args):
+    names = list(SCENES) if "all" in args.scenes else args.scenes
+    binary = args.format == "p6"
+    os.makedirs(args.out, exist_ok=True)
+
+    jobs = []
+    for name in names:
+        for seed in (args.seeds or [None]):
+            filename = f"{name}.ppm" if seed is None else f"{name}_{seed}.ppm"
+            jobs.append((name, seed, args.size, binary, os.path.join(args.out, filename)))
+
+    def report(result):
+        seed = "" if result["seed"] is None else f" semilla={result['seed']}"
+        print(f"{result['scene']:<10}{seed:<14} render {result['render_s'] * 1000:8.1f} ms"
+              f"  guardado {result['save_s'] * 1000:8.1f} ms  -> {result['path']}")
+
+    failures = 0
+    start = time.perf_counter()
+    if args.jobs == 1:
+        for job in jobs:
+            report(render_job(job))
+    else:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {pool.submit(render_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    report(future.result())
+                except Exception as e:
+                    failures += 1
+                    print(f"Error en {futures[future][0]}: {e}", file=sys.stderr)
+    total = time.perf_counter() - start
+    print(f"{len(jobs) - failures} imágenes en {total:.2f} s")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scenes", description="Generación de escenas sin interfaz")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_cmd = commands.add_parser("render", help="Genera escenas y las guarda en disco")
+    render_cmd.add_argument("scenes", nargs="+", choices=list(SCENES) + ["all"], help="Escenas a generar")
+    render_cmd.add_argument("--size", type=parse_size, default=None,
+                            help="ANCHOxALTO (por defecto el tamaño de cada escena)")
+    render_cmd.add_argument("--format", choices=["p3", "p6"], default="p6", help="P3 (ASCII) o P6 (binario)")
+    render_cmd.add_argument("--out", default=".", help="Carpeta de salida")
+    render_cmd.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Procesos en paralelo")
+    render_cmd.add_argument("--seeds", type=parse_seeds, default=None,
+                            help="Semillas aleatorias, p. ej. '0-7' o '1,4,9'; una imagen por semilla")
+
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs debe ser al menos 1")
+    return render(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@ pybind11_include = pybind11.get_include()
 ext_modules = [
     Extension(
         'netpbm_cpp',
-        ['netpbm.cpp', 'bindings.cpp'],
+        ['netpbm.cpp', 'netpbm_io.cpp', 'strips.cpp', 'stats.cpp', 'displaylist.cpp', 'frames.cpp', 'catalog.cpp', 'workers.cpp', 'bindings.cpp'],
         include_dirs=[pybind11_include], 
         language='c++',
         extra_compile_args=['/std:c++17', '/O2'],
@@ -0,0 +1,131 @@
+#include "stats.h"
+#include <fstream>
+#include <memory>
+#include <mutex>
+#include <sstream>
+#include <stdexcept>
+#include <thread>
+
+namespace stats {
+
+thread_local uint64_t pixels = 0, bytes_read = 0, bytes_written = 0;
+std::atomic<bool> active(false);
+
+static const char* const op_names[] = {
+    "load", "save", "save_incremental", "open_mmap",
+    "convert_depth", "convert", "resize", "convert_many", "checksum", "compare",
+    "draw_line", "draw_rectangle", "draw_circle",
+    "fill_polygon", "draw_polyline", "blit", "flatten",
+    "draw_points", "draw_lines", "draw_rectangles", "draw_circles", "fill_gradient",
+    "strip_read", "strip_write", "frame_read", "frame_write", "probe", "index_directory",
+};
+static_assert(sizeof(op_names) / sizeof(op_names[0]) == static_cast<size_t>(Op::Count),
+              "Falta el nombre de alguna operacion");
+
+struct Counters {
+    std::atomic<uint64_t> calls{0}, pixels{0}, bytes_read{0}, bytes_written{0}, nanoseconds{0};
+};
+
+static Counters counters[static_cast<size_t>(Op::Count)];
+static std::atomic<bool> stats_on(false);
+
+// La traza se copia bajo el mutex y se llama fuera de el
+static std::mutex trace_mutex;
+static std::shared_ptr<TraceFn> trace;
+static std::atomic<bool> trace_on(false);
+
+static void update_active() {
+    std::lock_guard<std::mutex> lock(trace_mutex);
+    trace_on.store(trace != nullptr);
+    active.store(stats_on.load() || trace != nullptr);
+}
+
+const char* op_name(Op op) {
+    return op_names[static_cast<size_t>(op)];
+}
+
+void enable(bool on) {
+    stats_on.store(on);
+    update_active();
+}
+
+bool enabled() {
+    return stats_on.load();
+}
+
+std::vector<Totals> snapshot() {
+    std::vector<Totals> totals(static_cast<size_t>(Op::Count));
+    for (size_t i = 0; i < totals.size(); ++i) {
+        totals[i].calls = counters[i].calls.load();
+        totals[i].pixels = counters[i].pixels.load();
+        totals[i].bytes_read = counters[i].bytes_read.load();
+        totals[i].bytes_written = counters[i].bytes_written.load();
+        totals[i].nanoseconds = counters[i].nanoseconds.load();
+    }
+    return totals;
+}
+
+void reset() {
+    for (Counters& c : counters) {
+        c.calls = 0;
+        c.pixels = 0;
+        c.bytes_read = 0;
+        c.bytes_written = 0;
+        c.nanoseconds = 0;
+    }
+}
+
+void set_trace(TraceFn fn) {
+    {
+        std::lock_guard<std::mutex> lock(trace_mutex);
+        trace = fn ? std::make_shared<TraceFn>(std::move(fn)) : nullptr;
+    }
+    update_active();
+}
+
+void set_trace_file(const std::string& path) {
+    if (path.empty()) {
+        set_trace(nullptr);
+        return;
+    }
+    auto file = std::make_shared<std::ofstream>(path, std::ios::out | std::ios::app);
+    if (!*file) throw std::runtime_error("No se pudo crear el archivo de traza: " + path);
+
+    auto file_mutex = std::make_shared<std::mutex>();
+    set_trace([file, file_mutex](const Event& e) {
+        std::ostringstream line;
+        line << "{\"op\": \"" << op_name(e.op) << "\", \"start_ns\": " << e.start_ns
+             << ", \"duration_ns\": " << e.duration_ns << ", \"pixels\": " << e.pixels
+             << ", \"bytes_read\": " << e.bytes_read << ", \"bytes_written\": " << e.bytes_written
+             << ", \"thread\": " << std::hash<std::thread::id>()(std::this_thread::get_id()) << "}\n";
+        std::lock_guard<std::mutex> lock(*file_mutex);
+        *file << line.str();
+        file->flush();
+    });
+}
+
+uint64_t now_ns() {
+    return static_cast<uint64_t>(std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count());
+}
+
+void record(const Event& event) {
+    if (stats_on.load(std::memory_order_relaxed)) {
+        Counters& c = counters[static_cast<size_t>(event.op)];
+        c.calls.fetch_add(1, std::memory_order_relaxed);
+        c.pixels.fetch_add(event.pixels, std::memory_order_relaxed);
+        c.bytes_read.fetch_add(event.bytes_read, std::memory_order_relaxed);
+        c.bytes_written.fetch_add(event.bytes_written, std::memory_order_relaxed);
+        c.nanoseconds.fetch_add(event.duration_ns, std::memory_order_relaxed);
+    }
+
+    if (!trace_on.load(std::memory_order_relaxed)) return;
+    std::shared_ptr<TraceFn> fn;
+    {
+        std::lock_guard<std::mutex> lock(trace_mutex);
+        fn = trace;
+    }
+    if (fn) (*fn)(event);
+}
+
+} // namespace stats
@@ -0,0 +1,82 @@
+#ifndef STATS_H
+#define STATS_H
+
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <functional>
+#include <string>
+#include <vector>
+
+// Instrumentacion opcional. Con las estadisticas y la traza desactivadas (por defecto)
+// cada operacion solo comprueba un flag atomico; los contadores de pixeles y bytes son
+// sumas en variables locales del hilo.
+namespace stats {
+
+enum class Op {
+    Load, Save, SaveIncremental, OpenMmap,
+    ConvertDepth, Convert, Resize, ConvertMany, Checksum, Compare,
+    DrawLine, DrawRectangle, DrawCircle,
+    FillPolygon, DrawPolyline, Blit, Flatten,
+    DrawPoints, DrawLines, DrawRectangles, DrawCircles, FillGradient,
+    StripRead, StripWrite, FrameRead, FrameWrite, Probe, IndexDirectory,
+    Count
+};
+
+const char* op_name(Op op);
+
+struct Totals {
+    uint64_t calls = 0, pixels = 0, bytes_read = 0, bytes_written = 0, nanoseconds = 0;
+};
+
+// Una operacion terminada, tal como llega a la traza
+struct Event {
+    Op op;
+    uint64_t start_ns, duration_ns, pixels, bytes_read, bytes_written;
+};
+
+using TraceFn = std::function<void(const Event&)>;
+
+// Contadores del hilo actual; las operaciones los suman sin mirar si hay instrumentacion
+extern thread_local uint64_t pixels, bytes_read, bytes_written;
+extern std::atomic<bool> active;
+
+void enable(bool on);
+bool enabled();
+std::vector<Totals> snapshot();  // indexado por Op
+void reset();
+
+// La traza recibe cada operacion: una funcion, o un archivo con una linea JSON por
+// evento. nullptr o "" la desactivan.
+void set_trace(TraceFn fn);
+void set_trace_file(const std::string& path);
+
+uint64_t now_ns();
+void record(const Event& event);
+
+// Mide una operacion desde su construccion hasta su destruccion
+class Scope {
+public:
+    explicit Scope(Op op) : op(op), on(active.load(std::memory_order_relaxed)) {
+        if (on) {
+            start = now_ns();
+            pixels0 = pixels;
+            read0 = bytes_read;
+            written0 = bytes_written;
+        }
+    }
+    ~Scope() {
+        if (on) record({op, start, now_ns() - start, pixels - pixels0, bytes_read - read0, bytes_written - written0});
+    }
+    Scope(const Scope&) = delete;
+    Scope& operator=(const Scope&) = delete;
+
+private:
+    Op op;
+    bool on;
+    uint64_t start = 0, pixels0 = 0, read0 = 0, written0 = 0;
+};
+
+} // namespace stats
+
+#endif // STATS_H
@@ -0,0 +1,123 @@
+#include "strips.h"
+#include "stats.h"
+#include <algorithm>
+#include <stdexcept>
+
+StripReader::StripReader(const std::string& filename, int rows)
+    : file(filename, std::ios::in | std::ios::binary), rows(rows) {
+    if (!file) throw std::runtime_error("No se pudo abrir el archivo: " + filename);
+    if (rows <= 0) throw std::runtime_error("El alto de banda debe ser positivo");
+
+    in.reset(new Scanner([this](char* dst, size_t n) {
+        file.read(dst, n);
+        stats::bytes_read += static_cast<uint64_t>(file.gcount());
+        return static_cast<size_t>(file.gcount());
+    }));
+    header = in->read_header();
+    if (header.max_val > 255)
+        throw std::runtime_error("maxval > 255 no soportado: " + std::to_string(header.max_val));
+
+    // En P7 los canales son los que declara DEPTH y el raster va en binario como en P5/P6
+    channels = header.depth;
+    if (header.magic == "P4") packed.resize((header.width + 7) / 8);
+    strip.resize((size_t)std::min(rows, header.height) * header.width * channels);
+}
+
+int StripReader::next() {
+    stats::Scope scope(stats::Op::StripRead);
+    if (!in) throw std::runtime_error("El lector de bandas esta cerrado");
+    int count = std::min(rows, header.height - next_row);
+    if (count <= 0) return 0;
+
+    size_t width = header.width;
+    size_t samples = (size_t)count * width * channels;
+    unsigned char* dst = strip.data();
+    if (header.magic == "P1") {
+        in->read_bits(dst, samples);
+        for (size_t i = 0; i < samples; ++i) dst[i] = dst[i] ? 0 : 255;
+    } else if (header.magic == "P4") {
+        for (int r = 0; r < count; ++r) {
+            in->read_bytes(reinterpret_cast<char*>(packed.data()), packed.size());
+            unpack_pbm_row(packed.data(), dst + r * width, header.width);
+        }
+    } else if (header.magic == "P2" || header.magic == "P3") {
+        in->read_samples(dst, samples, header.max_val);
+    } else {
+        in->read_bytes(reinterpret_cast<char*>(dst), samples);
+    }
+
+    row = next_row;
+    next_row += count;
+    stats::pixels += width * count;
+    return count;
+}
+
+void StripReader::close() {
+    in.reset();
+    file.close();
+}
+
+StripWriter::StripWriter(const std::string& filename, int width, int height, const std::string& mode, bool binary)
+    : filename(filename), width(width), height(height), binary(binary) {
+    if (width <= 0 || height <= 0) throw std::runtime_error("Dimensiones invalidas");
+    std::string magic;
+    if (mode == "pbm") { pbm = true; magic = binary ? "P4" : "P1"; }
+    else if (mode == "pgm") { magic = binary ? "P5" : "P2"; }
+    else if (mode == "ppm") { channels = 3; magic = binary ? "P6" : "P3"; }
+    else throw std::runtime_error("Modo de imagen no soportado");
+
+    file.open(filename, std::ios::out | std::ios::binary);
+    if (!file) throw std::runtime_error("No se pudo crear el archivo: " + filename);
+
+    // Misma cabecera que Image::save
+    file << magic << "\n";
+    file << width << " " << height << "\n";
+    if (!pbm) file << 255 << "\n";
+
+    if (!binary) ascii.reset(new AsciiWriter([this](const char* src, size_t n) {
+        this->file.write(src, n);
+        stats::bytes_written += n;
+    }));
+    else if (pbm) packed.resize((width + 7) / 8);
+}
+
+StripWriter::~StripWriter() {
+    // Sin comprobaciones: si no se llamo a close el archivo queda incompleto
+    if (ascii && file.is_open()) ascii->flush();
+}
+
+void StripWriter::write(const unsigned char* src, int count) {
+    stats::Scope scope(stats::Op::StripWrite);
+    if (!file.is_open()) throw std::runtime_error("El escritor de bandas esta cerrado");
+    if (count < 0 || count > height - rows_written)
+        throw std::runtime_error("La banda excede el alto de la imagen");
+
+    size_t per_row = (size_t)width * channels;
+    size_t samples = per_row * count;
+    if (ascii) {
+        if (pbm) ascii->write_bits(src, samples, per_row);
+        else ascii->write_samples(src, samples, per_row);
+    } else if (pbm) {
+        for (int r = 0; r < count; ++r) {
+            pack_pbm_row(src + r * per_row, packed.data(), width);
+            file.write(reinterpret_cast<const char*>(packed.data()), packed.size());
+        }
+        stats::bytes_written += packed.size() * count;
+    } else {
+        file.write(reinterpret_cast<const char*>(src), samples);
+        stats::bytes_written += samples;
+    }
+    stats::pixels += (uint64_t)width * count;
+    if (!file) throw std::runtime_error("Error al escribir el archivo: " + filename);
+    rows_written += count;
+}
+
+void StripWriter::close() {
+    if (!file.is_open()) return;
+    if (ascii) ascii->flush();
+    file.close();
+    if (!file) throw std::runtime_error("Error al escribir el archivo: " + filename);
+    if (rows_written != height)
+        throw std::runtime_error("Faltan filas: se escribieron " + std::to_string(rows_written) +
+                                 " de " + std::to_string(height));
+}
@@ -0,0 +1,76 @@
+#ifndef STRIPS_H
+#define STRIPS_H
+
+#include "netpbm_io.h"
+#include <fstream>
+#include <memory>
+#include <string>
+#include <vector>
+
+// Lee un archivo Netpbm (P1-P7) por bandas horizontales de hasta `rows` filas, sin
+// cargar nunca el raster completo. Cada banda se decodifica en el mismo buffer, con el
+// formato de Image: una muestra de 8 bits por canal y PBM en escala 0 (negro) / 255.
+// En P7 get_channels() es el DEPTH del archivo.
+class StripReader {
+public:
+    StripReader(const std::string& filename, int rows);
+    StripReader(const StripReader&) = delete;
+    StripReader& operator=(const StripReader&) = delete;
+
+    // Decodifica la siguiente banda y devuelve cuantas filas tiene (0 al terminar)
+    int next();
+    void close();
+
+    const unsigned char* get_strip() const { return strip.data(); }
+    int get_row() const { return row; }  // primera fila de la banda actual
+    int get_rows() const { return rows; }
+    int get_width() const { return header.width; }
+    int get_height() const { return header.height; }
+    int get_channels() const { return channels; }
+    int get_max_val() const { return header.max_val; }
+    const std::string& get_magic() const { return header.magic; }
+
+private:
+    std::ifstream file;
+    std::unique_ptr<Scanner> in;
+    Header header;
+    int rows;
+    int channels = 1;
+    int row = 0;
+    int next_row = 0;
+    std::vector<unsigned char> strip;
+    std::vector<unsigned char> packed;  // una fila P4 sin desempaquetar
+};
+
+// Escribe un archivo Netpbm por bandas: la cabecera va al principio y cada llamada a
+// write anade filas completas. mode es "pbm", "pgm" o "ppm", como en Image.
+class StripWriter {
+public:
+    StripWriter(const std::string& filename, int width, int height, const std::string& mode, bool binary = false);
+    StripWriter(const StripWriter&) = delete;
+    StripWriter& operator=(const StripWriter&) = delete;
+    ~StripWriter();
+
+    // Anade `count` filas de width * channels muestras
+    void write(const unsigned char* src, int count);
+    // Vuelca y cierra el archivo; falla si no se escribieron todas las filas
+    void close();
+
+    int get_width() const { return width; }
+    int get_height() const { return height; }
+    int get_channels() const { return channels; }
+    int get_rows_written() const { return rows_written; }
+
+private:
+    std::string filename;
+    std::ofstream file;
+    std::unique_ptr<AsciiWriter> ascii;
+    int width, height;
+    int channels = 1;
+    bool pbm = false;
+    bool binary;
+    int rows_written = 0;
+    std::vector<unsigned char> packed;
+};
+
+#endif // STRIPS_H
@@ -1,8 +1,7 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import netpbm_cpp as netpbm
 import os
-import time
+from roundtrip import report_roundtrip
 
 
 class Colors:
@@ -16,10 +15,12 @@ class Colors:
     ORANGE_SKY = (230, 126, 34)
 
 def visualize_image(image_obj, title, ax=None):
+    import matplotlib.pyplot as plt
     show_plot = (ax is None)
     if show_plot:
         fig, ax = plt.subplots(figsize=(8, 8))
 
+    image_obj = image_obj.thumbnail(1024)
     img_data = np.array(image_obj, copy=False)
 
     if len(img_data.shape) == 1:
@@ -42,32 +43,25 @@ def visualize_image(image_obj, title, ax=None):
 def create_artistic_scene(width, height):
    
     print("Creando una nueva escena...")
-    img = netpbm.Image(width, height, 'ppm')
+    scene = netpbm.DisplayList(width, height, 'ppm')
 
     
-    for y in range(int(height * 0.6)):
-      
-        ratio = y / (height * 0.6)
-        
-        r = int((1 - ratio) * Colors.PURPLE_SKY[0] + ratio * Colors.ORANGE_SKY[0])
-        g = int((1 - ratio) * Colors.PURPLE_SKY[1] + ratio * Colors.ORANGE_SKY[1])
-        b = int((1 - ratio) * Colors.PURPLE_SKY[2] + ratio * Colors.ORANGE_SKY[2])
-       
-        sky_color = netpbm.Color(r, g, b)
-        img.draw_line(0, y, width - 1, y, sky_color)
+    # El cielo ocupa el 60% superior: ratio = y / (height * 0.6)
+    sky_stops = [(0.0, netpbm.Color(*Colors.PURPLE_SKY)), (1.0, netpbm.Color(*Colors.ORANGE_SKY))]
+    scene.fill_gradient(sky_stops, mode='vertical', region=(0, 0, width - 1, int(height * 0.6) - 1),
+                      start=0, end=height * 0.6)
 
    
     sun_color_obj = netpbm.Color(*Colors.YELLOW_SUN)
-    img.draw_circle(int(width * 0.75), int(height * 0.3), int(width * 0.1), sun_color_obj, fill=True)
+    scene.draw_circle(int(width * 0.75), int(height * 0.3), int(width * 0.1), sun_color_obj, fill=True)
 
     mountain_color_obj = netpbm.Color(*Colors.BLACK)
-    img.draw_rectangle(0, int(height * 0.55), width, height, mountain_color_obj, fill=True)
+    scene.draw_rectangle(0, int(height * 0.55), width, height, mountain_color_obj, fill=True)
 
     print("Escena generada exitosamente.")
-    return img
+    return scene.render()
 
 def save_and_verify(image_obj):
-
     print("\nGuardando la imagen en formatos P6 (binario) y P3 (ASCII)...")
     ruta_binaria = 'escena1_binaria.ppm'
     ruta_ascii = 'escena1_ascii.ppm'
@@ -79,7 +73,6 @@ def save_and_verify(image_obj):
     print(f"Guardado en '{ruta_ascii}'")
 
     print("\Cargando imágenes desde el disco para verificación...")
-    time.sleep(1) 
     
     try:
         img_cargada_bin = netpbm.Image(ruta_binaria)
@@ -90,8 +83,10 @@ def save_and_verify(image_obj):
         print(f"Error al cargar las imágenes: {e}")
         return
 
+    if report_roundtrip(image_obj, ((ruta_binaria, img_cargada_bin), (ruta_ascii, img_cargada_ascii)), sangria=" "):
+        return
 
-    print("\n Mostrando ambas imagenes para comparacion visual...")
+    import matplotlib.pyplot as plt
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 6))
     fig.suptitle("Verificación de Guardado y Carga", fontsize=16)
 
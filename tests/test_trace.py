@@ -0,0 +1,28 @@
+import threading
+
+import netpbm_cpp
+
+
+def test_reset_trace_while_convert_many_runs(tmp_path):
+    # Los hilos de convert_many llaman a la traza sin el GIL; cambiarla o quitarla a la vez
+    # no debe soltar la funcion de Python desde uno de ellos
+    pairs = []
+    for i in range(400):
+        src = tmp_path / f"in{i}.ppm"
+        img = netpbm_cpp.Image(16, 16, "ppm")
+        img.draw_line(0, 0, 15, i % 16, netpbm_cpp.Color(i % 256, 0, 0))
+        img.save(str(src), True)
+        pairs.append((str(src), str(tmp_path / f"out{i}.pgm")))
+
+    events = []
+    worker = threading.Thread(target=netpbm_cpp.convert_many, args=(pairs,), kwargs={"threads": 4})
+    worker.start()
+    while worker.is_alive():
+        netpbm_cpp.set_trace(lambda e: events.append(e["op"]))
+        netpbm_cpp.set_trace(None)
+    worker.join()
+    netpbm_cpp.set_trace(None)
+
+    for src, dst in pairs:
+        assert netpbm_cpp.Image(dst).equals(netpbm_cpp.Image(src))
+    assert all(isinstance(op, str) for op in events)
@@ -0,0 +1,122 @@
+#include "workers.h"
+#include <algorithm>
+#include <stdexcept>
+
+static unsigned thread_count(unsigned threads) {
+    return threads ? threads : std::max(1u, std::thread::hardware_concurrency());
+}
+
+WorkerPool::WorkerPool(unsigned threads, size_t max_bytes) : max_bytes(max_bytes) {
+    std::lock_guard<std::mutex> lock(mutex);
+    target = thread_count(threads);
+    while (alive < target) spawn();
+}
+
+WorkerPool::~WorkerPool() {
+    shutdown();
+}
+
+// Con el mutex tomado
+void WorkerPool::spawn() {
+    ++alive;
+    workers.emplace_back(&WorkerPool::work, this);
+}
+
+void WorkerPool::submit(size_t bytes, Work work, Finish finish, std::shared_ptr<std::atomic<bool>> cancelled) {
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        if (!stopping) {
+            queue.push_back({bytes, std::move(work), std::move(finish), std::move(cancelled)});
+            ready.notify_one();
+            return;
+        }
+    }
+    finish(true);
+}
+
+// La primera de la cola puede empezar: esta cancelada, cabe en el limite o no hay nada en curso
+bool WorkerPool::can_start() const {
+    if (queue.empty()) return false;
+    const Entry& e = queue.front();
+    if (e.cancelled && e.cancelled->load()) return true;
+    return in_flight == 0 || in_flight + e.bytes <= max_bytes;
+}
+
+void WorkerPool::work() {
+    std::unique_lock<std::mutex> lock(mutex);
+    while (true) {
+        ready.wait(lock, [this] { return stopping || alive > target || can_start(); });
+        if (alive > target || (stopping && queue.empty())) {
+            --alive;
+            if (!stopping) exited.push_back(std::this_thread::get_id());
+            return;
+        }
+        if (!can_start()) continue;
+
+        Entry e = std::move(queue.front());
+        queue.pop_front();
+        bool cancelled = e.cancelled && e.cancelled->load();
+        size_t bytes = cancelled ? 0 : e.bytes;
+        in_flight += bytes;
+        ++running;
+        lock.unlock();
+        if (!cancelled) e.work();
+        e.work = nullptr;  // lo que capture la tarea se suelta fuera del mutex
+        lock.lock();
+        in_flight -= bytes;
+        --running;
+        // Al liberar bytes puede que ahora quepan varias de las que esperan
+        if (bytes) ready.notify_all();
+        else ready.notify_one();
+        lock.unlock();
+        e.finish(cancelled);
+        e.finish = nullptr;
+        lock.lock();
+    }
+}
+
+void WorkerPool::shutdown() {
+    std::deque<Entry> pending;
+    std::vector<std::thread> threads;
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        stopping = true;
+        pending.swap(queue);
+        threads.swap(workers);
+        ready.notify_all();
+    }
+    for (Entry& e : pending) e.finish(true);
+    for (std::thread& t : threads) t.join();
+}
+
+// Une los hilos que salieron al reducir el pool, para que sucesivos cambios de limites no
+// acumulen std::thread terminados
+void WorkerPool::reap() {
+    std::vector<std::thread> done;
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        for (std::thread::id id : exited) {
+            auto it = std::find_if(workers.begin(), workers.end(), [id](const std::thread& t) { return t.get_id() == id; });
+            if (it == workers.end()) continue;
+            done.push_back(std::move(*it));
+            workers.erase(it);
+        }
+        exited.clear();
+    }
+    for (std::thread& t : done) t.join();
+}
+
+void WorkerPool::set_limits(unsigned threads, size_t new_max_bytes) {
+    reap();
+    std::lock_guard<std::mutex> lock(mutex);
+    if (stopping) throw std::runtime_error("El pool de trabajo esta cerrado");
+    max_bytes = new_max_bytes;
+    target = thread_count(threads);
+    while (alive < target) spawn();
+    ready.notify_all();
+}
+
+WorkerPool::Info WorkerPool::info() const {
+    std::lock_guard<std::mutex> lock(mutex);
+    return {target, max_bytes, in_flight, running, queue.size()};
+}
@@ -0,0 +1,74 @@
+#ifndef WORKERS_H
+#define WORKERS_H
+
+#include <atomic>
+#include <condition_variable>
+#include <cstddef>
+#include <deque>
+#include <functional>
+#include <memory>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// Pool acotado de hilos nativos para el trabajo que no debe bloquear a quien lo pide
+// (las variantes asincronas del modulo de Python). Cada tarea declara los bytes que va a
+// ocupar y las tareas empiezan en orden de llegada solo mientras la suma de las que estan
+// en curso no pase de max_bytes; una tarea mayor que el limite empieza cuando no queda
+// ninguna otra en curso. Las que esperan no reservan nada.
+class WorkerPool {
+public:
+    // work hace el trabajo y finish entrega el resultado, ya con la tarea fuera de la
+    // cuenta de info(): quien recibe el aviso ve el pool tal como queda. finish recibe
+    // cancelled=true si work no llego a ejecutarse (se cancelo en la cola o el pool se
+    // cerro) y solo debe avisar y soltar lo que tenga. Ninguna de las dos debe lanzar.
+    using Work = std::function<void()>;
+    using Finish = std::function<void(bool cancelled)>;
+
+    // threads = 0: uno por nucleo
+    explicit WorkerPool(unsigned threads = 0, size_t max_bytes = size_t(256) << 20);
+    ~WorkerPool();
+    WorkerPool(const WorkerPool&) = delete;
+    WorkerPool& operator=(const WorkerPool&) = delete;
+
+    // Si cancelled se activa mientras la tarea espera, sale de la cola sin contar sus bytes
+    // ni esperar a que haya sitio
+    void submit(size_t bytes, Work work, Finish finish, std::shared_ptr<std::atomic<bool>> cancelled = nullptr);
+    // Deja de aceptar tareas, entrega como canceladas las que esperan y espera a que
+    // terminen las que estan en curso
+    void shutdown();
+
+    // Con menos hilos, los que sobran terminan al acabar su tarea actual
+    void set_limits(unsigned threads, size_t max_bytes);
+
+    struct Info {
+        unsigned threads;
+        size_t max_bytes, bytes_in_flight, running, queued;
+    };
+    Info info() const;
+
+private:
+    struct Entry {
+        size_t bytes;
+        Work work;
+        Finish finish;
+        std::shared_ptr<std::atomic<bool>> cancelled;
+    };
+
+    mutable std::mutex mutex;
+    std::condition_variable ready;
+    std::deque<Entry> queue;
+    std::vector<std::thread> workers;
+    std::vector<std::thread::id> exited;  // hilos sobrantes que ya salieron, pendientes de join
+    unsigned target = 0, alive = 0;
+    size_t max_bytes;
+    size_t in_flight = 0, running = 0;
+    bool stopping = false;
+
+    void spawn();
+    void reap();
+    bool can_start() const;
+    void work();
+};
+
+#endif // WORKERS_H